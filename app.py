@@ -3,7 +3,11 @@ from config import Config
 from src.models.database import db
 from src.auth.routes import auth_bp
 from src.traffic.routes import traffic_bp
+from src.admin.routes import admin_bp
 from flask_login import LoginManager
+from sqlalchemy import inspect, text
+from src.auth.cache import user_cache
+from src.auth.tokens import verify_api_token, get_request_token
 
 def create_app():
     app = Flask(__name__)
@@ -20,18 +24,44 @@ def create_app():
     
     from src.models.user import User
     
+    user_cache.watch(User)
+    
+    def load_user_from_db(user_id):
+        user = User.query.get(user_id)
+        if user is not None:
+            # Separar de la sesión para reutilizarlo en otros requests
+            db.session.expunge(user)
+        return user
+    
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Cacheado: el polling del dashboard no consulta la base de datos en cada request
+        return user_cache.get(int(user_id), load_user_from_db)
+    
+    @login_manager.request_loader
+    def load_user_from_request(request):
+        # Clientes máquina: token de API firmado, validado contra el usuario cacheado
+        token = get_request_token(request.headers, request.args, request.path)
+        if not token:
+            return None
+        return verify_api_token(app.config['SECRET_KEY'], token, Config.API_TOKEN_MAX_AGE, load_user)
     
     # Registrar blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(traffic_bp, url_prefix='/')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
     
     # Crear tablas
     with app.app_context():
         db.create_all()
         
+        # Bases creadas antes de los tokens revocables: create_all no agrega columnas
+        columns = {column['name'] for column in inspect(db.engine).get_columns(User.__tablename__)}
+        if 'token_version' not in columns:
+            with db.engine.begin() as connection:
+                table = db.engine.dialect.identifier_preparer.quote(User.__tablename__)
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0'))
+        
         # Crear usuario admin por defecto
         admin_user = User.query.filter_by(username='admin').first()
         if not admin_user:
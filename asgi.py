@@ -0,0 +1,15 @@
+"""Servidor ASGI: los streams MJPEG y los endpoints en vivo se atienden de forma
+cooperativa en un event loop, así los espectadores no ocupan hilos del servidor.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn -k uvicorn.workers.UvicornWorker -w 1 asgi:app
+
+Con varios workers, el detector corre aparte y los workers solo lo consultan:
+
+    python -m src.traffic.detector_service
+    DETECTOR_MODE=remote gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+"""
+from app import create_app
+from src.traffic.async_routes import create_asgi_app
+
+app = create_asgi_app(create_app())
@@ -0,0 +1,132 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Profiler por muestreo de todos los hilos, activo solo durante una sesión.
+
+    Cada `interval` segundos se leen las pilas de los hilos con
+    sys._current_frames() y se acumulan en formato "folded" (una línea por pila:
+    `hilo;func_a;func_b N`), compatible con flamegraph.pl y speedscope. Fuera
+    de una sesión no hay hilo de muestreo ni hooks instalados: costo cero.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = False
+
+    def profile(self, duration, interval=0.01, thread_filter=None):
+        """Muestrear durante `duration` segundos y devolver (pilas, estadísticas)"""
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("Ya hay una sesión de profiling en curso")
+        try:
+            self.running = True
+            stacks = Counter()
+            samples = 0
+            own_ident = threading.get_ident()
+            started = time.perf_counter()
+            deadline = started + duration
+            while time.perf_counter() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    name = names.get(ident, f'thread-{ident}')
+                    if ident == own_ident or (thread_filter and not any(f in name for f in thread_filter)):
+                        continue
+                    stacks[fold_stack(name, frame)] += 1
+                samples += 1
+                time.sleep(interval)
+            elapsed = time.perf_counter() - started
+        finally:
+            self.running = False
+            self.lock.release()
+        return stacks, {'samples': samples, 'seconds': round(elapsed, 2), 'interval': interval,
+                        'stacks': len(stacks)}
+
+
+def fold_stack(thread_name, frame):
+    """Pila de un hilo en formato folded, de la raíz a la función actual"""
+    functions = []
+    while frame is not None:
+        code = frame.f_code
+        functions.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    functions.append(thread_name.replace(';', ':'))
+    return ';'.join(reversed(functions))
+
+
+def format_folded(stacks):
+    return '\n'.join(f"{stack} {count}" for stack, count in stacks.most_common()) + '\n'
+
+
+class MemoryTracker:
+    """Diferencias de snapshots de tracemalloc contra una línea base.
+
+    tracemalloc solo se activa entre start() y stop(), porque mientras está
+    activo encarece cada asignación de memoria.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.baseline = None
+        self.started_at = None
+
+    def start(self, frames=10):
+        with self.lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self.baseline = take_snapshot()
+            self.started_at = time.time()
+
+    def diff(self, limit=20, group_by='lineno', reset=False):
+        """Las `limit` ubicaciones que más memoria crecieron desde la línea base"""
+        with self.lock:
+            if self.baseline is None or not tracemalloc.is_tracing():
+                raise RuntimeError("tracemalloc no está activo")
+            snapshot = take_snapshot()
+            stats = snapshot.compare_to(self.baseline, group_by)
+            current, peak = tracemalloc.get_traced_memory()
+            result = {
+                'since': self.started_at,
+                'traced_current_kb': round(current / 1024, 1),
+                'traced_peak_kb': round(peak / 1024, 1),
+                'top': [
+                    {
+                        'location': str(stat.traceback[0]) if stat.traceback else '?',
+                        'size_diff_kb': round(stat.size_diff / 1024, 1),
+                        'size_kb': round(stat.size / 1024, 1),
+                        'count_diff': stat.count_diff,
+                        'traceback': stat.traceback.format()[-6:] if group_by == 'traceback' else None
+                    }
+                    for stat in stats[:limit]
+                ]
+            }
+            if reset:
+                self.baseline = snapshot
+                self.started_at = time.time()
+            return result
+
+    def stop(self):
+        with self.lock:
+            self.baseline = None
+            self.started_at = None
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def is_active(self):
+        return tracemalloc.is_tracing() and self.baseline is not None
+
+
+def take_snapshot():
+    # Sin las asignaciones del propio tracemalloc ni del sistema de imports
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+
+
+profiler = SamplingProfiler()
+memory_tracker = MemoryTracker()
@@ -0,0 +1,85 @@
+from functools import wraps
+from flask import Blueprint, Response, request, jsonify
+from src.auth.decorators import admin_required
+from src.admin.profiler import profiler, memory_tracker, format_folded
+from config import Config
+
+admin_bp = Blueprint('admin', __name__)
+
+# Límites para que una sesión de profiling no quede corriendo en producción
+MAX_PROFILE_SECONDS = 60
+MIN_PROFILE_INTERVAL = 0.001
+
+def embedded_detector_required(f):
+    """Solo con el detector en este proceso.
+
+    En modo 'remote' los hilos de las cámaras y del semáforo corren en el
+    servicio de detección: muestrear este worker web no mostraría process_video.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if Config.DETECTOR_MODE == 'remote':
+            return jsonify({
+                'success': False,
+                'error': 'DETECTOR_MODE=remote: el detector corre en el servicio de detección, '
+                         'este proceso solo tiene los hilos web'
+            }), 501
+        return f(*args, **kwargs)
+    return decorated_function
+
+@admin_bp.route('/profile', methods=['POST'])
+@admin_required
+@embedded_detector_required
+def profile():
+    """Muestrear las pilas de los hilos durante unos segundos.
+
+    Parámetros: seconds (por defecto 10), interval (segundos entre muestras) y
+    threads (subcadenas del nombre de hilo separadas por comas, p. ej.
+    "camera,semaphore"). Devuelve las pilas en formato folded para flamegraph.
+    """
+    seconds = min(request.args.get('seconds', 10, type=float), MAX_PROFILE_SECONDS)
+    interval = max(request.args.get('interval', 0.01, type=float), MIN_PROFILE_INTERVAL)
+    threads = [name for name in request.args.get('threads', '').split(',') if name]
+    
+    try:
+        stacks, stats = profiler.profile(seconds, interval, threads or None)
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    
+    if request.args.get('format') == 'json':
+        return jsonify(dict(stats, folded=dict(stacks.most_common())))
+    response = Response(format_folded(stacks), mimetype='text/plain')
+    response.headers['X-Profile-Samples'] = str(stats['samples'])
+    return response
+
+@admin_bp.route('/memory/start', methods=['POST'])
+@admin_required
+@embedded_detector_required
+def memory_start():
+    """Activar tracemalloc y tomar la línea base"""
+    frames = request.args.get('frames', 10, type=int)
+    if frames < 1:
+        return jsonify({'success': False, 'error': 'frames debe ser un entero mayor o igual a 1'}), 400
+    memory_tracker.start(frames)
+    return jsonify({'success': True, 'active': True})
+
+@admin_bp.route('/memory/diff')
+@admin_required
+@embedded_detector_required
+def memory_diff():
+    """Crecimiento de memoria desde la línea base (reset=1 mueve la línea base a ahora)"""
+    try:
+        return jsonify(memory_tracker.diff(
+            limit=request.args.get('limit', 20, type=int),
+            group_by='traceback' if request.args.get('group_by') == 'traceback' else 'lineno',
+            reset=request.args.get('reset') == '1'
+        ))
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+@admin_bp.route('/memory/stop', methods=['POST'])
+@admin_required
+@embedded_detector_required
+def memory_stop():
+    memory_tracker.stop()
+    return jsonify({'success': True, 'active': False})
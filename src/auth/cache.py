@@ -0,0 +1,72 @@
+import threading
+import time
+from sqlalchemy import event
+from config import Config
+
+
+class UserCache:
+    """Caché con TTL de los usuarios que carga Flask-Login en cada request.
+
+    Las instancias se separan de la sesión de SQLAlchemy (expunge) para poder
+    compartirlas entre requests. Los cambios hechos en este proceso invalidan
+    la entrada al instante (eventos de SQLAlchemy); los de otros procesos se
+    ven como máximo tras `ttl` segundos.
+    """
+
+    def __init__(self, ttl=60, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self.watched = set()
+
+    def get(self, user_id, loader):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+
+        user = loader(user_id)
+        with self.lock:
+            if len(self.entries) >= self.max_size:
+                self.evict(now)
+            self.entries[user_id] = (now + self.ttl, user)
+        return user
+
+    def evict(self, now):
+        """Quitar las entradas vencidas y, si no alcanza, las más próximas a vencer"""
+        for user_id in [uid for uid, (expires, _) in self.entries.items() if expires <= now]:
+            del self.entries[user_id]
+        while len(self.entries) >= self.max_size:
+            del self.entries[min(self.entries, key=lambda uid: self.entries[uid][0])]
+
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+            self.stats['invalidations'] += 1
+
+    def watch(self, model):
+        """Invalidar la entrada del usuario cuando se modifica o se elimina en la base de datos"""
+        if model in self.watched:
+            return
+        self.watched.add(model)
+        event.listen(model, 'after_update', self.on_change)
+        event.listen(model, 'after_delete', self.on_change)
+
+    def on_change(self, mapper, connection, target):
+        self.invalidate(target.id)
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, size=len(self.entries), ttl=self.ttl)
+
+
+# Instancia global de la caché de usuarios
+user_cache = UserCache(Config.USER_CACHE_TTL, Config.USER_CACHE_SIZE)
@@ -1,6 +1,7 @@
 from functools import wraps
-from flask import redirect, url_for, flash
+from flask import redirect, url_for, flash, abort
 from flask_login import current_user
+from config import Config
 
 def login_required(f):
     @wraps(f)
@@ -9,4 +10,17 @@ def login_required(f):
             flash('Por favor inicia sesión para acceder a esta página.', 'warning')
             return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+def admin_required(f):
+    """Solo para los usuarios listados en Config.ADMIN_USERS"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            flash('Por favor inicia sesión para acceder a esta página.', 'warning')
+            return redirect(url_for('auth.login'))
+        # Los tokens de API no dan acceso a la administración
+        if getattr(current_user, 'is_api_client', False) or current_user.username not in Config.ADMIN_USERS:
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
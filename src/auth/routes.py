@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
 from src.models.user import User
 from src.models.database import db
+from src.auth.tokens import generate_api_token
+from config import Config
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -71,4 +73,29 @@ def register():
 def logout():
     logout_user()
     flash('Has cerrado sesión', 'info')
-    return redirect(url_for('auth.login'))
\ No newline at end of file
+    return redirect(url_for('auth.login'))
+
+@auth_bp.route('/api_token', methods=['POST'])
+@login_required
+def api_token():
+    """Emitir un token de API para clientes máquina (Authorization: Bearer <token>; ?token= solo en los streams)"""
+    # Un token no puede emitir otros tokens: hace falta una sesión iniciada con contraseña
+    if getattr(current_user, 'is_api_client', False):
+        return jsonify({'success': False, 'error': 'Se requiere una sesión de usuario'}), 403
+    
+    token = generate_api_token(current_app.config['SECRET_KEY'], current_user)
+    return jsonify({'success': True, 'token': token, 'expires_in': Config.API_TOKEN_MAX_AGE})
+
+@auth_bp.route('/api_token/revoke', methods=['POST'])
+@login_required
+def revoke_api_tokens():
+    """Revocar todos los tokens de API emitidos para el usuario"""
+    if getattr(current_user, 'is_api_client', False):
+        return jsonify({'success': False, 'error': 'Se requiere una sesión de usuario'}), 403
+    
+    # current_user viene de la caché (separado de la sesión): se modifica la fila
+    # de la base de datos, y el evento after_update invalida la entrada cacheada
+    user = User.query.get(current_user.id)
+    user.token_version = (user.token_version or 0) + 1
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Tokens de API revocados'})
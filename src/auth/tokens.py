@@ -0,0 +1,62 @@
+from flask_login import UserMixin
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+TOKEN_SALT = 'api-token'
+
+# Rutas que el navegador carga con <img>/<video> y no pueden mandar cabeceras:
+# las únicas que aceptan ?token= (en la URL el token queda en logs e historial)
+QUERY_TOKEN_PATHS = ('/video_feed/', '/hls/', '/heatmap/')
+
+
+class ApiTokenUser(UserMixin):
+    """Usuario autenticado con un token de API: se arma desde el token, sin consultar la base de datos"""
+
+    is_api_client = True
+
+    def __init__(self, user_id, username):
+        self.id = user_id
+        self.username = username
+
+    def __repr__(self):
+        return f'<ApiTokenUser {self.username}>'
+
+
+def get_serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT)
+
+
+def generate_api_token(secret_key, user):
+    """Token firmado para clientes máquina (pantallas, otros servicios).
+
+    Lleva la versión de tokens del usuario: al incrementarla se revocan todos
+    los tokens emitidos antes.
+    """
+    return get_serializer(secret_key).dumps({'uid': user.id, 'name': user.username, 'ver': user.token_version or 0})
+
+
+def verify_api_token(secret_key, token, max_age, load_user):
+    """Devolver el ApiTokenUser del token, o None si es inválido, expiró o fue revocado.
+
+    `load_user(uid)` es el user_loader de la app (caché de usuarios): el token
+    deja de valer si el usuario se eliminó o si su versión de tokens cambió.
+    """
+    try:
+        data = get_serializer(secret_key).loads(token, max_age=max_age)
+    except (BadSignature, SignatureExpired):
+        return None
+    if not isinstance(data, dict) or 'uid' not in data:
+        return None
+    user = load_user(data['uid'])
+    if user is None or data.get('ver') != (user.token_version or 0):
+        return None
+    return ApiTokenUser(user.id, user.username)
+
+
+def get_request_token(headers, args, path):
+    """Token de la cabecera `Authorization: Bearer ...` o, solo en las rutas de streams, del parámetro ?token="""
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        return authorization[7:].strip()
+    if path.startswith(QUERY_TOKEN_PATHS):
+        return args.get('token')
+    return None
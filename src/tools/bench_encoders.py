@@ -0,0 +1,84 @@
+"""Benchmark de codificadores JPEG sobre frames de los videos incluidos.
+
+Uso:
+    python -m src.tools.bench_encoders [--videos videos/*.mp4] [--frames 60]
+"""
+import argparse
+import glob
+import time
+import cv2
+from config import Config
+from src.traffic.encoders import available_encoders, get_encoder, SUBSAMPLING_MODES
+
+
+def load_frames(video_path, max_frames):
+    """Leer los primeros frames de un video"""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def resize_to_width(frames, width):
+    height, original_width = frames[0].shape[:2]
+    if not width or width >= original_width:
+        return frames
+    size = (width, int(round(height * width / original_width)))
+    return [cv2.resize(frame, size, interpolation=cv2.INTER_AREA) for frame in frames]
+
+
+def bench(encoder, frames, quality, repeat):
+    """Devuelve (ms por frame, KB medios por frame)"""
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            total_bytes += len(memoryview(encoder.encode(frame, quality)).cast('B'))
+    elapsed = time.perf_counter() - start
+    count = len(frames) * repeat
+    return elapsed / count * 1000, total_bytes / count / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los codificadores JPEG disponibles")
+    parser.add_argument('--videos', nargs='*', help="Videos de prueba (por defecto videos/*.mp4)")
+    parser.add_argument('--frames', type=int, default=60, help="Frames a leer por video")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones por combinación")
+    parser.add_argument('--subsampling', nargs='*', default=list(SUBSAMPLING_MODES))
+    args = parser.parse_args()
+
+    videos = args.videos or sorted(set(glob.glob('videos/*.mp4')) | set(Config.VIDEO_PATHS))
+    encoders = available_encoders()
+    print(f"Codificadores disponibles: {', '.join(encoders)}")
+
+    header = f"{'video':<28} {'resolución':>10} {'variante':>8} {'codificador':>11} {'sub':>4} {'q':>3} {'ms/frame':>9} {'fps':>7} {'KB':>7}"
+    print(header)
+    print('-' * len(header))
+
+    for video_path in videos:
+        frames = load_frames(video_path, args.frames)
+        if not frames:
+            print(f"{video_path:<28} (no se pudo leer)")
+            continue
+
+        for variant, options in Config.STREAM_VARIANTS.items():
+            variant_frames = resize_to_width(frames, options.get('width'))
+            height, width = variant_frames[0].shape[:2]
+            quality = options.get('quality', 85)
+            for name in encoders:
+                for subsampling in args.subsampling:
+                    encoder = get_encoder(name, subsampling)
+                    # Calentamiento para no medir la inicialización
+                    encoder.encode(variant_frames[0], quality)
+                    ms, kb = bench(encoder, variant_frames, quality, args.repeat)
+                    print(f"{video_path[-28:]:<28} {f'{width}x{height}':>10} {variant:>8} {name:>11} "
+                          f"{subsampling:>4} {quality:>3} {ms:>9.2f} {1000 / ms:>7.1f} {kb:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
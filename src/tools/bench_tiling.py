@@ -0,0 +1,88 @@
+"""Benchmark de la inferencia por tiles contra una sola pasada.
+
+Mide el tiempo por frame y cuenta las detecciones por clase de cada modo sobre
+los mismos frames, para decidir si el costo extra de los tiles se justifica en
+una cámara (más mototaxis y carros lejanos detectados).
+
+Uso:
+    python -m src.tools.bench_tiling --videos videos/videoplayback.mp4 --frames 30
+    python -m src.tools.bench_tiling --tile-sizes 512 640 --overlaps 0.1 0.25 --roi 0 0.3 1 1
+"""
+import argparse
+import glob
+import time
+import numpy as np
+from config import Config
+from src.traffic.detections import DetectionBatch
+from src.traffic.tiling import infer_tiled, tile_grid
+from src.tools.bench_encoders import load_frames
+from src.utils.constants import VEHICLE_CLASSES
+from src.utils.helpers import build_class_index
+
+
+def bench(detect, frames, conf):
+    """Devuelve (ms por frame, detecciones por clase sobre el umbral de confianza)"""
+    detect(frames[0])  # calentamiento
+    counts = np.zeros(len(VEHICLE_CLASSES), dtype=np.int64)
+    start = time.perf_counter()
+    for frame in frames:
+        detections = detect(frame)
+        counts += detections.select(detections.confidences >= conf).class_counts()
+    return (time.perf_counter() - start) / len(frames) * 1000, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la inferencia por tiles con una sola pasada")
+    parser.add_argument('--videos', nargs='*', help="Videos de prueba (por defecto videos/*.mp4)")
+    parser.add_argument('--frames', type=int, default=30, help="Frames a leer por video")
+    parser.add_argument('--model', default=Config.MODEL_PATH, help="Modelo YOLO")
+    parser.add_argument('--imgsz', type=int, default=Config.INFERENCE_IMGSZ, help="imgsz de la pasada única")
+    parser.add_argument('--tile-sizes', type=int, nargs='*', default=[640])
+    parser.add_argument('--overlaps', type=float, nargs='*', default=[0.2])
+    parser.add_argument('--roi', type=float, nargs=4, default=None, help="ROI normalizada x1 y1 x2 y2")
+    parser.add_argument('--no-full-frame', action='store_true', help="No sumar la pasada del frame completo")
+    parser.add_argument('--conf', type=float, default=Config.CONFIDENCE_THRESHOLD, help="Confianza mínima")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    class_index = build_class_index(model.names)
+    videos = args.videos or sorted(set(glob.glob('videos/*.mp4')) | set(Config.VIDEO_PATHS))
+
+    header = f"{'video':<28} {'modo':<22} {'tiles':>5} {'ms/frame':>9} {'x':>5} " + \
+             ' '.join(f"{name[:8]:>8}" for name in VEHICLE_CLASSES)
+    print(header)
+    print('-' * len(header))
+
+    for video_path in videos:
+        frames = load_frames(video_path, args.frames)
+        if not frames:
+            print(f"{video_path:<28} (no se pudo leer)")
+            continue
+
+        def single_pass(frame):
+            results = model(frame, conf=Config.TRACKER['low_thresh'], imgsz=args.imgsz, verbose=False)
+            return DetectionBatch.from_result(results[0], class_index, frame.shape)
+
+        base_ms, counts = bench(single_pass, frames, args.conf)
+        print(f"{video_path[-28:]:<28} {'pasada única':<22} {1:>5} {base_ms:>9.1f} {1.0:>5.1f} " +
+              ' '.join(f"{count:>8}" for count in counts))
+
+        for tile_size in args.tile_sizes:
+            for overlap in args.overlaps:
+                tiles = len(tile_grid(frames[0].shape, tile_size, overlap, args.roi))
+
+                def tiled(frame):
+                    return infer_tiled(model, frame, class_index, tile_size=tile_size, overlap=overlap,
+                                       roi=args.roi, full_frame=not args.no_full_frame,
+                                       conf=Config.TRACKER['low_thresh'], imgsz=tile_size,
+                                       merge_threshold=Config.TILE_MERGE_THRESHOLD)
+
+                ms, counts = bench(tiled, frames, args.conf)
+                mode = f"tiles {tile_size} ({overlap:.0%})"
+                print(f"{video_path[-28:]:<28} {mode:<22} {tiles:>5} {ms:>9.1f} {ms / base_ms:>5.1f} " +
+                      ' '.join(f"{count:>8}" for count in counts))
+
+
+if __name__ == '__main__':
+    main()
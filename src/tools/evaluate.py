@@ -0,0 +1,385 @@
+"""Evaluación de precisión contra velocidad de las configuraciones de inferencia.
+
+Corre una matriz de configuraciones (modelo/backend, imgsz, confianza, stride
+y tiles) sobre las imágenes de images/ y sobre clips muestreados de videos/,
+y compara cada una contra una corrida de referencia (el modelo principal a
+mayor resolución, sin stride ni tiles). No hace falta etiquetar nada: la
+referencia hace de "verdad" y lo que se mide es cuánto se aleja cada atajo.
+
+Por configuración se reporta:
+- recall por clase (cajas de la referencia encontradas con IoU >= --iou y la
+  misma clase), en especial el de 'ambulancia', y la precisión global,
+- concordancia de conteos por frame (1 = mismos conteos por clase),
+- latencia por inferencia (p50/p95) y FPS efectivos (con stride, los frames
+  salteados reutilizan las detecciones del último frame inferido),
+- si está en el frente de Pareto de FPS contra recall medio (y contra recall
+  de ambulancia): ninguna otra configuración es mejor en ambos a la vez.
+
+Con --cascade-light se evalúa además la cascada liviano -> pesado del detector
+(la misma CascadePolicy, cada clip como una cámara nueva) y se compara su recall
+de ambulancia con el del modelo pesado solo, con el mismo imgsz y confianza: la
+cascada no debe perder ambulancias respecto del pesado.
+
+Uso:
+    python -m src.tools.evaluate
+    python -m src.tools.evaluate --imgsz 480 640 --conf 0.25 0.4 --stride 1 2 3
+    python -m src.tools.evaluate --models pytorch/best.pt pytorch/best.onnx --tile-sizes 0 640
+    python -m src.tools.evaluate --reference-imgsz 1280 --clips 4 --clip-frames 12
+    python -m src.tools.evaluate --cascade-light pytorch/yolov8n.pt --stride 1
+
+Los resultados quedan en resultados/evaluacion/<fecha>.json y .csv.
+"""
+import argparse
+import csv
+import glob
+import itertools
+import json
+import os
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from config import Config
+from src.tools.image_inference import iter_images
+from src.traffic.cascade import CascadePolicy
+from src.traffic.detections import DetectionBatch
+from src.traffic.tiling import infer_tiled
+from src.traffic.tracking import iou_matrix, greedy_match
+from src.utils.constants import VEHICLE_CLASSES
+from src.utils.helpers import build_class_index
+from src.utils.imaging import read_image
+
+
+def sample_clips(video_path, clips, clip_frames):
+    """`clips` tramos de `clip_frames` frames consecutivos repartidos a lo largo del video"""
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    starts = np.linspace(0, max(frame_count - clip_frames, 0), clips).astype(int) if frame_count else [0]
+    result = []
+    for start in sorted(set(int(s) for s in starts)):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        frames = []
+        while len(frames) < clip_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        if frames:
+            result.append({'source': f"{video_path}@{start}", 'frames': frames})
+    cap.release()
+    return result
+
+
+def load_dataset(images_dir, videos, clips, clip_frames, max_images=None):
+    """Clips a evaluar: cada imagen es un clip de un frame (el stride no aplica)"""
+    dataset = []
+    if images_dir and os.path.isdir(images_dir):
+        for path in itertools.islice(iter_images(images_dir), max_images):
+            try:
+                dataset.append({'source': path, 'frames': [read_image(path)]})
+            except Exception as e:
+                print(f"⚠️ Se omite {path}: {e}")
+    for video_path in videos:
+        dataset.extend(sample_clips(video_path, clips, clip_frames))
+    return dataset
+
+
+def match_frame(reference, detections, iou_threshold=0.5):
+    """Aciertos por clase: cajas de la referencia emparejadas con una detección de la misma clase"""
+    hits = np.zeros(len(VEHICLE_CLASSES), dtype=np.int64)
+    if len(reference) == 0 or len(detections) == 0:
+        return hits
+    iou = iou_matrix(reference.boxes, detections.boxes)
+    # Solo se emparejan cajas de la misma clase
+    iou[reference.class_ids[:, None] != detections.class_ids[None, :]] = 0
+    rows, _ = greedy_match(iou, iou_threshold)
+    np.add.at(hits, reference.class_ids[rows], 1)
+    return hits
+
+
+def run_config(model, class_index, dataset, imgsz, conf, stride=1, tile_size=0):
+    """Detecciones por frame de todo el dataset y latencias de cada inferencia"""
+    def detect(frame):
+        if tile_size:
+            batch = infer_tiled(model, frame, class_index, tile_size=tile_size, conf=conf, imgsz=tile_size,
+                                merge_threshold=Config.TILE_MERGE_THRESHOLD)
+        else:
+            results = model(frame, conf=conf, imgsz=imgsz, verbose=False)
+            batch = DetectionBatch.from_result(results[0], class_index, frame.shape)
+        return batch.select(batch.confidences >= conf)
+
+    detect(dataset[0]['frames'][0])  # calentamiento
+    outputs, latencies = [], []
+    started = time.perf_counter()
+    for clip in dataset:
+        clip_outputs = []
+        last = None
+        for index, frame in enumerate(clip['frames']):
+            if last is None or index % stride == 0:
+                start = time.perf_counter()
+                last = detect(frame)
+                latencies.append(time.perf_counter() - start)
+            clip_outputs.append(last)
+        outputs.append(clip_outputs)
+    return outputs, np.array(latencies), time.perf_counter() - started
+
+
+def run_cascade(light, heavy, dataset, imgsz, conf, options):
+    """Como run_config pero con la cascada del detector: el liviano en todos los frames y el pesado cuando
+    CascadePolicy lo pide. Devuelve además las veces que se escaló por cada motivo."""
+    def detect(model, class_index, frame):
+        # Como en el detector: umbral bajo para que la política vea las detecciones dudosas
+        results = model(frame, conf=Config.TRACKER['low_thresh'], imgsz=imgsz, verbose=False)
+        return DetectionBatch.from_result(results[0], class_index, frame.shape)
+
+    frame = dataset[0]['frames'][0]
+    detect(*light, frame)  # calentamiento
+    detect(*heavy, frame)
+    outputs, latencies = [], []
+    escalations = dict.fromkeys(CascadePolicy.REASONS, 0)
+    started = time.perf_counter()
+    for clip in dataset:
+        # Cada clip es una cámara nueva: sin 'hold' ni cuenta 'periodic' heredados del anterior
+        policy = CascadePolicy(1, **options)
+        clip_outputs = []
+        for frame in clip['frames']:
+            start = time.perf_counter()
+            detections = detect(*light, frame)
+            light_time = time.perf_counter() - start
+            reason = policy.escalation_reason(0, detections)
+            if reason is None:
+                policy.record(0, None, light_time)
+            else:
+                heavy_start = time.perf_counter()
+                detections = detect(*heavy, frame)
+                policy.record(0, reason, light_time, time.perf_counter() - heavy_start, detections)
+                escalations[reason] += 1
+            latencies.append(time.perf_counter() - start)
+            clip_outputs.append(detections.select(detections.confidences >= conf))
+        outputs.append(clip_outputs)
+    return outputs, np.array(latencies), time.perf_counter() - started, escalations
+
+
+def summarize(reference, outputs, latencies, elapsed, iou_threshold=0.5):
+    """Recall por clase, precisión, concordancia de conteos, latencia y FPS de una configuración"""
+    reference_counts = np.zeros(len(VEHICLE_CLASSES), dtype=np.int64)
+    hits = np.zeros(len(VEHICLE_CLASSES), dtype=np.int64)
+    detected = 0
+    agreement = []
+    frames = 0
+    for reference_clip, clip in zip(reference, outputs):
+        for expected, found in zip(reference_clip, clip):
+            frames += 1
+            expected_counts = expected.class_counts()
+            found_counts = found.class_counts()
+            reference_counts += expected_counts
+            detected += len(found)
+            hits += match_frame(expected, found, iou_threshold)
+            difference = np.abs(expected_counts - found_counts).sum()
+            agreement.append(1.0 - difference / max(expected_counts.sum(), found_counts.sum(), 1))
+
+    present = reference_counts > 0
+    recall = np.where(present, hits / np.maximum(reference_counts, 1), np.nan)
+    return {
+        'recall': {name: (round(float(recall[i]), 3) if present[i] else None)
+                   for i, name in enumerate(VEHICLE_CLASSES)},
+        'mean_recall': round(float(np.nanmean(recall)), 3) if present.any() else None,
+        'precision': round(float(hits.sum() / detected), 3) if detected else None,
+        'count_agreement': round(float(np.mean(agreement)), 3) if agreement else None,
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 1),
+        'latency_p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 1),
+        'fps': round(frames / elapsed, 2) if elapsed else None,
+        'frames': frames,
+        'inferences': len(latencies),
+        'reference_boxes': {name: int(reference_counts[i]) for i, name in enumerate(VEHICLE_CLASSES)}
+    }
+
+
+def pareto_front(points):
+    """Índices de los puntos (velocidad, calidad) que ninguna otra configuración domina"""
+    front = []
+    for i, (speed, quality) in enumerate(points):
+        if quality is None:
+            continue
+        dominated = any(
+            other_quality is not None and other_speed >= speed and other_quality >= quality and
+            (other_speed > speed or other_quality > quality)
+            for j, (other_speed, other_quality) in enumerate(points) if j != i
+        )
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def format_value(value, width, digits=3):
+    if value is None:
+        return f"{'-':>{width}}"
+    return f"{value:>{width}.{digits}f}" if isinstance(value, float) else f"{value:>{width}}"
+
+
+def print_table(rows):
+    header = f"{'modelo':<22} {'imgsz':>5} {'conf':>5} {'strd':>4} {'tile':>4} {'fps':>7} {'p50ms':>7} " \
+             f"{'p95ms':>7} {'recall':>6} {'ambul':>6} {'prec':>6} {'conteo':>6}  pareto"
+    print(header)
+    print('-' * len(header))
+    for row in sorted(rows, key=lambda r: -(r['fps'] or 0)):
+        marks = ('R' if row['pareto'] else ' ') + ('A' if row['pareto_ambulancia'] else ' ')
+        print(f"{os.path.basename(row['model'])[-22:]:<22} {row['imgsz']:>5} {row['conf']:>5.2f} "
+              f"{row['stride']:>4} {row['tile_size'] or '-':>4} {format_value(row['fps'], 7, 1)} "
+              f"{format_value(row['latency_p50_ms'], 7, 1)} {format_value(row['latency_p95_ms'], 7, 1)} "
+              f"{format_value(row['mean_recall'], 6)} {format_value(row['recall']['ambulancia'], 6)} "
+              f"{format_value(row['precision'], 6)} {format_value(row['count_agreement'], 6)}  {marks}")
+    print("\nPareto: R = FPS contra recall medio, A = FPS contra recall de ambulancia")
+
+
+def save_results(output_dir, report):
+    os.makedirs(output_dir, exist_ok=True)
+    name = datetime.now().strftime('%Y%m%d-%H%M%S')
+    json_path = os.path.join(output_dir, f'{name}.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    csv_path = os.path.join(output_dir, f'{name}.csv')
+    columns = ['model', 'imgsz', 'conf', 'stride', 'tile_size', 'fps', 'latency_p50_ms', 'latency_p95_ms',
+               'mean_recall', 'precision', 'count_agreement', 'pareto', 'pareto_ambulancia']
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns + [f'recall_{name}' for name in VEHICLE_CLASSES])
+        for row in report['configs']:
+            writer.writerow([row[column] for column in columns] + [row['recall'][name] for name in VEHICLE_CLASSES])
+    return json_path, csv_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa precisión contra velocidad de una matriz de configuraciones")
+    parser.add_argument('--images', default='images', help="Directorio de imágenes ('' para omitir)")
+    parser.add_argument('--max-images', type=int, default=None, help="Máximo de imágenes a usar")
+    parser.add_argument('--videos', nargs='*', help="Videos de prueba (por defecto videos/*.mp4)")
+    parser.add_argument('--clips', type=int, default=3, help="Clips por video")
+    parser.add_argument('--clip-frames', type=int, default=8, help="Frames consecutivos por clip")
+    parser.add_argument('--models', nargs='*', default=[Config.MODEL_PATH],
+                        help="Modelos o backends exportados (.pt, .onnx, .engine, directorio OpenVINO...)")
+    parser.add_argument('--imgsz', type=int, nargs='*', default=[480, 640])
+    parser.add_argument('--conf', type=float, nargs='*', default=[Config.CONFIDENCE_THRESHOLD])
+    parser.add_argument('--stride', type=int, nargs='*', default=[1, 2])
+    parser.add_argument('--tile-sizes', type=int, nargs='*', default=[0], help="0 = sin tiles")
+    parser.add_argument('--reference-model', default=Config.MODEL_PATH)
+    parser.add_argument('--reference-imgsz', type=int, default=960)
+    parser.add_argument('--reference-conf', type=float, default=Config.CONFIDENCE_THRESHOLD)
+    parser.add_argument('--iou', type=float, default=0.5, help="IoU mínimo para considerar una caja encontrada")
+    parser.add_argument('--cascade-light', default=Config.CASCADE_LIGHT_MODEL or None,
+                        help="Modelo liviano de la cascada (por defecto CASCADE_LIGHT_MODEL; sin él no se evalúa)")
+    parser.add_argument('--cascade-heavy', default=Config.MODEL_PATH, help="Modelo pesado de la cascada")
+    parser.add_argument('--output-dir', default=os.path.join('resultados', 'evaluacion'))
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+
+    videos = sorted(set(glob.glob('videos/*.mp4')) | set(p for p in Config.VIDEO_PATHS if os.path.exists(p))) \
+        if args.videos is None else args.videos
+    dataset = load_dataset(args.images, videos, args.clips, args.clip_frames, args.max_images)
+    if not dataset:
+        raise SystemExit("❌ No hay imágenes ni videos para evaluar")
+    frame_total = sum(len(clip['frames']) for clip in dataset)
+    print(f"🗂️ {len(dataset)} clips, {frame_total} frames ({len(videos)} videos)")
+
+    models = {}
+
+    def load(path):
+        if path not in models:
+            model = YOLO(path)
+            models[path] = (model, build_class_index(model.names))
+        return models[path]
+
+    print(f"🎯 Referencia: {args.reference_model} imgsz={args.reference_imgsz} conf={args.reference_conf}")
+    model, class_index = load(args.reference_model)
+    reference, _, _ = run_config(model, class_index, dataset, args.reference_imgsz, args.reference_conf)
+
+    rows = []
+    matrix = list(itertools.product(args.models, args.imgsz, args.conf, args.stride, args.tile_sizes))
+    for number, (model_path, imgsz, conf, stride, tile_size) in enumerate(matrix, start=1):
+        # Con tiles el imgsz es el del tile: no tiene sentido repetir la corrida por cada imgsz
+        if tile_size and imgsz != args.imgsz[0]:
+            continue
+        try:
+            model, class_index = load(model_path)
+            outputs, latencies, elapsed = run_config(model, class_index, dataset, imgsz, conf, stride, tile_size)
+        except Exception as e:
+            print(f"⚠️ [{number}/{len(matrix)}] {model_path} imgsz={imgsz}: {e}")
+            continue
+        row = dict(model=model_path, imgsz=tile_size or imgsz, conf=conf, stride=stride, tile_size=tile_size,
+                   **summarize(reference, outputs, latencies, elapsed, args.iou))
+        rows.append(row)
+        print(f"✅ [{number}/{len(matrix)}] {os.path.basename(model_path)} imgsz={row['imgsz']} conf={conf} "
+              f"stride={stride} tiles={tile_size or '-'}: {row['fps']} FPS, recall {row['mean_recall']}")
+
+    # Cascada: por cada imgsz y confianza, contra el pesado solo con los mismos parámetros
+    cascade_checks = []
+    for imgsz, conf in (itertools.product(args.imgsz, args.conf) if args.cascade_light else []):
+        try:
+            outputs, latencies, elapsed, escalations = run_cascade(
+                load(args.cascade_light), load(args.cascade_heavy), dataset, imgsz, conf, Config.CASCADE)
+        except Exception as e:
+            print(f"⚠️ Cascada {args.cascade_light} imgsz={imgsz}: {e}")
+            continue
+        heavy_alone = next((row for row in rows if row['model'] == args.cascade_heavy and row['imgsz'] == imgsz
+                            and row['conf'] == conf and row['stride'] == 1 and not row['tile_size']), None)
+        if heavy_alone is None:
+            model, class_index = load(args.cascade_heavy)
+            heavy_alone = dict(model=args.cascade_heavy, imgsz=imgsz, conf=conf, stride=1, tile_size=0,
+                               **summarize(reference, *run_config(model, class_index, dataset, imgsz, conf),
+                                           args.iou))
+            rows.append(heavy_alone)
+        row = dict(model=f"{os.path.basename(args.cascade_light)}>{os.path.basename(args.cascade_heavy)}",
+                   imgsz=imgsz, conf=conf, stride=1, tile_size=0,
+                   **summarize(reference, outputs, latencies, elapsed, args.iou))
+        cascade_recall, heavy_recall = row['recall']['ambulancia'], heavy_alone['recall']['ambulancia']
+        row['cascade'] = {
+            'light_model': args.cascade_light,
+            'heavy_model': args.cascade_heavy,
+            'heavy_rate': round(sum(escalations.values()) / max(row['frames'], 1), 3),
+            'escalations': escalations,
+            'heavy_alone_ambulance_recall': heavy_recall,
+            # Sin ambulancias en la referencia no hay nada que comparar
+            'ambulance_recall_ok': None if heavy_recall is None else cascade_recall >= heavy_recall
+        }
+        rows.append(row)
+        cascade_checks.append(row)
+        print(f"✅ Cascada imgsz={imgsz} conf={conf}: {row['fps']} FPS, pesado en "
+              f"{row['cascade']['heavy_rate']:.0%} de los frames, recall de ambulancia {cascade_recall} "
+              f"(pesado solo: {heavy_recall})")
+
+    if not rows:
+        raise SystemExit("❌ Ninguna configuración se pudo evaluar")
+    front = set(pareto_front([(row['fps'], row['mean_recall']) for row in rows]))
+    front_ambulance = set(pareto_front([(row['fps'], row['recall']['ambulancia']) for row in rows]))
+    for index, row in enumerate(rows):
+        row['pareto'] = index in front
+        row['pareto_ambulancia'] = index in front_ambulance
+
+    print()
+    print_table(rows)
+    for row in cascade_checks:
+        check = row['cascade']
+        if check['ambulance_recall_ok'] is None:
+            print(f"\n⚠️ Cascada imgsz={row['imgsz']}: la referencia no tiene ambulancias, "
+                  f"agregar imágenes o clips con ambulancias para verificarla")
+        elif check['ambulance_recall_ok']:
+            print(f"\n✅ Cascada imgsz={row['imgsz']}: recall de ambulancia {row['recall']['ambulancia']} "
+                  f">= {check['heavy_alone_ambulance_recall']} del pesado solo")
+        else:
+            print(f"\n❌ Cascada imgsz={row['imgsz']}: recall de ambulancia {row['recall']['ambulancia']} "
+                  f"< {check['heavy_alone_ambulance_recall']} del pesado solo (motivos: {check['escalations']})")
+    report = {
+        'reference': {'model': args.reference_model, 'imgsz': args.reference_imgsz, 'conf': args.reference_conf},
+        'dataset': {'clips': len(dataset), 'frames': frame_total, 'images_dir': args.images, 'videos': videos},
+        'iou': args.iou,
+        'cascade': [dict(row['cascade'], imgsz=row['imgsz'], conf=row['conf']) for row in cascade_checks],
+        'configs': rows
+    }
+    json_path, csv_path = save_results(args.output_dir, report)
+    print(f"\n💾 Resultados en {json_path} y {csv_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Cámara IP falsa: sirve un video local como stream MJPEG por HTTP.
+
+Sirve para probar la ingesta en vivo (LiveVideoSource) sin una cámara real.
+El video se reproduce en bucle al ritmo indicado y, opcionalmente, el servidor
+simula cortes periódicos para probar la reconexión.
+
+Uso:
+    python -m src.tools.fake_camera videos/videoplayback.mp4 --port 8081
+    python -m src.tools.fake_camera videos/videoplayback.mp4 --outage-every 30 --outage-seconds 5
+
+Y en otra terminal:
+    VIDEO_PATHS=http://127.0.0.1:8081/stream.mjpg,videos/videoplayback1.mp4,... python run.py
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+from src.traffic.streaming import mjpeg_part
+
+
+class FakeCamera:
+    """Reproduce el video en un hilo y guarda el último frame ya codificado"""
+
+    def __init__(self, video_path, fps=None, width=None, quality=80, outage_every=0, outage_seconds=0):
+        self.video_path = video_path
+        self.quality = quality
+        self.width = width
+        self.outage_every = outage_every
+        self.outage_seconds = outage_seconds
+        self.condition = threading.Condition()
+        self.part = None
+        self.seq = 0
+        self.started_at = time.monotonic()
+
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise SystemExit(f"❌ No se pudo abrir el video: {video_path}")
+        self.fps = fps or cap.get(cv2.CAP_PROP_FPS) or 25
+        cap.release()
+
+    def in_outage(self):
+        """Si en este momento se está simulando un corte"""
+        if not self.outage_every:
+            return False
+        elapsed = (time.monotonic() - self.started_at) % (self.outage_every + self.outage_seconds)
+        return elapsed >= self.outage_every
+
+    def run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        interval = 1.0 / self.fps
+        next_time = time.monotonic()
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                # Fin del archivo: volver al principio
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            if self.width and frame.shape[1] > self.width:
+                height = int(round(frame.shape[0] * self.width / frame.shape[1]))
+                frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if ok:
+                with self.condition:
+                    self.part = mjpeg_part(jpeg.tobytes())
+                    self.seq += 1
+                    self.condition.notify_all()
+
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def wait(self, last_seq, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.seq != last_seq, timeout)
+            return self.seq, self.part
+
+
+def make_handler(camera):
+    class StreamHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/stream.mjpg':
+                self.send_error(404)
+                return
+            if camera.in_outage():
+                self.send_error(503, "Corte simulado")
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            last_seq = 0
+            try:
+                while not camera.in_outage():
+                    last_seq, part = camera.wait(last_seq)
+                    if part:
+                        self.wfile.write(part)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            # Al empezar un corte simplemente se cierra la conexión
+
+        def log_message(self, format, *args):
+            print(f"📷 {self.address_string()} {format % args}")
+
+    return StreamHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servir un video local como cámara MJPEG por HTTP")
+    parser.add_argument('video', help="Archivo de video a reproducir en bucle")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--fps', type=float, default=None, help="FPS del stream (por defecto los del video)")
+    parser.add_argument('--width', type=int, default=None, help="Reducir los frames a este ancho")
+    parser.add_argument('--quality', type=int, default=80, help="Calidad JPEG")
+    parser.add_argument('--outage-every', type=float, default=0, help="Simular un corte cada N segundos")
+    parser.add_argument('--outage-seconds', type=float, default=5, help="Duración de cada corte simulado")
+    args = parser.parse_args()
+
+    camera = FakeCamera(args.video, fps=args.fps, width=args.width, quality=args.quality,
+                        outage_every=args.outage_every, outage_seconds=args.outage_seconds)
+    threading.Thread(target=camera.run, name='fake-camera', daemon=True).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(camera))
+    server.daemon_threads = True
+    print(f"📡 Cámara falsa en http://{args.host}:{args.port}/stream.mjpg ({camera.fps:.1f} FPS)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
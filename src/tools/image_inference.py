@@ -0,0 +1,163 @@
+"""Inferencia masiva sobre un directorio de imágenes.
+
+Las imágenes se decodifican y se les aplica letterbox en un pool de hilos, se
+agrupan en lotes de tamaño fijo y cada resultado se escribe apenas está listo
+en un archivo JSONL. Solo hay en memoria unos pocos lotes a la vez, así que el
+uso de memoria no depende de la cantidad de imágenes del directorio.
+
+Uso:
+    python -m src.tools.image_inference images/ --output detecciones.jsonl
+    python -m src.tools.image_inference /datos/fotos --batch-size 16 --workers 8
+
+Cada línea del JSONL es una imagen:
+    {"path": ..., "width": ..., "height": ..., "counts": {...}, "detections": [...]}
+o, si no se pudo leer, {"path": ..., "error": ...}. La última línea tiene los
+totales: {"totals": {...}, "images": N, "errors": M, "elapsed_seconds": S}.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from src.utils.constants import VEHICLE_CLASSES
+from src.utils.helpers import build_class_lookup
+from src.utils.imaging import read_image, letterbox, unletterbox_boxes
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.avif', '.tif', '.tiff'}
+
+
+def iter_images(root):
+    """Recorrer el directorio de forma perezosa (sin listar todo en memoria)"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield entry.path
+
+
+def load_image(path, size):
+    """Decodificar y aplicar letterbox (se ejecuta en el pool de hilos)"""
+    try:
+        image = read_image(path)
+    except Exception as e:
+        return {'path': path, 'error': str(e)}
+    canvas, scale, pad = letterbox(image, size)
+    return {'path': path, 'image': canvas, 'scale': scale, 'pad': pad, 'shape': image.shape[:2]}
+
+
+def iter_batches(paths, pool, size, batch_size, max_in_flight):
+    """Agrupar imágenes decodificadas en lotes, con un máximo de tareas pendientes"""
+    pending = deque()
+    batch = []
+    paths = iter(paths)
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < max_in_flight:
+            path = next(paths, None)
+            if path is None:
+                exhausted = True
+                break
+            pending.append(pool.submit(load_image, path, size))
+        if not pending:
+            break
+        batch.append(pending.popleft().result())
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def detections_for(result, item, class_lookup, model_names):
+    detections = []
+    counts = Counter()
+    if result.boxes is None or len(result.boxes) == 0:
+        return detections, counts
+
+    boxes = unletterbox_boxes(result.boxes.xyxy.cpu().numpy(), item['scale'], item['pad'], item['shape'])
+    class_ids = result.boxes.cls.cpu().numpy().astype(int)
+    confidences = result.boxes.conf.cpu().numpy()
+    for box, class_id, confidence in zip(boxes, class_ids, confidences):
+        class_name = class_lookup.get(int(class_id))
+        if class_name:
+            counts[class_name] += 1
+        detections.append({
+            'class': class_name or model_names[int(class_id)],
+            'confidence': round(float(confidence), 4),
+            'box': [round(float(v), 1) for v in box]
+        })
+    return detections, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inferencia por lotes sobre un directorio de imágenes")
+    parser.add_argument('directory', help="Directorio con imágenes (se recorre recursivamente)")
+    parser.add_argument('--output', default='detecciones.jsonl', help="Archivo JSONL de salida")
+    parser.add_argument('--model', default=Config.MODEL_PATH, help="Modelo YOLO")
+    parser.add_argument('--imgsz', type=int, default=640, help="Tamaño del letterbox / entrada del modelo")
+    parser.add_argument('--batch-size', type=int, default=8, help="Imágenes por lote de inferencia")
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 2), help="Hilos de decodificación")
+    parser.add_argument('--prefetch', type=int, default=2, help="Lotes decodificados por adelantado")
+    parser.add_argument('--conf', type=float, default=Config.CONFIDENCE_THRESHOLD, help="Confianza mínima")
+    parser.add_argument('--device', default='cpu', help="Dispositivo de inferencia (cpu, cuda:0...)")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    class_lookup = build_class_lookup(model.names)
+
+    totals = Counter()
+    images = errors = 0
+    started = time.time()
+    max_in_flight = args.batch_size * (args.prefetch + 1)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool, open(args.output, 'w', encoding='utf-8') as output:
+        for batch in iter_batches(iter_images(args.directory), pool, args.imgsz, args.batch_size, max_in_flight):
+            loaded = [item for item in batch if 'error' not in item]
+            for item in batch:
+                if 'error' in item:
+                    errors += 1
+                    output.write(json.dumps({'path': item['path'], 'error': item['error']}, ensure_ascii=False) + '\n')
+
+            if loaded:
+                # Todas las imágenes tienen el mismo tamaño: el modelo las procesa como un solo tensor
+                results = model([item['image'] for item in loaded], conf=args.conf, imgsz=args.imgsz,
+                                device=args.device, verbose=False)
+                for item, result in zip(loaded, results):
+                    detections, counts = detections_for(result, item, class_lookup, model.names)
+                    totals.update(counts)
+                    images += 1
+                    output.write(json.dumps({
+                        'path': item['path'],
+                        'width': int(item['shape'][1]),
+                        'height': int(item['shape'][0]),
+                        'counts': dict(counts),
+                        'detections': detections
+                    }, ensure_ascii=False) + '\n')
+
+            output.flush()
+            print(f"📷 {images} imágenes procesadas ({errors} con error) - "
+                  f"{images / max(time.time() - started, 1e-6):.1f} img/s", end='\r')
+
+        summary = {
+            'totals': {class_name: totals[class_name] for class_name in VEHICLE_CLASSES},
+            'images': images,
+            'errors': errors,
+            'elapsed_seconds': round(time.time() - started, 2)
+        }
+        output.write(json.dumps(summary, ensure_ascii=False) + '\n')
+
+    print(f"\n✅ Resultados en: {args.output}")
+    print("\n=== Detecciones totales por clase ===")
+    for class_name in VEHICLE_CLASSES:
+        print(f"{class_name}: {totals[class_name]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+"""Análisis offline de grabaciones largas, en paralelo y reanudable.
+
+El video se divide en segmentos de tiempo que se procesan en varios procesos
+con inferencia por lotes. Cada segmento terminado se guarda en disco, así un
+trabajo interrumpido continúa donde quedó al volver a ejecutarlo.
+
+Uso:
+    python -m src.tools.video_analytics videos/videoplayback.mp4 --workers 4
+    python -m src.tools.video_analytics grabacion.mp4 --segment-seconds 600 --annotated
+
+Salida (en --output-dir):
+    summary.json      totales por clase, serie por minuto y parámetros
+    totals.csv        detecciones totales por clase
+    timeseries.csv    detecciones por minuto y clase
+    annotated.mp4     video anotado (solo con --annotated)
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from config import Config
+from src.utils.constants import VEHICLE_CLASSES
+from src.utils.helpers import build_class_lookup
+
+# Estado de cada proceso de trabajo (se carga una vez por proceso)
+_worker = {}
+
+
+def probe_video(video_path):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"❌ No se pudo abrir el video: {video_path}")
+    info = {
+        'fps': cap.get(cv2.CAP_PROP_FPS) or 30.0,
+        'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    }
+    cap.release()
+    return info
+
+
+def split_segments(frame_count, fps, segment_seconds):
+    """Lista de (índice, frame inicial, frame final exclusivo)"""
+    frames_per_segment = max(1, int(round(segment_seconds * fps)))
+    return [
+        (index, start, min(start + frames_per_segment, frame_count))
+        for index, start in enumerate(range(0, frame_count, frames_per_segment))
+    ]
+
+
+def init_worker(model_path, device, torch_threads):
+    import torch
+    from ultralytics import YOLO
+
+    # Repartir los núcleos entre los procesos en lugar de sobresuscribirlos
+    torch.set_num_threads(torch_threads)
+    model = YOLO(model_path)
+    _worker['model'] = model
+    _worker['device'] = device
+    _worker['class_lookup'] = build_class_lookup(model.names)
+
+
+def segment_path(output_dir, index, extension):
+    return os.path.join(output_dir, 'segments', f'segment_{index:05d}.{extension}')
+
+
+def write_json_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def process_segment(task):
+    """Procesar un segmento del video en un proceso de trabajo"""
+    model = _worker['model']
+    class_lookup = _worker['class_lookup']
+    index, start, end = task['segment']
+    fps = task['fps']
+    started = time.time()
+
+    cap = cv2.VideoCapture(task['video_path'])
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    writer = None
+    video_tmp_path = None
+    if task['annotated']:
+        video_tmp_path = segment_path(task['output_dir'], index, 'part.mp4')
+        writer = cv2.VideoWriter(video_tmp_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                                 fps / task['stride'], (task['width'], task['height']))
+
+    totals = Counter()
+    per_minute = defaultdict(Counter)
+    frames_per_minute = Counter()
+    processed = 0
+
+    def flush(batch, batch_indices):
+        nonlocal processed
+        results = model(batch, conf=task['conf'], imgsz=task['imgsz'], device=_worker['device'], verbose=False)
+        for frame_index, result in zip(batch_indices, results):
+            minute = int(frame_index / fps // 60)
+            frames_per_minute[minute] += 1
+            if result.boxes is not None and len(result.boxes) > 0:
+                for class_id in result.boxes.cls.cpu().numpy().astype(int):
+                    class_name = class_lookup.get(int(class_id))
+                    if class_name:
+                        totals[class_name] += 1
+                        per_minute[minute][class_name] += 1
+            if writer is not None:
+                writer.write(result.plot())
+            processed += 1
+
+    batch, batch_indices = [], []
+    frame_index = start
+    while frame_index < end:
+        # Los frames salteados por --stride solo se avanzan, no se decodifican
+        if (frame_index - start) % task['stride']:
+            if not cap.grab():
+                break
+            frame_index += 1
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        batch.append(frame)
+        batch_indices.append(frame_index)
+        frame_index += 1
+        if len(batch) == task['batch_size']:
+            flush(batch, batch_indices)
+            batch, batch_indices = [], []
+    if batch:
+        flush(batch, batch_indices)
+
+    cap.release()
+    if writer is not None:
+        writer.release()
+        os.replace(video_tmp_path, segment_path(task['output_dir'], index, 'mp4'))
+
+    result = {
+        'segment': index,
+        'start_frame': start,
+        'end_frame': end,
+        'frames_processed': processed,
+        'totals': dict(totals),
+        'per_minute': {str(minute): dict(counts) for minute, counts in per_minute.items()},
+        'frames_per_minute': {str(minute): count for minute, count in frames_per_minute.items()},
+        'elapsed_seconds': round(time.time() - started, 2)
+    }
+    # El JSON se escribe al final: su existencia marca el segmento como terminado
+    write_json_atomic(segment_path(task['output_dir'], index, 'json'), result)
+    return result
+
+
+def load_manifest(output_dir, manifest, force):
+    """Verificar que un trabajo previo en el mismo directorio usó los mismos parámetros"""
+    path = os.path.join(output_dir, 'manifest.json')
+    if os.path.exists(path) and not force:
+        with open(path, encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous != manifest:
+            raise SystemExit(f"❌ {output_dir} tiene un trabajo con otros parámetros. "
+                             f"Usa otro --output-dir o --force para empezar de nuevo.")
+        return True
+    if force:
+        for name in os.listdir(os.path.join(output_dir, 'segments')):
+            os.remove(os.path.join(output_dir, 'segments', name))
+    write_json_atomic(path, manifest)
+    return False
+
+
+def merge_results(results, class_names):
+    totals = Counter()
+    per_minute = defaultdict(Counter)
+    frames_per_minute = Counter()
+    for result in results:
+        totals.update(result['totals'])
+        frames_per_minute.update({int(m): c for m, c in result['frames_per_minute'].items()})
+        for minute, counts in result['per_minute'].items():
+            per_minute[int(minute)].update(counts)
+
+    timeseries = []
+    for minute in sorted(frames_per_minute):
+        frames = frames_per_minute[minute]
+        row = {'minute': minute, 'time': time.strftime('%H:%M:%S', time.gmtime(minute * 60)), 'frames': frames}
+        for class_name in class_names:
+            row[class_name] = per_minute[minute][class_name]
+            # Promedio de vehículos visibles por frame en ese minuto
+            row[f'{class_name}_per_frame'] = round(per_minute[minute][class_name] / frames, 3) if frames else 0
+        timeseries.append(row)
+
+    return {
+        'totals': {class_name: totals[class_name] for class_name in class_names},
+        'frames_processed': sum(frames_per_minute.values()),
+        'timeseries': timeseries
+    }
+
+
+def write_outputs(output_dir, summary, class_names):
+    write_json_atomic(os.path.join(output_dir, 'summary.json'), summary)
+
+    with open(os.path.join(output_dir, 'totals.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['clase', 'detecciones'])
+        for class_name in class_names:
+            writer.writerow([class_name, summary['totals'][class_name]])
+
+    with open(os.path.join(output_dir, 'timeseries.csv'), 'w', newline='', encoding='utf-8') as f:
+        fields = ['minute', 'time', 'frames'] + class_names + [f'{name}_per_frame' for name in class_names]
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(summary['timeseries'])
+
+
+def concat_annotated(output_dir, segments, fps, size):
+    """Unir los videos anotados de cada segmento en uno solo"""
+    output_path = os.path.join(output_dir, 'annotated.mp4')
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+    for index, _, _ in segments:
+        cap = cv2.VideoCapture(segment_path(output_dir, index, 'mp4'))
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(frame)
+        cap.release()
+    writer.release()
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis offline de video por segmentos en paralelo")
+    parser.add_argument('video', help="Video a analizar")
+    parser.add_argument('--model', default=Config.MODEL_PATH, help="Modelo YOLO")
+    parser.add_argument('--output-dir', help="Directorio de resultados (por defecto resultados/<video>)")
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Procesos de trabajo")
+    parser.add_argument('--segment-seconds', type=float, default=300, help="Duración de cada segmento")
+    parser.add_argument('--batch-size', type=int, default=8, help="Frames por lote de inferencia")
+    parser.add_argument('--stride', type=int, default=1, help="Procesar 1 de cada N frames")
+    parser.add_argument('--conf', type=float, default=Config.CONFIDENCE_THRESHOLD, help="Confianza mínima")
+    parser.add_argument('--imgsz', type=int, default=640, help="Tamaño de entrada del modelo")
+    parser.add_argument('--device', default='cpu', help="Dispositivo de inferencia (cpu, cuda:0...)")
+    parser.add_argument('--annotated', action='store_true', help="Guardar también el video anotado")
+    parser.add_argument('--force', action='store_true', help="Descartar un trabajo previo y empezar de nuevo")
+    args = parser.parse_args()
+
+    video_name = os.path.splitext(os.path.basename(args.video))[0]
+    output_dir = args.output_dir or os.path.join('resultados', video_name)
+    os.makedirs(os.path.join(output_dir, 'segments'), exist_ok=True)
+
+    info = probe_video(args.video)
+    segments = split_segments(info['frame_count'], info['fps'], args.segment_seconds)
+
+    manifest = {
+        'video': os.path.abspath(args.video),
+        'video_size': os.path.getsize(args.video),
+        'model': args.model,
+        'segment_seconds': args.segment_seconds,
+        'stride': args.stride,
+        'conf': args.conf,
+        'imgsz': args.imgsz,
+        'annotated': args.annotated
+    }
+    resumed = load_manifest(output_dir, manifest, args.force)
+
+    done = [s for s in segments if os.path.exists(segment_path(output_dir, s[0], 'json'))]
+    pending = [s for s in segments if s not in done]
+    print(f"🎥 {args.video}: {info['frame_count']} frames a {info['fps']:.1f} fps, {len(segments)} segmentos")
+    if resumed:
+        print(f"↩️ Reanudando: {len(done)} segmentos ya terminados")
+
+    started = time.time()
+    if pending:
+        workers = min(args.workers, len(pending))
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+        base_task = {
+            'video_path': args.video, 'output_dir': output_dir, 'fps': info['fps'],
+            'width': info['width'], 'height': info['height'], 'annotated': args.annotated,
+            'batch_size': args.batch_size, 'stride': max(1, args.stride), 'conf': args.conf,
+            'imgsz': args.imgsz
+        }
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(args.model, args.device, torch_threads)) as executor:
+            futures = [executor.submit(process_segment, dict(base_task, segment=segment)) for segment in pending]
+            for completed, future in enumerate(as_completed(futures), start=len(done) + 1):
+                result = future.result()
+                print(f"✅ Segmento {result['segment'] + 1} listo ({completed}/{len(segments)}) - "
+                      f"{result['frames_processed']} frames en {result['elapsed_seconds']}s")
+
+    results = []
+    for index, _, _ in segments:
+        with open(segment_path(output_dir, index, 'json'), encoding='utf-8') as f:
+            results.append(json.load(f))
+
+    class_names = list(VEHICLE_CLASSES)
+    summary = merge_results(results, class_names)
+    summary.update({'video': manifest, 'fps': info['fps'], 'segments': len(segments),
+                    'elapsed_seconds': round(time.time() - started, 2)})
+    write_outputs(output_dir, summary, class_names)
+
+    if args.annotated:
+        size = (info['width'], info['height'])
+        print(f"🎞️ Video anotado: {concat_annotated(output_dir, segments, info['fps'] / max(1, args.stride), size)}")
+
+    print(f"\n✅ Procesamiento terminado. Resultados en: {output_dir}")
+    print("\n=== Detecciones totales por clase ===")
+    for class_name in class_names:
+        print(f"{class_name}: {summary['totals'][class_name]}")
+
+
+if __name__ == '__main__':
+    main()
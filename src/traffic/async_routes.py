@@ -0,0 +1,221 @@
+import asyncio
+from functools import wraps, partial
+from itsdangerous import BadSignature
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import Response, RedirectResponse, StreamingResponse
+from starlette.routing import Route, Mount
+from a2wsgi import WSGIMiddleware
+from flask_login.config import COOKIE_NAME
+from flask_login.utils import decode_cookie
+from config import Config
+from src.auth.tokens import verify_api_token, get_request_token
+from src.traffic.instance import traffic_detector
+from src.traffic.ipc import DetectorUnavailable
+from src.traffic.preview import acquire_preview, release_preview
+from src.traffic.routes import (get_stream_variant, valid_camera_id, detection_payload,
+                                camera_payload, semaphore_payload)
+
+
+async def run_blocking(func, *args):
+    """Ejecutar en el pool de hilos una llamada que puede bloquear.
+
+    En modo 'remote' cada consulta al detector es un RPC por socket Unix: si se
+    hiciera en el event loop, un servicio lento congelaría todos los streams.
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+
+def get_session(flask_app, request):
+    """Leer la cookie de sesión firmada de Flask (dict vacío si no hay o no es válida)"""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return {}
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if serializer is None:
+        return {}
+    try:
+        return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+def load_request_user(flask_app, request):
+    """Usuario de la sesión, de la cookie "recordarme" o del token de API, como lo resuelve Flask-Login.
+
+    El id se resuelve con el user_loader de la app (caché de usuarios), así un
+    usuario eliminado pierde el acceso igual que en las rutas de Flask.
+    Consulta la base de datos si la entrada de la caché venció: no llamar
+    desde el event loop.
+    """
+    login_manager = flask_app.login_manager
+    with flask_app.app_context():
+        session = get_session(flask_app, request)
+        user_id = session.get('_user_id')
+        if user_id is None and session.get('_remember') != 'clear':
+            cookie = request.cookies.get(flask_app.config.get('REMEMBER_COOKIE_NAME', COOKIE_NAME))
+            user_id = decode_cookie(cookie) if cookie else None
+        if user_id is not None:
+            user = login_manager.user_callback(user_id)
+            if user is not None:
+                return user
+
+        token = get_request_token(request.headers, request.query_params, request.url.path)
+        if token is None:
+            return None
+        return verify_api_token(flask_app.config['SECRET_KEY'], token, Config.API_TOKEN_MAX_AGE,
+                                login_manager.user_callback)
+
+
+def login_required(endpoint):
+    """Equivalente asíncrono de src.auth.decorators.login_required"""
+    @wraps(endpoint)
+    async def decorated_endpoint(request):
+        user = await run_blocking(load_request_user, request.app.state.flask_app, request)
+        if user is None:
+            return RedirectResponse(f"/auth/login?next={request.url.path}", status_code=302)
+        return await endpoint(request)
+    return decorated_endpoint
+
+
+def json_response(request, payload):
+    # Misma serialización que jsonify (fechas de los semáforos incluidas)
+    return Response(request.app.state.flask_app.json.dumps(payload), media_type='application/json')
+
+
+async def stream_frames(camera_id, variant):
+    """Generador MJPEG cooperativo: espera frames sin ocupar un hilo por cliente"""
+    # Al desconectarse el cliente Starlette cancela el generador y se ejecuta el finally
+    traffic_detector.add_stream_subscriber(camera_id, variant)
+    # Con la detección apagada el mismo canal recibe el video sin procesar
+    preview = acquire_preview(camera_id, variant)
+    last_seq = 0
+    try:
+        while True:
+            last_seq, frame_part = await traffic_detector.get_frame_async(camera_id, variant, last_seq)
+            if frame_part:
+                yield frame_part
+    finally:
+        release_preview(preview)
+        traffic_detector.remove_stream_subscriber(camera_id, variant)
+
+
+@login_required
+async def video_feed(request):
+    camera_id = request.path_params['camera_id']
+    if not valid_camera_id(camera_id):
+        raise HTTPException(status_code=404)
+    variant = get_stream_variant(request.query_params.get('variant'))
+    return StreamingResponse(stream_frames(camera_id, variant),
+                             media_type='multipart/x-mixed-replace; boundary=frame')
+
+
+@login_required
+async def api_detection_data(request):
+    return json_response(request, await run_blocking(detection_payload))
+
+
+@login_required
+async def api_camera_data(request):
+    if not valid_camera_id(request.path_params['camera_id']):
+        raise HTTPException(status_code=404)
+    return json_response(request, await run_blocking(camera_payload, request.path_params['camera_id']))
+
+
+@login_required
+async def api_camera_detections(request):
+    if not valid_camera_id(request.path_params['camera_id']):
+        raise HTTPException(status_code=404)
+    return json_response(request, await run_blocking(traffic_detector.get_camera_detections,
+                                                      request.path_params['camera_id']))
+
+
+@login_required
+async def api_heatmap(request):
+    if not valid_camera_id(request.path_params['camera_id']):
+        raise HTTPException(status_code=404)
+    return json_response(request, await run_blocking(traffic_detector.get_heatmap, request.path_params['camera_id']))
+
+
+@login_required
+async def api_lane_data(request):
+    camera_id = request.path_params.get('camera_id')
+    if camera_id is not None and not valid_camera_id(camera_id):
+        raise HTTPException(status_code=404)
+    return json_response(request, await run_blocking(traffic_detector.get_lane_data, camera_id))
+
+
+@login_required
+async def api_traffic_flow(request):
+    camera_id = request.path_params.get('camera_id')
+    if camera_id is not None and not valid_camera_id(camera_id):
+        raise HTTPException(status_code=404)
+    return json_response(request, await run_blocking(traffic_detector.get_traffic_flow, camera_id))
+
+
+@login_required
+async def api_snapshot(request):
+    mode = request.query_params.get('mode')
+    if mode not in (None, 'interpolate', 'nearest'):
+        return Response(request.app.state.flask_app.json.dumps({'error': 'mode debe ser interpolate o nearest'}),
+                        status_code=400, media_type='application/json')
+    try:
+        timestamp = float(request.query_params['t']) if 't' in request.query_params else None
+    except ValueError:
+        timestamp = None
+    return json_response(request, await run_blocking(traffic_detector.get_snapshot, timestamp, mode))
+
+
+@login_required
+async def api_health(request):
+    health = await run_blocking(traffic_detector.get_health)
+    status = 503 if health['processing'] and not health['healthy'] else 200
+    return Response(request.app.state.flask_app.json.dumps(health), status_code=status, media_type='application/json')
+
+
+@login_required
+async def api_accumulated_data(request):
+    camera_id = request.path_params.get('camera_id')
+    if camera_id is not None and not valid_camera_id(camera_id):
+        raise HTTPException(status_code=404)
+    return json_response(request, await run_blocking(traffic_detector.get_accumulated_data, camera_id))
+
+
+@login_required
+async def api_semaphore_data(request):
+    return json_response(request, await run_blocking(semaphore_payload))
+
+
+@login_required
+async def metrics(request):
+    return json_response(request, await run_blocking(traffic_detector.get_metrics))
+
+
+async def detector_unavailable(request, error):
+    return Response(request.app.state.flask_app.json.dumps({'success': False, 'error': str(error)}),
+                    status_code=503, media_type='application/json')
+
+
+def create_asgi_app(flask_app):
+    """Streams y endpoints en vivo asíncronos; el resto de la app Flask va por WSGI"""
+    routes = [
+        Route('/video_feed/{camera_id:int}', video_feed),
+        Route('/api/detection_data', api_detection_data),
+        Route('/api/camera_data/{camera_id:int}', api_camera_data),
+        Route('/api/camera_detections/{camera_id:int}', api_camera_detections),
+        Route('/api/heatmap/{camera_id:int}', api_heatmap),
+        Route('/api/lane_data', api_lane_data),
+        Route('/api/lane_data/{camera_id:int}', api_lane_data),
+        Route('/api/traffic_flow', api_traffic_flow),
+        Route('/api/traffic_flow/{camera_id:int}', api_traffic_flow),
+        Route('/api/snapshot', api_snapshot),
+        Route('/api/health', api_health),
+        Route('/api/accumulated_data', api_accumulated_data),
+        Route('/api/accumulated_data/{camera_id:int}', api_accumulated_data),
+        Route('/api/semaphore_data', api_semaphore_data),
+        Route('/metrics', metrics),
+        Mount('/', app=WSGIMiddleware(flask_app))
+    ]
+    app = Starlette(routes=routes, exception_handlers={DetectorUnavailable: detector_unavailable})
+    app.state.flask_app = flask_app
+    return app
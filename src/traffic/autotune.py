@@ -0,0 +1,150 @@
+"""Calibración de la inferencia al arrancar.
+
+Mide el FPS total de varias combinaciones de hilos intra-op de torch, tamaño
+de entrada (imgsz) e inferencias simultáneas sobre frames de muestra, y elige
+la más rápida para los núcleos de esta máquina. El resultado se guarda en un
+JSON indexado por máquina y hash del modelo, así solo se calibra una vez.
+"""
+import hashlib
+import json
+import os
+import platform
+import threading
+import time
+import cv2
+import numpy as np
+import torch
+
+
+def model_hash(model_path):
+    """SHA-256 del archivo del modelo (abreviado)"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def machine_key():
+    """Identificador de la máquina: host, arquitectura, núcleos y versión de torch"""
+    return f"{platform.node()}-{platform.machine()}-{os.cpu_count()}cpu-torch{torch.__version__}"
+
+
+def sample_frames(video_paths, count=4):
+    """Frames de muestra del primer video que se pueda abrir (o ruido si no hay ninguno)"""
+    for path in video_paths:
+        capture = cv2.VideoCapture(path)
+        frames = []
+        while len(frames) < count:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frames.append(frame)
+        capture.release()
+        if frames:
+            return frames
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def build_candidates(cores, imgsz_options, max_workers):
+    """Combinaciones (hilos, imgsz, workers) que no sobrepasan los núcleos disponibles"""
+    thread_options = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    candidates = []
+    for workers in range(1, max_workers + 1):
+        for threads in thread_options:
+            if threads * workers > cores:
+                continue
+            for imgsz in imgsz_options:
+                candidates.append({'threads': threads, 'imgsz': imgsz, 'workers': workers})
+    return candidates
+
+
+def measure(model, frames, candidate, seconds):
+    """FPS total con `workers` hilos infiriendo a la vez durante unos segundos"""
+    torch.set_num_threads(candidate['threads'])
+    model(frames[0], imgsz=candidate['imgsz'], verbose=False)  # calentamiento
+
+    counts = [0] * candidate['workers']
+    deadline = time.perf_counter() + seconds
+
+    def worker(index):
+        i = index
+        while time.perf_counter() < deadline:
+            model(frames[i % len(frames)], imgsz=candidate['imgsz'], verbose=False)
+            counts[index] += 1
+            i += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), name=f'autotune-{i}')
+               for i in range(candidate['workers'])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+
+def choose_best(results, tolerance):
+    """La más rápida; entre las que están dentro de la tolerancia, la de mayor imgsz y menos hilos"""
+    best_fps = max(result['fps'] for result in results)
+    close = [result for result in results if result['fps'] >= best_fps * (1 - tolerance)]
+    return max(close, key=lambda r: (r['imgsz'], -r['threads'] * r['workers'], r['fps']))
+
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def autotune(model, model_path, video_paths, cache_path, imgsz_options, max_workers,
+             seconds=2.0, tolerance=0.05):
+    """Devolver la configuración calibrada (desde el caché si ya existe para esta máquina y modelo)"""
+    key = f"{machine_key()}:{model_hash(model_path)}"
+    cache = load_cache(cache_path)
+    if key in cache:
+        print(f"⚙️ Autotuning desde caché: {cache[key]['best']}")
+        return dict(cache[key], cached=True)
+
+    cores = os.cpu_count() or 1
+    frames = sample_frames(video_paths)
+    candidates = build_candidates(cores, imgsz_options, max_workers)
+    print(f"⚙️ Calibrando inferencia: {len(candidates)} combinaciones en {cores} núcleos")
+
+    default_threads = torch.get_num_threads()
+    results = []
+    try:
+        for candidate in candidates:
+            fps = measure(model, frames, candidate, seconds)
+            results.append(dict(candidate, fps=round(fps, 2)))
+            print(f"   hilos={candidate['threads']} imgsz={candidate['imgsz']} "
+                  f"workers={candidate['workers']}: {fps:.1f} FPS")
+    finally:
+        torch.set_num_threads(default_threads)
+
+    best = choose_best(results, tolerance)
+    entry = {
+        'machine': machine_key(),
+        'cores': cores,
+        'best': best,
+        'candidates': results,
+        'calibrated_at': time.time()
+    }
+    cache[key] = entry
+    # Escritura atómica: otro proceso nunca lee un JSON a medio escribir
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el caché de autotuning: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+    print(f"⚙️ Configuración elegida: {best}")
+    return dict(entry, cached=False)
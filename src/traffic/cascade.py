@@ -0,0 +1,92 @@
+import threading
+import numpy as np
+from src.utils.constants import VEHICLE_CLASSES
+
+
+class CascadePolicy:
+    """Decide cuándo el modelo pesado vuelve a revisar un frame del modelo liviano.
+
+    El modelo liviano corre en todos los frames y se escala al pesado cuando:
+    - el frame es dudoso en conjunto ('uncertain'): al menos `uncertain_min`
+      detecciones en la banda de confianza dudosa y que sean al menos
+      `uncertain_fraction` del total. Una detección dudosa suelta no alcanza:
+      con tráfico denso casi todos los frames tienen alguna y el pesado
+      correría siempre (el tracker ya las usa en su segunda asociación),
+    - aparece una clase de emergencia con cualquier confianza ('emergency'),
+    - el pesado vio una emergencia hace menos de `hold_frames` frames ('hold'),
+    - pasaron `periodic_frames` frames sin revisar ('periodic'), para acotar
+      lo que el liviano pueda estar perdiendo por completo.
+    """
+
+    REASONS = ('uncertain', 'emergency', 'hold', 'periodic')
+
+    def __init__(self, cameras, uncertain_band=(0.25, 0.6), uncertain_min=3, uncertain_fraction=0.4,
+                 emergency_classes=('ambulancia',), periodic_frames=15, hold_frames=30):
+        self.low, self.high = uncertain_band
+        self.uncertain_min = uncertain_min
+        self.uncertain_fraction = uncertain_fraction
+        self.emergency_ids = np.array([VEHICLE_CLASSES.index(name) for name in emergency_classes], dtype=np.int64)
+        self.periodic_frames = periodic_frames
+        self.hold_frames = hold_frames
+        self.lock = threading.Lock()
+        self.since_heavy = [0] * cameras
+        self.hold = [0] * cameras
+        self.stats = [
+            {'frames': 0, 'heavy_runs': 0, 'light_time': 0.0, 'heavy_time': 0.0,
+             'reasons': dict.fromkeys(self.REASONS, 0)}
+            for _ in range(cameras)
+        ]
+
+    def escalation_reason(self, camera_id, detections):
+        """Motivo para correr el modelo pesado sobre este frame, o None"""
+        if len(detections) and np.isin(detections.class_ids, self.emergency_ids).any():
+            return 'emergency'
+        if self.hold[camera_id] > 0:
+            return 'hold'
+        confidences = detections.confidences
+        uncertain = np.count_nonzero((confidences >= self.low) & (confidences < self.high))
+        if uncertain >= self.uncertain_min and uncertain >= self.uncertain_fraction * len(confidences):
+            return 'uncertain'
+        if self.since_heavy[camera_id] + 1 >= self.periodic_frames:
+            return 'periodic'
+        return None
+
+    def record(self, camera_id, reason, light_time, heavy_time=0.0, heavy_detections=None):
+        with self.lock:
+            stats = self.stats[camera_id]
+            stats['frames'] += 1
+            stats['light_time'] += light_time
+            if reason is None:
+                self.since_heavy[camera_id] += 1
+                self.hold[camera_id] = max(0, self.hold[camera_id] - 1)
+                return
+            stats['heavy_runs'] += 1
+            stats['heavy_time'] += heavy_time
+            stats['reasons'][reason] += 1
+            self.since_heavy[camera_id] = 0
+            # Mientras el pesado siga viendo la emergencia, se sigue revisando cada frame
+            if heavy_detections is not None and np.isin(heavy_detections.class_ids, self.emergency_ids).any():
+                self.hold[camera_id] = self.hold_frames
+            else:
+                self.hold[camera_id] = max(0, self.hold[camera_id] - 1)
+
+    def get_stats(self):
+        with self.lock:
+            cameras = {}
+            for camera_id, stats in enumerate(self.stats):
+                frames, heavy_runs = stats['frames'], stats['heavy_runs']
+                cameras[f'camera_{camera_id}'] = {
+                    'frames': frames,
+                    'heavy_runs': heavy_runs,
+                    'heavy_rate': round(heavy_runs / frames, 3) if frames else 0.0,
+                    'avg_light_ms': round(stats['light_time'] / frames * 1000, 2) if frames else 0.0,
+                    'avg_heavy_ms': round(stats['heavy_time'] / heavy_runs * 1000, 2) if heavy_runs else 0.0,
+                    'reasons': dict(stats['reasons'])
+                }
+            total_frames = sum(stats['frames'] for stats in self.stats)
+            total_heavy = sum(stats['heavy_runs'] for stats in self.stats)
+            return {
+                'enabled': True,
+                'heavy_rate': round(total_heavy / total_frames, 3) if total_frames else 0.0,
+                'cameras': cameras
+            }
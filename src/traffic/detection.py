@@ -1,34 +1,50 @@
+import os
 import cv2
 import torch
 import numpy as np
 from ultralytics import YOLO
 import threading
 import time
-from queue import Queue
 import json
 from datetime import datetime, timedelta
+from config import Config
+from src.traffic.streaming import create_channels
+from src.traffic.encoders import get_encoder
+from src.traffic.video_source import acquire_source, release_source, recycle_source, get_sources_stats
+from src.traffic.detections import DetectionBatch, draw_detections
+from src.traffic.tiling import infer_tiled
+from src.traffic.cascade import CascadePolicy
+from src.traffic.tracking import VehicleTracker, TrafficCounter
+from src.traffic.stats import RollingStats, LatencyHistogram
+from src.traffic.heatmap import OccupancyHeatmap
+from src.traffic.lanes import LaneMap
+from src.traffic.speed import SpeedEstimator
+from src.traffic.timeline import CameraTimeline, staleness_weight
+from src.traffic.hls import HlsWriter, find_ffmpeg
+from src.traffic.supervisor import WorkerSupervisor
+from src.traffic.autotune import autotune
+from src.traffic.scheduler import InferenceScheduler, PRIORITY_EMERGENCY, PRIORITY_NORMAL
+from src.utils.constants import VEHICLE_WEIGHTS, CLASS_MAPPING, VEHICLE_CLASSES
+from src.utils.helpers import build_class_index
 
 class TrafficDetector:
+    # Valores por frame que guarda la línea de tiempo de cada cámara
+    TIMELINE_FIELDS = ('total', 'weighted_total', 'weighted_smoothed', 'queue')
+    
     def __init__(self, model_path):
         self.model = YOLO(model_path)
         self.processing = False
         
         # Datos en tiempo real (por frame) para cada cámara
         self.realtime_data = {
-            'camera_0': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0},
-            'camera_1': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0},
-            'camera_2': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0},
-            'camera_3': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0}
+            'camera_0': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0, 'weighted_smoothed': 0},
+            'camera_1': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0, 'weighted_smoothed': 0},
+            'camera_2': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0, 'weighted_smoothed': 0},
+            'camera_3': {'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0, 'weighted_smoothed': 0}
         }
         
         # Pesos para cada tipo de vehículo
-        self.vehicle_weights = {
-            'carro': 1,
-            'mototaxi': 0.7,  # Las motos ocupan menos espacio
-            'camion': 5,      # Camiones ocupan mucho espacio
-            'bus': 4,         # Buses ocupan espacio similar a camiones
-            'ambulancia': 10  # Alta prioridad por ser vehículo de emergencia
-        }
+        self.vehicle_weights = VEHICLE_WEIGHTS
         
         # Configuración de semáforos
         self.semaphore_states = {
@@ -61,26 +77,33 @@ class TrafficDetector:
             'end_time': None
         }
         
-        self.frame_queues = [Queue(maxsize=1) for _ in range(4)]
+        # Carril prioritario de emergencia: turnos de inferencia con prioridad,
+        # cerrojo compartido con el control de semáforos y latencia frame -> verde
+        self.scheduler = InferenceScheduler(Config.INFERENCE_SLOTS)
+        self.semaphore_lock = threading.RLock()
+        self.last_ambulance_seen = [0.0] * 4
+        self.emergency_latency = LatencyHistogram(Config.EMERGENCY_LATENCY_BUCKETS_MS,
+                                                  Config.EMERGENCY_LATENCY_SLO_MS)
+        
+        # Hilos de torch, imgsz y slots de inferencia calibrados para esta máquina
+        self.imgsz = Config.INFERENCE_IMGSZ
+        self.autotune_result = None
+        if Config.AUTOTUNE:
+            self.apply_autotune(model_path)
+        
+        # Un canal por variante de stream (thumb, full...) y cámara. Cada variante
+        # solo se dibuja y codifica cuando tiene clientes conectados
+        self.jpeg_encoder = get_encoder(Config.JPEG_ENCODER, Config.JPEG_SUBSAMPLING)
+        self.frame_channels = [create_channels(Config.STREAM_VARIANTS, self.jpeg_encoder) for _ in range(4)]
         self.threads = []
         
+        # Estadísticas de renderizado (plot + contadores + JPEG) por cámara
+        self.render_stats = [
+            {'rendered': 0, 'skipped': 0, 'render_cpu': 0.0} for _ in range(4)
+        ]
+        
         # Mapeo de variaciones de nombres a nuestros nombres estandarizados
-        self.class_mapping = {
-            'carro': 'carro',
-            'car': 'carro',
-            'auto': 'carro',
-            'coche': 'carro',
-            'camion': 'camion',
-            'truck': 'camion',
-            'bus': 'bus',
-            'autobus': 'bus',
-            'omnibus': 'bus',
-            'ambulancia': 'ambulancia',
-            'ambulance': 'ambulancia',
-            'mototaxi': 'mototaxi',
-            'moto': 'mototaxi',
-            'motorcycle': 'mototaxi'
-        }
+        self.class_mapping = CLASS_MAPPING
         
         # Verificar las clases que detecta el modelo
         print("Clases del modelo YOLO:")
@@ -90,35 +113,150 @@ class TrafficDetector:
                 mapped = self.class_mapping.get(normalized, 'desconocido')
                 print(f"  Clase {i}: '{class_name}' -> normalizada: '{normalized}' -> mapeada: '{mapped}'")
         
+        # Id de clase del modelo -> índice en VEHICLE_CLASSES (-1 si no es un vehículo conocido)
+        self.class_index = build_class_index(self.model.names)
+        
+        # Cascada opcional: un modelo liviano en todos los frames y este modelo
+        # solo cuando el liviano duda o ve una clase de emergencia
+        self.light_model = None
+        self.cascade = None
+        if Config.CASCADE_LIGHT_MODEL:
+            if os.path.exists(Config.CASCADE_LIGHT_MODEL):
+                self.light_model = YOLO(Config.CASCADE_LIGHT_MODEL)
+                self.light_class_index = build_class_index(self.light_model.names)
+                self.cascade = CascadePolicy(len(Config.VIDEO_PATHS), **Config.CASCADE)
+                print(f"🪜 Cascada activa: {Config.CASCADE_LIGHT_MODEL} -> {model_path}")
+            else:
+                print(f"⚠️ No se encontró el modelo liviano {Config.CASCADE_LIGHT_MODEL}, cascada desactivada")
+        
+        # Últimas detecciones confiables de cada cámara (para /api/camera_detections)
+        self.latest_detections = [None] * 4
+        
+        # Tracking por cámara y conteo acumulado de vehículos únicos y cruces de líneas
+        self.trackers = [VehicleTracker(**Config.TRACKER) for _ in range(4)]
+        self.traffic_counters = [
+            TrafficCounter(VEHICLE_CLASSES, Config.COUNTING_LINES.get(i, []), Config.TRACKER['min_hits'])
+            for i in range(4)
+        ]
+        # Velocidad (con el plano del suelo calibrado) y flujo por cámara sobre los tracks
+        self.speed_estimators = [
+            SpeedEstimator(Config.SPEED_CALIBRATION.get(i), Config.TRACKER['min_hits'], Config.SPEED_MIN_INTERVAL,
+                           Config.SPEED_MAX_KMH, Config.FLOW_WINDOW, Config.CONGESTION_WINDOW)
+            for i in range(4)
+        ]
+        
+        # Total ponderado suavizado por cámara (ventana móvil, EWMA y percentiles)
+        # para que el controlador no reaccione al ruido de un solo frame
+        self.congestion_stats = [
+            RollingStats(Config.CONGESTION_WINDOW, Config.CONGESTION_EWMA_ALPHA,
+                         max_value=Config.CONGESTION_HISTOGRAM_MAX)
+            for _ in range(4)
+        ]
+        
+        # Supervisor de los workers de cámara (latidos, frames descartados y reinicios)
+        self.supervisor = WorkerSupervisor(self.process_video, Config.WORKER_STALL_TIMEOUT, Config.WORKER_FRAME_TIMEOUT,
+                                           Config.WORKER_BACKOFF_MIN, Config.WORKER_BACKOFF_MAX,
+                                           on_restart=self.recover_worker)
+        
+        # Salida HLS opcional (una codificación H.264 por cámara para todos los clientes)
+        self.hls_writers = [None] * 4
+        if Config.HLS_ENABLED:
+            ffmpeg = find_ffmpeg(Config.FFMPEG_PATH)
+            if ffmpeg:
+                self.hls_writers = [
+                    HlsWriter(i, os.path.join(Config.HLS_DIR, str(i)), ffmpeg, Config.HLS_FPS, Config.HLS_WIDTH,
+                              Config.HLS_SEGMENT_SECONDS, Config.HLS_PLAYLIST_SIZE, Config.HLS_CRF)
+                    for i in range(4)
+                ]
+                print(f"🎞️ Salida HLS activa en {Config.HLS_DIR} ({Config.HLS_FPS} FPS)")
+            else:
+                print(f"⚠️ No se encontró ffmpeg ({Config.FFMPEG_PATH}), salida HLS desactivada")
+        
+        # Valores de cada frame indexados por el instante de captura, para que el
+        # controlador combine las cámaras en un mismo instante
+        self.timelines = [CameraTimeline(self.TIMELINE_FIELDS, Config.TIMELINE_SIZE) for _ in range(4)]
+        
+        # Mapa de calor de ocupación por cámara (huellas de las cajas con decaimiento)
+        rows, cols = Config.HEATMAP_GRID
+        self.heatmaps = [OccupancyHeatmap(rows, cols, Config.HEATMAP_HALF_LIFE) for _ in range(4)]
+        
+        # Conteo, ocupación y cola por carril (Config.LANES)
+        self.lane_maps = [
+            LaneMap(Config.LANES.get(i, []), Config.LANE_MASK_SIZE, Config.LANE_QUEUE_GAP,
+                    Config.CONGESTION_EWMA_ALPHA)
+            for i in range(4)
+        ]
+        
+    def apply_autotune(self, model_path):
+        """Calibrar (o leer del caché) y aplicar la mejor configuración de inferencia"""
+        # Con tantos turnos como cámaras nadie hace cola y la prioridad de
+        # emergencia no tendría efecto: se deja al menos una cámara esperando
+        max_slots = max(1, len(Config.VIDEO_PATHS) - 1)
+        try:
+            self.autotune_result = autotune(self.model, model_path, Config.VIDEO_PATHS, Config.AUTOTUNE_CACHE,
+                                            Config.AUTOTUNE_IMGSZ, max_workers=max_slots,
+                                            seconds=Config.AUTOTUNE_SECONDS, tolerance=Config.AUTOTUNE_TOLERANCE)
+        except Exception as e:
+            print(f"⚠️ Error en el autotuning, se usa la configuración por defecto: {e}")
+            return
+        best = self.autotune_result['best']
+        torch.set_num_threads(best['threads'])
+        # Un caché anterior pudo elegir más turnos
+        self.scheduler.set_slots(min(best['workers'], max_slots))
+        self.imgsz = best['imgsz']
+    
     def start_processing(self, video_paths):
         self.processing = True
         # Reiniciar datos cuando se inicia el procesamiento
         for i in range(4):
             self.realtime_data[f'camera_{i}'] = {
                 'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 
-                'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0
+                'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0, 'weighted_smoothed': 0
             }
+            self.congestion_stats[i].reset()
+            # Los tracks de la ejecución anterior no corresponden a los nuevos frames
+            self.trackers[i].reset()
+            self.lane_maps[i].reset()
+            self.speed_estimators[i].reset()
+            self.timelines[i].reset()
         
         # Inicializar tiempos de semáforo
         current_time = datetime.now()
         self.semaphore_states['group_1']['change_time'] = current_time + timedelta(seconds=30)
         self.semaphore_states['group_2']['change_time'] = current_time + timedelta(seconds=5)
         
-        for i, video_path in enumerate(video_paths):
-            thread = threading.Thread(target=self.process_video, args=(i, video_path))
-            thread.daemon = True
-            thread.start()
-            self.threads.append(thread)
+        for writer in self.hls_writers:
+            if writer is not None:
+                writer.start()
+        
+        # Un worker supervisado por cámara (se reinicia si muere o se cuelga)
+        self.supervisor.start({i: (video_path,) for i, video_path in enumerate(video_paths)})
         
         # Iniciar hilo para control de semáforos
-        semaphore_thread = threading.Thread(target=self.control_semaphores)
+        semaphore_thread = threading.Thread(target=self.control_semaphores, name='semaphore-control')
         semaphore_thread.daemon = True
         semaphore_thread.start()
+        self.threads.append(semaphore_thread)
     
     def stop_processing(self):
         self.processing = False
-        for thread in self.threads:
-            thread.join()
+        # Tiempo de espera acotado: un worker colgado no bloquea el apagado
+        deadline = time.monotonic() + Config.SHUTDOWN_TIMEOUT
+        # Los escritores HLS (que esperan a que ffmpeg cierre la playlist) se
+        # detienen en paralelo con los workers, dentro del mismo plazo
+        stoppers = [
+            threading.Thread(target=writer.stop, args=(Config.SHUTDOWN_TIMEOUT,),
+                             name=f'hls-stop-{writer.camera_id}', daemon=True)
+            for writer in self.hls_writers if writer is not None
+        ]
+        for stopper in stoppers:
+            stopper.start()
+        stuck = self.supervisor.stop(Config.SHUTDOWN_TIMEOUT)
+        for thread in self.threads + stoppers:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        stuck += [thread.name for thread in self.threads + stoppers if thread.is_alive()]
+        if stuck:
+            print(f"⚠️ Hilos que no terminaron en {Config.SHUTDOWN_TIMEOUT:.0f}s: {', '.join(stuck)}")
         self.threads = []
     
     def calculate_weighted_total(self, counts):
@@ -141,35 +279,49 @@ class TrafficDetector:
         """Control inteligente de semáforos"""
         while self.processing:
             try:
-                current_time = datetime.now()
-                
-                # Verificar modo de emergencia (ambulancia detectada)
-                self.check_emergency_mode()
-                
-                if not self.emergency_mode['active']:
-                    # Lógica normal de semáforos
-                    self.normal_semaphore_control(current_time)
-                else:
-                    # Lógica de emergencia
-                    self.emergency_semaphore_control(current_time)
+                with self.semaphore_lock:
+                    current_time = datetime.now()
+                    
+                    # Verificar si terminó el modo de emergencia
+                    self.check_emergency_mode()
+                    
+                    if not self.emergency_mode['active']:
+                        # Lógica normal de semáforos
+                        self.normal_semaphore_control(current_time)
+                    else:
+                        # Lógica de emergencia
+                        self.emergency_semaphore_control(current_time)
                 
                 time.sleep(1)  # Revisar cada segundo
             except Exception as e:
                 print(f"Error en control de semáforos: {e}")
                 time.sleep(5)
     
-    def check_emergency_mode(self):
-        """Verificar si hay ambulancias detectadas"""
-        for camera_id in range(4):
-            if self.realtime_data[f'camera_{camera_id}']['ambulancia'] > 0:
-                if not self.emergency_mode['active']:
-                    self.emergency_mode['active'] = True
-                    self.emergency_mode['emergency_camera'] = camera_id
-                    self.emergency_mode['end_time'] = datetime.now() + timedelta(seconds=15)
-                    print(f"🚑 MODO EMERGENCIA ACTIVADO - Cámara {camera_id}")
+    def trigger_emergency(self, camera_id, captured_at):
+        """Activar el modo emergencia desde el hilo de detección, sin esperar al control periódico"""
+        with self.semaphore_lock:
+            end_time = datetime.now() + timedelta(seconds=Config.EMERGENCY_DURATION)
+            if self.emergency_mode['active']:
+                # Mientras la ambulancia siga a la vista se extiende la emergencia en curso
+                if self.emergency_mode['emergency_camera'] == camera_id:
+                    self.emergency_mode['end_time'] = end_time
                 return
-        
-        # Si no hay ambulancias y el tiempo de emergencia expiró, desactivar modo emergencia
+            
+            self.emergency_mode['active'] = True
+            self.emergency_mode['emergency_camera'] = camera_id
+            self.emergency_mode['end_time'] = end_time
+            print(f"🚑 MODO EMERGENCIA ACTIVADO - Cámara {camera_id}")
+            self.emergency_semaphore_control(datetime.now())
+        
+        # Latencia desde la captura del frame con la ambulancia hasta el verde
+        latency = time.time() - captured_at
+        if self.emergency_latency.observe(latency):
+            print(f"⚠️ Latencia de emergencia {latency * 1000:.0f} ms supera el SLO de "
+                  f"{Config.EMERGENCY_LATENCY_SLO_MS:.0f} ms (cámara {camera_id})")
+    
+    def check_emergency_mode(self):
+        """Desactivar el modo emergencia cuando expira (lo activa trigger_emergency)"""
+        # Si el tiempo de emergencia expiró, desactivar modo emergencia
         if (self.emergency_mode['active'] and 
             self.emergency_mode['end_time'] and 
             datetime.now() > self.emergency_mode['end_time']):
@@ -253,71 +405,171 @@ class TrafficDetector:
         group = self.semaphore_states[group_name]
         other_group = 'group_2' if group_name == 'group_1' else 'group_1'
         
-        # Calcular congestión de ambos grupos
-        group_congestion = self.get_group_congestion(group_name)
-        other_congestion = self.get_group_congestion(other_group)
+        # Calcular congestión de ambos grupos sobre la misma instantánea
+        snapshot = self.get_snapshot()
+        group_congestion = self.get_group_congestion(group_name, snapshot)
+        other_congestion = self.get_group_congestion(other_group, snapshot)
         
         # Lógica de tiempos basada en congestión
         if group_congestion == 'high' and other_congestion == 'low':
-            return self.semaphore_times['green_max']  # Máximo tiempo para grupo congestionado
+            green_time = self.semaphore_times['green_max']  # Máximo tiempo para grupo congestionado
         elif group_congestion == 'high' and other_congestion == 'high':
-            return self.semaphore_times['green_min'] + 20  # Tiempo intermedio
+            green_time = self.semaphore_times['green_min'] + 20  # Tiempo intermedio
         elif group_congestion == 'low' and other_congestion == 'high':
-            return self.semaphore_times['green_min']  # Mínimo tiempo para grupo no congestionado
+            green_time = self.semaphore_times['green_min']  # Mínimo tiempo para grupo no congestionado
         else:
-            return self.semaphore_times['green_min'] + 10  # Tiempo base
+            green_time = self.semaphore_times['green_min'] + 10  # Tiempo base
+        
+        # Una cola larga en un carril alarga el verde aunque el total del frame sea bajo
+        queue = self.get_group_queue(group_name, snapshot)
+        if queue is not None:
+            queue_time = self.semaphore_times['green_min'] + \
+                (self.semaphore_times['green_max'] - self.semaphore_times['green_min']) * \
+                min(queue / Config.LANE_QUEUE_FULL, 1.0)
+            green_time = max(green_time, int(round(queue_time)))
+        return green_time
+    
+    def get_group_queue(self, group_name, snapshot=None):
+        """Mayor cola suavizada de los carriles de un grupo (None si no hay carriles)"""
+        cameras = [i for i in self.semaphore_states[group_name]['cameras'] if len(self.lane_maps[i])]
+        if not cameras:
+            return None
+        snapshot = snapshot or self.get_snapshot()
+        # Las cámaras atrasadas pesan menos: su cola puede ya no existir
+        return max(snapshot['cameras'][f'camera_{i}']['values']['queue'] * snapshot['cameras'][f'camera_{i}']['weight']
+                   for i in cameras)
     
-    def get_group_congestion(self, group_name):
+    def get_group_congestion(self, group_name, snapshot=None):
         """Obtener nivel de congestión de un grupo de cámaras"""
-        group = self.semaphore_states[group_name]
-        total_weighted = 0
-        
-        for camera_id in group['cameras']:
-            total_weighted += self.realtime_data[f'camera_{camera_id}']['weighted_total']
-        
-        return self.get_congestion_level(total_weighted)
+        return self.get_congestion_level(self.get_group_weighted(group_name, snapshot))
+    
+    def get_group_weighted(self, group_name, snapshot=None):
+        """Total ponderado suavizado del grupo en un mismo instante.
+        
+        Cada cámara aporta según su peso de antigüedad; lo que le falta a una
+        cámara atrasada se completa con el promedio de las demás del grupo en
+        lugar de usar su último valor (que puede tener varios segundos).
+        """
+        snapshot = snapshot or self.get_snapshot()
+        cameras = [snapshot['cameras'][f'camera_{i}'] for i in self.semaphore_states[group_name]['cameras']]
+        total_weight = sum(camera['weight'] for camera in cameras)
+        if not total_weight:
+            return 0.0
+        weighted = sum(camera['values']['weighted_smoothed'] * camera['weight'] for camera in cameras)
+        return weighted / total_weight * len(cameras)
+    
+    def get_snapshot(self, timestamp=None, mode=None):
+        """Estado de las cuatro cámaras en un mismo instante de captura.
+        
+        Sin `timestamp` se usa el instante más reciente que todas las cámaras
+        al día ya procesaron. Cada cámara indica la antigüedad del dato usado,
+        si está atrasada ('stale') y su peso (1 al día, 0 sin datos recientes).
+        """
+        mode = mode or Config.SNAPSHOT_MODE
+        now = time.time()
+        if timestamp is None:
+            latest = [timeline.latest for timeline in self.timelines]
+            fresh = [t for t in latest if t is not None and now - t <= Config.CAMERA_STALE_SECONDS]
+            timestamp = min(fresh) if fresh else now
+        
+        cameras = {}
+        for camera_id, timeline in enumerate(self.timelines):
+            sample = timeline.at(timestamp, mode)
+            if sample is None:
+                values, age = dict.fromkeys(self.TIMELINE_FIELDS, 0.0), None
+            else:
+                values, age = sample
+            weight = staleness_weight(age, Config.CAMERA_STALE_SECONDS, Config.CAMERA_DEAD_SECONDS)
+            cameras[f'camera_{camera_id}'] = {
+                'values': {name: round(value, 3) for name, value in values.items()},
+                'age': round(age, 3) if age is not None else None,
+                'stale': age is None or age > Config.CAMERA_STALE_SECONDS,
+                'weight': round(weight, 3)
+            }
+        return {'timestamp': timestamp, 'mode': mode, 'cameras': cameras}
+    
+    def get_smoothed_weighted(self, camera_id):
+        """Total ponderado suavizado de una cámara según Config.CONGESTION_ESTIMATOR"""
+        return self.congestion_stats[camera_id].value(Config.CONGESTION_ESTIMATOR)
     
-    def process_video(self, camera_id, video_path):
-        cap = cv2.VideoCapture(video_path)
+    def get_congestion_stats(self, camera_id=None):
+        """Estadísticas de la ventana móvil del total ponderado (último, media, EWMA, p50, p90)"""
+        if camera_id is not None:
+            return self.congestion_stats[camera_id].to_dict()
+        return {f'camera_{i}': stats.to_dict() for i, stats in enumerate(self.congestion_stats)}
+    
+    def process_video(self, camera_id, generation, video_path):
+        # Fuente decodificada en segundo plano y compartida con los previews
+        source = acquire_source(video_path)
+        try:
+            self.detection_loop(camera_id, source, generation)
+        finally:
+            release_source(source)
+    
+    def recover_worker(self, camera_id, problem, video_path):
+        """Liberar lo que retiene un worker colgado antes de que arranque su reemplazo"""
+        if problem not in ('stalled', 'no_frames'):
+            return
+        # La fuente compartida puede ser justamente la trabada (decodificador colgado):
+        # el reemplazo abre una nueva en lugar de volver a la misma
+        recycle_source(video_path)
+        # Un worker colgado dentro del modelo retiene su turno de inferencia y, con
+        # pocos turnos, frenaría a todas las cámaras
+        reclaimed = self.scheduler.reclaim(Config.WORKER_STALL_TIMEOUT)
+        if reclaimed:
+            print(f"⚠️ Turnos de inferencia retenidos por hilos colgados, liberados: {', '.join(reclaimed)}")
+    
+    def detection_loop(self, camera_id, source, generation):
         frame_count = 0
-        
-        while self.processing and cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                frame_count = 0
+        last_seq = 0
+        
+        # Si la fuente se descartó por trabada el worker termina y el supervisor lo reinicia con una nueva
+        while self.processing and self.supervisor.is_current(camera_id, generation) and source.running:
+            seq, frame, captured_at = source.read(last_seq, timeout=1)
+            # Frames que la fuente publicó mientras se procesaba el anterior
+            dropped = seq - last_seq - 1 if frame is not None and last_seq else 0
+            last_seq = seq
+            self.supervisor.beat(camera_id, generation, frame is not None, dropped)
+            if frame is None:
                 continue
             
             frame_count += 1
             
-            # Realizar detección
-            results = self.model(frame, conf=0.5, verbose=False)
+            # Las cámaras con una ambulancia reciente tienen prioridad para inferir
+            recent_ambulance = time.time() - self.last_ambulance_seen[camera_id] < Config.EMERGENCY_PRIORITY_SECONDS
+            priority = PRIORITY_EMERGENCY if recent_ambulance else PRIORITY_NORMAL
             
-            # Contadores del frame actual
-            current_frame_counts = {
-                'carro': 0, 'camion': 0, 'bus': 0, 
-                'ambulancia': 0, 'mototaxi': 0
-            }
+            # Realizar detección (con el umbral bajo del tracker para la segunda asociación)
+            with self.scheduler.slot(priority):
+                detections = self.infer(camera_id, frame, captured_at)
+            
+            # Si la inferencia se colgó el supervisor pudo reiniciar la cámara: el
+            # tracker y los contadores ya son del reemplazo y no son thread-safe
+            if not self.supervisor.is_current(camera_id, generation):
+                break
+            
+            # Contadores del frame actual (solo detecciones confiables)
+            confident = detections.select(detections.confidences >= Config.CONFIDENCE_THRESHOLD)
+            self.latest_detections[camera_id] = confident
+            class_counts = confident.class_counts()
+            current_frame_counts = {name: int(class_counts[i]) for i, name in enumerate(VEHICLE_CLASSES)}
             
-            # Procesar detecciones
-            if results and len(results) > 0:
-                for result in results:
-                    if result.boxes is not None and len(result.boxes) > 0:
-                        boxes = result.boxes
-                        for box in boxes:
-                            class_id = int(box.cls[0])
-                            original_class_name = self.model.names[class_id]
-                            
-                            # Normalizar y mapear el nombre de la clase
-                            normalized_name = original_class_name.lower().strip()
-                            mapped_class = self.class_mapping.get(normalized_name)
-                            
-                            if mapped_class and mapped_class in current_frame_counts:
-                                current_frame_counts[mapped_class] += 1
+            # La ambulancia dispara la emergencia directamente desde este hilo
+            if current_frame_counts['ambulancia'] > 0:
+                self.last_ambulance_seen[camera_id] = time.time()
+                self.trigger_emergency(camera_id, captured_at)
+            
+            # Tracking y conteo acumulado de vehículos únicos y cruces de líneas
+            seen = self.trackers[camera_id].update(detections.boxes, detections.confidences, detections.class_ids)
+            self.traffic_counters[camera_id].update(self.trackers[camera_id], seen, frame.shape)
+            self.speed_estimators[camera_id].update(self.trackers[camera_id], seen, frame.shape, captured_at)
             
             # Calcular total del frame actual y total ponderado
             total_current = sum(current_frame_counts.values())
             weighted_total = self.calculate_weighted_total(current_frame_counts)
+            self.congestion_stats[camera_id].push(weighted_total)
+            self.heatmaps[camera_id].update(confident.boxes, frame.shape, captured_at)
+            self.lane_maps[camera_id].update(confident.boxes, confident.class_ids, frame.shape)
             
             # Actualizar datos en tiempo real
             self.realtime_data[f'camera_{camera_id}'] = {
@@ -327,29 +579,115 @@ class TrafficDetector:
                 'bus': current_frame_counts['bus'],
                 'ambulancia': current_frame_counts['ambulancia'],
                 'mototaxi': current_frame_counts['mototaxi'],
-                'weighted_total': weighted_total
+                'weighted_total': weighted_total,
+                'weighted_smoothed': round(self.get_smoothed_weighted(camera_id), 2),
+                'captured_at': captured_at
             }
+            self.timelines[camera_id].push(captured_at, (
+                total_current, weighted_total, self.get_smoothed_weighted(camera_id),
+                self.lane_maps[camera_id].max_queue()
+            ))
             
-            # Dibujar bounding boxes y etiquetas
-            annotated_frame = results[0].plot()
-            
-            # Añadir contadores en el frame
-            self.add_counters_to_frame(annotated_frame, current_frame_counts, total_current, weighted_total, camera_id, frame_count)
-            
-            # Codificar frame para streaming
-            ret, buffer = cv2.imencode('.jpg', annotated_frame)
-            if ret:
-                frame_bytes = buffer.tobytes()
-                if not self.frame_queues[camera_id].empty():
-                    try:
-                        self.frame_queues[camera_id].get_nowait()
-                    except:
-                        pass
-                self.frame_queues[camera_id].put(frame_bytes)
-            
-            time.sleep(0.03)  # Controlar FPS
-        
-        cap.release()
+            # Solo dibujar y codificar si hay alguien viendo el stream (o si se graba HLS)
+            if self.has_stream_subscribers(camera_id) or self.hls_writers[camera_id] is not None:
+                render_start = time.thread_time()
+                self.render_frame(frame, confident, current_frame_counts, total_current, weighted_total, camera_id, frame_count)
+                self.render_stats[camera_id]['rendered'] += 1
+                self.render_stats[camera_id]['render_cpu'] += time.thread_time() - render_start
+            else:
+                self.render_stats[camera_id]['skipped'] += 1
+    
+    def infer(self, camera_id, frame, captured_at):
+        """Detectar con el modelo principal o con la cascada liviano -> pesado"""
+        if self.cascade is None:
+            return self.run_model(self.model, self.class_index, camera_id, frame, captured_at)
+        
+        start = time.perf_counter()
+        detections = self.run_model(self.light_model, self.light_class_index, camera_id, frame, captured_at)
+        light_time = time.perf_counter() - start
+        
+        reason = self.cascade.escalation_reason(camera_id, detections)
+        if reason is None:
+            self.cascade.record(camera_id, None, light_time)
+            return detections
+        
+        # El modelo pesado revisa el frame y sus detecciones reemplazan a las del liviano
+        start = time.perf_counter()
+        detections = self.run_model(self.model, self.class_index, camera_id, frame, captured_at)
+        self.cascade.record(camera_id, reason, light_time, time.perf_counter() - start, detections)
+        return detections
+    
+    def run_model(self, model, class_index, camera_id, frame, captured_at):
+        """Detectar en una sola pasada o por tiles, según Config.TILED_INFERENCE"""
+        tiled = Config.TILED_INFERENCE.get(camera_id)
+        if tiled:
+            tile_size = tiled.get('tile_size', self.imgsz)
+            return infer_tiled(model, frame, class_index, tile_size=tile_size,
+                               overlap=tiled.get('overlap', 0.2), roi=tiled.get('roi'),
+                               full_frame=tiled.get('full_frame', True), conf=Config.TRACKER['low_thresh'],
+                               imgsz=tile_size, merge_threshold=Config.TILE_MERGE_THRESHOLD, timestamp=captured_at)
+        
+        results = model(frame, conf=Config.TRACKER['low_thresh'], imgsz=self.imgsz, verbose=False)
+        # Solo se conservan los arreglos de detecciones, no el Result de ultralytics
+        return DetectionBatch.from_result(results[0], class_index, frame.shape, captured_at)
+    
+    def render_frame(self, frame, detections, frame_counts, total_current, weighted_total, camera_id, frame_count):
+        """Dibujar detecciones y contadores, codificar a JPEG y publicar el frame"""
+        # El frame es compartido con la fuente de video: se dibuja sobre una copia
+        annotated_frame = draw_detections(frame.copy(), detections)
+        
+        # Líneas de conteo e IDs de los vehículos seguidos
+        self.draw_tracking(annotated_frame, camera_id)
+        
+        # Añadir contadores en el frame
+        self.add_counters_to_frame(annotated_frame, frame_counts, total_current, weighted_total, camera_id, frame_count)
+        
+        if self.hls_writers[camera_id] is not None:
+            self.hls_writers[camera_id].submit(annotated_frame)
+        
+        # Codificar una sola vez cada variante que tenga clientes
+        for channel in self.frame_channels[camera_id].values():
+            if channel.has_subscribers():
+                jpeg = channel.encode(annotated_frame)
+                if jpeg is not None:
+                    channel.publish(jpeg)
+    
+    def get_stream_channel(self, camera_id, variant=None):
+        """Obtener el canal de una variante de stream (por defecto la configurada)"""
+        channels = self.frame_channels[camera_id]
+        return channels.get(variant) or channels[Config.DEFAULT_STREAM_VARIANT]
+    
+    def add_stream_subscriber(self, camera_id, variant=None):
+        """Registrar un cliente conectado al stream de una cámara"""
+        # El primer cliente descarta el frame viejo que quedó publicado desde el
+        # último espectador, así el stream arranca con el siguiente frame procesado
+        self.get_stream_channel(camera_id, variant).subscribe()
+    
+    def remove_stream_subscriber(self, camera_id, variant=None):
+        """Eliminar un cliente desconectado del stream de una cámara"""
+        self.get_stream_channel(camera_id, variant).unsubscribe()
+    
+    def has_stream_subscribers(self, camera_id):
+        """Indicar si alguien está viendo alguna variante del stream de la cámara"""
+        return any(channel.has_subscribers() for channel in self.frame_channels[camera_id].values())
+    
+    def draw_tracking(self, frame, camera_id):
+        """Dibujar los carriles, las líneas de conteo y el ID de cada track visible"""
+        height, width = frame.shape[:2]
+        for lane in self.lane_maps[camera_id].lanes:
+            points = (np.array(lane['polygon'], dtype=np.float32) * (width, height)).astype(np.int32)
+            cv2.polylines(frame, [points], True, (255, 200, 0), 1)
+        
+        for line in self.traffic_counters[camera_id].lines:
+            start = (int(line['start'][0] * width), int(line['start'][1] * height))
+            end = (int(line['end'][0] * width), int(line['end'][1] * height))
+            cv2.line(frame, start, end, (0, 200, 255), 2)
+            cv2.putText(frame, line['name'], (start[0], start[1] - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 200, 255), 1)
+        
+        tracker = self.trackers[camera_id]
+        visible = np.nonzero((tracker.lost == 0) & (tracker.hits >= tracker.min_hits))[0]
+        for track_id, box in zip(tracker.ids[visible], tracker.boxes[visible].astype(int)):
+            cv2.putText(frame, f"#{track_id}", (box[0], box[3] + 14), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 0), 1)
     
     def add_counters_to_frame(self, frame, frame_counts, total_current, weighted_total, camera_id, frame_count):
         """Añadir contadores de vehículos al frame"""
@@ -357,7 +695,7 @@ class TrafficDetector:
         
         # Crear fondo semitransparente para los contadores
         overlay = frame.copy()
-        cv2.rectangle(overlay, (10, 10), (400, 200), (0, 0, 0), -1)
+        cv2.rectangle(overlay, (10, 10), (400, 220), (0, 0, 0), -1)
         cv2.addWeighted(overlay, 0.7, frame, 0.3, 0, frame)
         
         # Configurar texto
@@ -377,7 +715,8 @@ class TrafficDetector:
             f"Ambulancias: {frame_counts['ambulancia']}",
             f"Mototaxis: {frame_counts['mototaxi']}",
             f"TOTAL: {total_current}",
-            f"Ponderado: {weighted_total:.1f}"
+            f"Ponderado: {weighted_total:.1f}",
+            f"Unicos: {int(self.traffic_counters[camera_id].unique.sum())}"
         ]
         
         for i, text in enumerate(texts_frame):
@@ -386,11 +725,131 @@ class TrafficDetector:
             color = (255, 255, 0) if "Ponderado" in text else color
             cv2.putText(frame, text, (20, y_offset), font, 0.5, color, thickness)
     
-    def get_frame(self, camera_id):
-        try:
-            return self.frame_queues[camera_id].get(timeout=1)
-        except:
-            return None
+    def get_frame(self, camera_id, variant=None, last_seq=0):
+        """Esperar la siguiente parte MJPEG de una variante. Devuelve (seq, parte)"""
+        return self.get_stream_channel(camera_id, variant).wait(last_seq, timeout=1)
+    
+    async def get_frame_async(self, camera_id, variant=None, last_seq=0):
+        """Versión asíncrona de get_frame para el servidor ASGI"""
+        return await self.get_stream_channel(camera_id, variant).wait_async(last_seq, timeout=1)
+    
+    def get_metrics(self):
+        """Obtener métricas de renderizado y CPU ahorrada por cámara"""
+        cameras = {}
+        total_saved = 0.0
+        
+        for camera_id, stats in enumerate(self.render_stats):
+            # Costo medio de renderizar un frame (plot + contadores + JPEG)
+            avg_render = stats['render_cpu'] / stats['rendered'] if stats['rendered'] else 0.0
+            cpu_saved = stats['skipped'] * avg_render
+            total_saved += cpu_saved
+            
+            cameras[f'camera_{camera_id}'] = {
+                'variants': {name: channel.get_stats() for name, channel in self.frame_channels[camera_id].items()},
+                'frames_rendered': stats['rendered'],
+                'frames_skipped': stats['skipped'],
+                'avg_render_ms': round(avg_render * 1000, 2),
+                'cpu_saved_seconds': round(cpu_saved, 2),
+                'hls': self.hls_writers[camera_id].get_stats() if self.hls_writers[camera_id] else None
+            }
+        
+        return {
+            'cameras': cameras,
+            'cpu_saved_seconds': round(total_saved, 2),
+            'video_sources': get_sources_stats(),
+            'inference': dict(self.scheduler.get_stats(), imgsz=self.imgsz, torch_threads=torch.get_num_threads()),
+            'autotune': self.autotune_result or {'enabled': Config.AUTOTUNE},
+            'cascade': self.cascade.get_stats() if self.cascade else {'enabled': False},
+            'emergency': {
+                'active': self.emergency_mode['active'],
+                'frame_to_green_latency': self.emergency_latency.to_dict()
+            }
+        }
+    
+    def reset_accumulated_data(self, camera_id=None):
+        """Reiniciar los conteos acumulados de una cámara (o de todas)"""
+        camera_ids = [camera_id] if camera_id is not None else range(4)
+        for i in camera_ids:
+            self.traffic_counters[i].reset()
+            self.heatmaps[i].reset()
+    
+    def get_accumulated_data(self, camera_id=None):
+        """Obtener vehículos únicos por clase y cruces de líneas por dirección"""
+        if camera_id is not None:
+            return self.traffic_counters[camera_id].get_data()
+        return {f'camera_{i}': counter.get_data() for i, counter in enumerate(self.traffic_counters)}
+    
+    def get_camera_detections(self, camera_id):
+        """Cajas del último frame procesado de una cámara"""
+        detections = self.latest_detections[camera_id]
+        if detections is None:
+            return {'camera_id': camera_id, 'timestamp': None, 'frame_size': None, 'detections': []}
+        height, width = detections.frame_shape
+        return {
+            'camera_id': camera_id,
+            'timestamp': detections.timestamp,
+            'frame_size': {'width': int(width), 'height': int(height)},
+            'detections': detections.to_list()
+        }
+    
+    def get_lane_data(self, camera_id=None):
+        """Conteo, ocupación y cola de cada carril del último frame"""
+        if camera_id is not None:
+            return self.lane_maps[camera_id].get_data()
+        return {f'camera_{i}': lane_map.get_data() for i, lane_map in enumerate(self.lane_maps)}
+    
+    def get_traffic_flow(self, camera_id=None):
+        """Velocidad media y flujo (vehículos/hora) por cámara y por grupo de semáforos"""
+        if camera_id is not None:
+            return self.speed_estimators[camera_id].get_data()
+        cameras = {f'camera_{i}': estimator.get_data() for i, estimator in enumerate(self.speed_estimators)}
+        groups = {}
+        for group_name, group in self.semaphore_states.items():
+            data = [cameras[f'camera_{i}'] for i in group['cameras']]
+            flow = sum(camera['flow_per_hour'] for camera in data)
+            # Velocidad del grupo: promedio de las cámaras calibradas ponderado por su flujo
+            measured = [(camera['speed_kmh']['ewma'], camera['flow_per_hour']) for camera in data
+                        if camera['speed_kmh'] and camera['speed_kmh']['samples']]
+            weight = sum(camera_flow for _, camera_flow in measured)
+            if weight:
+                speed = sum(camera_speed * camera_flow for camera_speed, camera_flow in measured) / weight
+            elif measured:
+                speed = sum(camera_speed for camera_speed, _ in measured) / len(measured)
+            else:
+                speed = None
+            groups[group_name] = {
+                'flow_per_hour': round(flow, 1),
+                'speed_kmh': round(speed, 1) if speed is not None else None
+            }
+        return {'cameras': cameras, 'groups': groups}
+    
+    def get_health(self):
+        """Estado de cada worker de cámara, frames descartados, FPS y peso en el controlador"""
+        health = self.supervisor.get_health()
+        snapshot = self.get_snapshot()
+        sources = get_sources_stats()
+        for camera_id, video_path in enumerate(Config.VIDEO_PATHS[:4]):
+            camera = health['cameras'].setdefault(f'camera_{camera_id}', {'status': 'stopped'})
+            # Peso con el que el controlador usa la cámara (0 = ignorada por atrasada)
+            camera['controller_weight'] = snapshot['cameras'][f'camera_{camera_id}']['weight']
+            camera['source'] = sources.get(video_path)
+        # Turnos de inferencia retenidos por un hilo colgado: las demás cámaras esperan detrás
+        stuck = self.scheduler.stuck(Config.WORKER_STALL_TIMEOUT)
+        health['inference'] = {
+            'stuck_slots': [{'thread': name, 'held_seconds': round(held, 1)} for name, held in stuck]
+        }
+        if stuck:
+            health['healthy'] = False
+        health['processing'] = self.processing
+        return health
+    
+    def get_heatmap(self, camera_id):
+        """Grilla de ocupación normalizada de una cámara"""
+        return dict(self.heatmaps[camera_id].get_data(), camera_id=camera_id)
+    
+    def get_heatmap_png(self, camera_id, width=640):
+        """Mapa de calor como PNG transparente para superponer al video"""
+        return self.heatmaps[camera_id].render_png(width, Config.HEATMAP_PNG_MAX_AGE)
     
     def get_realtime_data(self, camera_id=None):
         """Obtener datos en tiempo real (del frame actual)"""
@@ -398,6 +857,9 @@ class TrafficDetector:
             return self.realtime_data.get(f'camera_{camera_id}')
         return self.realtime_data
     
+    def is_processing(self):
+        return self.processing
+    
     def get_semaphore_states(self):
         """Obtener estado actual de los semáforos"""
         return self.semaphore_states
@@ -411,6 +873,8 @@ class TrafficDetector:
         realtime_data = self.get_realtime_data()
         total_vehicles = sum(data['total'] for data in realtime_data.values())
         total_weighted = sum(data['weighted_total'] for data in realtime_data.values())
+        # El nivel de congestión usa el valor suavizado, no el del último frame
+        total_smoothed = sum(self.get_smoothed_weighted(i) for i in range(4))
         
         # Calcular totales por tipo para el dashboard
         type_totals = {
@@ -424,9 +888,7 @@ class TrafficDetector:
         return {
             'total_vehicles': total_vehicles,
             'total_weighted': total_weighted,
+            'total_smoothed': round(total_smoothed, 2),
             'type_totals': type_totals,
-            'congestion_level': self.get_congestion_level(total_weighted)
+            'congestion_level': self.get_congestion_level(total_smoothed)
         }
-
-# Instancia global del detector
-traffic_detector = TrafficDetector('pytorch/best.pt')
\ No newline at end of file
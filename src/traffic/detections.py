@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+from src.utils.constants import VEHICLE_CLASSES, VEHICLE_COLORS
+
+
+def hex_to_bgr(color):
+    color = color.lstrip('#')
+    return tuple(int(color[i:i + 2], 16) for i in (4, 2, 0))
+
+
+# Color BGR de cada índice de VEHICLE_CLASSES
+CLASS_COLORS = np.array([hex_to_bgr(VEHICLE_COLORS[name]) for name in VEHICLE_CLASSES], dtype=np.int64)
+
+
+class DetectionBatch:
+    """Detecciones de un frame como arreglos paralelos (struct of arrays).
+
+    Reemplaza a los Results de ultralytics entre las etapas del pipeline: no
+    retiene la imagen original ni los tensores, solo las cajas xyxy (N, 4),
+    las confianzas (N,) y los índices de clase en VEHICLE_CLASSES (N,).
+    """
+
+    __slots__ = ('boxes', 'confidences', 'class_ids', 'frame_shape', 'timestamp')
+
+    def __init__(self, boxes, confidences, class_ids, frame_shape, timestamp=None):
+        self.boxes = boxes
+        self.confidences = confidences
+        self.class_ids = class_ids
+        self.frame_shape = frame_shape[:2]
+        self.timestamp = timestamp
+
+    @classmethod
+    def empty(cls, frame_shape, timestamp=None):
+        return cls(np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.float32),
+                   np.empty(0, dtype=np.int64), frame_shape, timestamp)
+
+    @classmethod
+    def from_result(cls, result, class_index, frame_shape, timestamp=None):
+        """Copiar de un Result de ultralytics solo los vehículos conocidos.
+
+        `class_index` traduce el id de clase del modelo al índice en
+        VEHICLE_CLASSES (-1 para las clases que no son vehículos).
+        """
+        if result.boxes is None or len(result.boxes) == 0:
+            return cls.empty(frame_shape, timestamp)
+        data = result.boxes.data.cpu().numpy()  # (N, 6): x1, y1, x2, y2, conf, cls
+        class_ids = class_index[data[:, 5].astype(np.int64)]
+        known = class_ids >= 0
+        return cls(np.ascontiguousarray(data[known, :4], dtype=np.float32),
+                   data[known, 4].astype(np.float32), class_ids[known], frame_shape, timestamp)
+
+    def __len__(self):
+        return len(self.confidences)
+
+    def select(self, mask):
+        """Subconjunto de detecciones (máscara booleana o índices)"""
+        return DetectionBatch(self.boxes[mask], self.confidences[mask], self.class_ids[mask],
+                              self.frame_shape, self.timestamp)
+
+    def class_counts(self):
+        """Cantidad de detecciones por índice de VEHICLE_CLASSES"""
+        return np.bincount(self.class_ids, minlength=len(VEHICLE_CLASSES))
+
+    def to_list(self):
+        return [
+            {'class': VEHICLE_CLASSES[class_id], 'confidence': round(float(confidence), 4),
+             'box': [round(float(v), 1) for v in box]}
+            for box, confidence, class_id in zip(self.boxes, self.confidences, self.class_ids)
+        ]
+
+
+def draw_detections(frame, batch, thickness=2):
+    """Dibujar cajas y etiquetas sobre el frame (reemplaza a Results.plot()).
+
+    Coordenadas, colores y textos se calculan de una vez para todo el lote;
+    el bucle solo hace las llamadas de dibujo de OpenCV.
+    """
+    if len(batch) == 0:
+        return frame
+    height, width = frame.shape[:2]
+    boxes = np.rint(batch.boxes).astype(np.int32)
+    np.clip(boxes[:, 0::2], 0, width - 1, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0, height - 1, out=boxes[:, 1::2])
+    colors = CLASS_COLORS[batch.class_ids].tolist()
+    labels = [f"{VEHICLE_CLASSES[class_id]} {confidence:.2f}"
+              for class_id, confidence in zip(batch.class_ids, batch.confidences)]
+    # La etiqueta va sobre la caja, o dentro si la caja toca el borde superior
+    label_y = np.where(boxes[:, 1] > 20, boxes[:, 1] - 6, boxes[:, 1] + 16).tolist()
+
+    for (x1, y1, x2, y2), color, label, y in zip(boxes.tolist(), colors, labels, label_y):
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+        (text_width, text_height), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        cv2.rectangle(frame, (x1, y - text_height - 4), (x1 + text_width + 4, y + 4), color, -1)
+        cv2.putText(frame, label, (x1 + 2, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+    return frame
@@ -0,0 +1,162 @@
+import threading
+import time
+from config import Config
+from src.traffic.encoders import get_encoder
+from src.traffic.streaming import create_channels
+from src.traffic.ipc import RPC_METHODS, DetectorUnavailable, send_message, recv_message, connect
+
+
+class FrameRelay:
+    """Recibe del servicio los frames de una cámara/variante y los publica en el canal local.
+
+    Hay una sola conexión por worker web y por variante, sin importar cuántos
+    espectadores tenga: se abre con el primer espectador y se cierra con el último.
+    """
+
+    def __init__(self, socket_path, camera_id, variant, channel):
+        self.socket_path = socket_path
+        self.camera_id = camera_id
+        self.variant = variant
+        self.channel = channel
+        self.stop_event = threading.Event()
+        self.sock = None
+        self.thread = threading.Thread(target=self.run, name=f'frame-relay-{camera_id}-{variant}', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.sock = connect(self.socket_path)
+                send_message(self.sock, {'method': 'subscribe_frames', 'camera_id': self.camera_id,
+                                         'variant': self.variant})
+                while not self.stop_event.is_set():
+                    message, payload = recv_message(self.sock)
+                    if payload:
+                        self.channel.publish_part(payload)
+            except (ConnectionError, OSError):
+                # Servicio reiniciándose: reintentar mientras haya espectadores
+                self.stop_event.wait(1)
+            finally:
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+
+    def stop(self):
+        self.stop_event.set()
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+class RemoteTrafficDetector:
+    """Cliente del servicio de detección con la misma interfaz que usan las rutas.
+
+    Las consultas y acciones se reenvían por el socket Unix (una conexión por
+    hilo); los frames procesados llegan por FrameRelay a canales locales, así
+    que las rutas esperan frames igual que con el detector embebido.
+    """
+
+    def __init__(self, socket_path, processing_ttl=0.5):
+        self.socket_path = socket_path
+        self.local = threading.local()
+        # Canales locales: frames recibidos del servicio y previews sin procesar
+        self.jpeg_encoder = get_encoder(Config.JPEG_ENCODER, Config.JPEG_SUBSAMPLING)
+        self.frame_channels = [create_channels(Config.STREAM_VARIANTS, self.jpeg_encoder)
+                               for _ in range(len(Config.VIDEO_PATHS))]
+        self.relays = {}
+        self.relays_lock = threading.Lock()
+        # Las rutas consultan `processing` en cada frame (también desde el event
+        # loop): un hilo lo refresca cada `processing_ttl` y la propiedad solo lee
+        self.processing_ttl = processing_ttl
+        self.processing_value = False
+        self.processing_monitor = None
+        self.processing_lock = threading.Lock()
+
+    def call(self, method, *args):
+        """Invocar un método del detector remoto (reintenta una vez si la conexión se cayó)"""
+        for attempt in range(2):
+            sock = getattr(self.local, 'sock', None)
+            try:
+                if sock is None:
+                    sock = self.local.sock = connect(self.socket_path, timeout=10)
+                send_message(sock, {'method': method, 'args': list(args)})
+                response, payload = recv_message(sock)
+                break
+            except (ConnectionError, OSError) as e:
+                if sock is not None:
+                    sock.close()
+                self.local.sock = None
+                if attempt:
+                    raise DetectorUnavailable(f"Servicio de detección no disponible: {e}")
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error'))
+        if response.get('binary'):
+            return payload
+        return response.get('result')
+
+    def __getattr__(self, name):
+        if name in RPC_METHODS:
+            return lambda *args: self.call(name, *args)
+        raise AttributeError(name)
+
+    @property
+    def processing(self):
+        # El hilo se crea con el primer uso y no al importar: gunicorn puede
+        # hacer fork después de cargar la app y los hilos no sobreviven al fork
+        if self.processing_monitor is None:
+            with self.processing_lock:
+                if self.processing_monitor is None:
+                    self.processing_monitor = threading.Thread(target=self.monitor_processing,
+                                                               name='processing-monitor', daemon=True)
+                    self.processing_monitor.start()
+        return self.processing_value
+
+    def refresh_processing(self):
+        try:
+            self.processing_value = bool(self.call('is_processing'))
+        except (DetectorUnavailable, RuntimeError):
+            # Sin servicio no hay procesamiento: las rutas muestran el video sin procesar
+            self.processing_value = False
+
+    def monitor_processing(self):
+        while True:
+            self.refresh_processing()
+            time.sleep(self.processing_ttl)
+
+    def start_processing(self, video_paths):
+        self.call('start_processing', video_paths)
+        self.refresh_processing()
+
+    def stop_processing(self):
+        self.call('stop_processing')
+        self.refresh_processing()
+
+    def get_stream_channel(self, camera_id, variant=None):
+        channels = self.frame_channels[camera_id]
+        return channels.get(variant) or channels[Config.DEFAULT_STREAM_VARIANT]
+
+    def add_stream_subscriber(self, camera_id, variant=None):
+        channel = self.get_stream_channel(camera_id, variant)
+        with self.relays_lock:
+            channel.subscribe()
+            key = (camera_id, channel.name)
+            if key not in self.relays:
+                self.relays[key] = FrameRelay(self.socket_path, camera_id, channel.name, channel)
+
+    def remove_stream_subscriber(self, camera_id, variant=None):
+        channel = self.get_stream_channel(camera_id, variant)
+        with self.relays_lock:
+            channel.unsubscribe()
+            if not channel.has_subscribers():
+                relay = self.relays.pop((camera_id, channel.name), None)
+                if relay is not None:
+                    relay.stop()
+
+    def get_frame(self, camera_id, variant=None, last_seq=0):
+        return self.get_stream_channel(camera_id, variant).wait(last_seq, timeout=1)
+
+    async def get_frame_async(self, camera_id, variant=None, last_seq=0):
+        return await self.get_stream_channel(camera_id, variant).wait_async(last_seq, timeout=1)
@@ -0,0 +1,106 @@
+"""Servicio de detección independiente.
+
+Carga el modelo YOLO y procesa las cámaras una sola vez, y atiende a los
+workers web por un socket Unix local: llamadas a los métodos de consulta y
+control del TrafficDetector (lista blanca en ipc.RPC_METHODS) y suscripciones
+a los frames procesados. Así N workers de gunicorn cuestan un solo detector.
+
+Uso:
+    python -m src.traffic.detector_service
+    DETECTOR_MODE=remote gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+"""
+import os
+import socketserver
+import threading
+from config import Config
+from src.traffic.detection import TrafficDetector
+from src.traffic.ipc import RPC_METHODS, send_message, recv_message
+
+
+class DetectorRequestHandler(socketserver.BaseRequestHandler):
+    """Una conexión de un worker web: llamadas RPC o, tras suscribirse, un stream de frames"""
+
+    def handle(self):
+        while True:
+            try:
+                message, _ = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+
+            if message.get('method') == 'subscribe_frames':
+                self.stream_frames(message['camera_id'], message.get('variant'))
+                return
+
+            try:
+                response = self.server.call(message.get('method'), message.get('args', []))
+                # Los resultados binarios (imágenes) viajan como payload, no dentro del JSON
+                if isinstance(response.get('result'), bytes):
+                    send_message(self.request, {'ok': True, 'binary': True}, response['result'])
+                else:
+                    send_message(self.request, response)
+            except (ConnectionError, OSError):
+                return
+
+    def stream_frames(self, camera_id, variant):
+        """Enviar cada frame procesado de la cámara hasta que el worker cierre la conexión"""
+        detector = self.server.detector
+        detector.add_stream_subscriber(camera_id, variant)
+        last_seq = 0
+        try:
+            while True:
+                last_seq, part = detector.get_frame(camera_id, variant, last_seq)
+                if part is not None:
+                    send_message(self.request, {'seq': last_seq}, part)
+                else:
+                    # Sin frames nuevos: un latido para detectar a tiempo si el worker se desconectó
+                    send_message(self.request, {'ping': True})
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            detector.remove_stream_subscriber(camera_id, variant)
+
+
+class DetectorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, detector):
+        self.detector = detector
+        self.control_lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, DetectorRequestHandler)
+        # Solo el usuario y su grupo pueden conectarse
+        os.chmod(socket_path, 0o660)
+
+    def call(self, method, args):
+        if method not in RPC_METHODS:
+            return {'ok': False, 'error': f"Método no permitido: {method}"}
+        try:
+            if method in ('start_processing', 'stop_processing'):
+                # Varios workers pueden pedir lo mismo a la vez: solo cuenta el primero
+                with self.control_lock:
+                    if (method == 'start_processing') != self.detector.processing:
+                        getattr(self.detector, method)(*args)
+                return {'ok': True, 'result': None}
+            return {'ok': True, 'result': getattr(self.detector, method)(*args)}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+
+def main():
+    detector = TrafficDetector(Config.MODEL_PATH)
+    server = DetectorServer(Config.DETECTOR_SOCKET, detector)
+    print(f"🛰️ Servicio de detección escuchando en {Config.DETECTOR_SOCKET}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if detector.processing:
+            detector.stop_processing()
+        server.server_close()
+        os.unlink(Config.DETECTOR_SOCKET)
+
+
+if __name__ == '__main__':
+    main()
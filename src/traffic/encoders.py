@@ -0,0 +1,112 @@
+import cv2
+
+# Backends opcionales basados en libjpeg-turbo
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+try:
+    import turbojpeg
+except ImportError:
+    turbojpeg = None
+
+SUBSAMPLING_MODES = ('444', '422', '420')
+
+
+class JpegEncoder:
+    """Interfaz común de los codificadores JPEG (frames BGR de OpenCV)"""
+    name = 'base'
+
+    def __init__(self, subsampling='420'):
+        if subsampling not in SUBSAMPLING_MODES:
+            raise ValueError(f"Submuestreo de croma no soportado: {subsampling}")
+        self.subsampling = subsampling
+
+    def encode(self, frame, quality=85):
+        """Codificar un frame BGR. Devuelve un objeto tipo bytes o None si falla"""
+        raise NotImplementedError
+
+
+class OpenCVJpegEncoder(JpegEncoder):
+    """Codificador por defecto con cv2.imencode"""
+    name = 'opencv'
+
+    def __init__(self, subsampling='420'):
+        super().__init__(subsampling)
+        self.base_params = []
+        # IMWRITE_JPEG_SAMPLING_FACTOR solo existe desde OpenCV 4.5.5
+        sampling_flag = getattr(cv2, 'IMWRITE_JPEG_SAMPLING_FACTOR', None)
+        sampling_value = getattr(cv2, f'IMWRITE_JPEG_SAMPLING_FACTOR_{subsampling}', None)
+        if sampling_flag is not None and sampling_value is not None:
+            self.base_params = [sampling_flag, sampling_value]
+
+    def encode(self, frame, quality=85):
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)] + self.base_params)
+        # Se devuelve el arreglo de numpy sin copiarlo a bytes: soporta el
+        # protocolo buffer y se copia una sola vez al armar la parte MJPEG
+        return buffer if ret else None
+
+
+class SimpleJpegEncoder(JpegEncoder):
+    """Codificador libjpeg-turbo a través de simplejpeg"""
+    name = 'simplejpeg'
+
+    def __init__(self, subsampling='420'):
+        if simplejpeg is None:
+            raise RuntimeError("simplejpeg no está instalado")
+        super().__init__(subsampling)
+
+    def encode(self, frame, quality=85):
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = frame.copy()
+        return simplejpeg.encode_jpeg(frame, quality=int(quality), colorspace='BGR',
+                                      colorsubsampling=self.subsampling, fastdct=True)
+
+
+class TurboJpegEncoder(JpegEncoder):
+    """Codificador libjpeg-turbo a través de PyTurboJPEG"""
+    name = 'turbojpeg'
+
+    def __init__(self, subsampling='420'):
+        if turbojpeg is None:
+            raise RuntimeError("PyTurboJPEG no está instalado")
+        super().__init__(subsampling)
+        # Lanza una excepción si no encuentra la librería nativa libturbojpeg
+        self.jpeg = turbojpeg.TurboJPEG()
+        self.jpeg_subsample = getattr(turbojpeg, f'TJSAMP_{subsampling}')
+
+    def encode(self, frame, quality=85):
+        return self.jpeg.encode(frame, quality=int(quality), pixel_format=turbojpeg.TJPF_BGR,
+                                jpeg_subsample=self.jpeg_subsample)
+
+
+ENCODERS = {
+    'simplejpeg': SimpleJpegEncoder,
+    'turbojpeg': TurboJpegEncoder,
+    'opencv': OpenCVJpegEncoder
+}
+
+
+def available_encoders():
+    """Nombres de los codificadores que se pueden usar en esta máquina"""
+    names = []
+    for name, encoder_class in ENCODERS.items():
+        try:
+            encoder_class()
+            names.append(name)
+        except Exception:
+            continue
+    return names
+
+
+def get_encoder(name='auto', subsampling='420'):
+    """Crear un codificador; 'auto' prefiere libjpeg-turbo y cae a OpenCV"""
+    candidates = list(ENCODERS) if name == 'auto' else [name, 'opencv']
+    for candidate in candidates:
+        try:
+            return ENCODERS[candidate](subsampling)
+        except (KeyError, RuntimeError, OSError) as e:
+            if name != 'auto':
+                print(f"⚠️ Codificador JPEG '{candidate}' no disponible ({e}), usando OpenCV")
+    return OpenCVJpegEncoder(subsampling)
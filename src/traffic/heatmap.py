@@ -0,0 +1,106 @@
+import threading
+import time
+import cv2
+import numpy as np
+
+
+def footprint_grid(boxes, frame_shape, rows, cols):
+    """Cantidad de vehículos que cubren cada celda de una grilla (rows, cols) del frame.
+
+    La huella es la mitad inferior de la caja (la parte apoyada en la calzada).
+    Las cajas se suman con un arreglo de diferencias 2D: cuatro np.add.at por
+    lote y dos sumas acumuladas, así el costo depende del tamaño de la grilla y
+    no de la cantidad ni del tamaño de las cajas.
+    """
+    height, width = frame_shape[:2]
+    diff = np.zeros((rows + 1, cols + 1), dtype=np.float32)
+    if len(boxes):
+        top = (boxes[:, 1] + boxes[:, 3]) / 2
+        r1 = np.clip((top / height * rows).astype(np.int64), 0, rows - 1)
+        r2 = np.clip((boxes[:, 3] / height * rows).astype(np.int64), 0, rows - 1) + 1
+        c1 = np.clip((boxes[:, 0] / width * cols).astype(np.int64), 0, cols - 1)
+        c2 = np.clip((boxes[:, 2] / width * cols).astype(np.int64), 0, cols - 1) + 1
+        np.add.at(diff, (r1, c1), 1)
+        np.add.at(diff, (r1, c2), -1)
+        np.add.at(diff, (r2, c1), -1)
+        np.add.at(diff, (r2, c2), 1)
+    return diff.cumsum(axis=0).cumsum(axis=1)[:rows, :cols]
+
+
+class OccupancyHeatmap:
+    """Grilla de ocupación de baja resolución de una cámara, con decaimiento exponencial.
+
+    Cada frame suma 1 en las celdas que cubre la huella de cada vehículo
+    (ver footprint_grid), con costo constante por frame.
+    """
+
+    def __init__(self, rows=36, cols=64, half_life=300.0):
+        self.rows = rows
+        self.cols = cols
+        self.half_life = half_life
+        self.lock = threading.Lock()
+        self.png_cache = {}
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.grid = np.zeros((self.rows, self.cols), dtype=np.float32)
+            self.updated_at = None
+            self.frame_shape = None
+            self.frames = 0
+            self.png_cache = {}
+
+    def update(self, boxes, frame_shape, now=None):
+        now = time.time() if now is None else now
+        height, width = frame_shape[:2]
+
+        occupancy = footprint_grid(boxes, frame_shape, self.rows, self.cols)
+
+        with self.lock:
+            if self.updated_at is not None:
+                self.grid *= np.float32(0.5 ** ((now - self.updated_at) / self.half_life))
+            self.grid += occupancy
+            self.updated_at = now
+            self.frame_shape = (height, width)
+            self.frames += 1
+
+    def get_data(self):
+        """Grilla normalizada (0-1) para la API"""
+        with self.lock:
+            grid = self.grid.copy()
+            updated_at = self.updated_at
+        peak = float(grid.max())
+        normalized = grid / peak if peak > 0 else grid
+        return {
+            'rows': self.rows,
+            'cols': self.cols,
+            'half_life_seconds': self.half_life,
+            'updated_at': updated_at,
+            'frames': self.frames,
+            'max': round(peak, 3),
+            'grid': np.round(normalized, 3).tolist()
+        }
+
+    def render_png(self, width=640, max_age=2.0):
+        """PNG con transparencia para superponer al video (en caché por `max_age` segundos)"""
+        with self.lock:
+            cached = self.png_cache.get(width)
+            if cached is not None and time.monotonic() - cached[0] < max_age:
+                return cached[1]
+            grid = self.grid.copy()
+            frame_height, frame_width = self.frame_shape or (self.rows, self.cols)
+        # Misma relación de aspecto que el video, para superponerlo con object-fit
+        height = max(1, int(round(width * frame_height / frame_width)))
+
+        peak = grid.max()
+        intensity = (grid / peak * 255).astype(np.uint8) if peak > 0 else np.zeros_like(grid, dtype=np.uint8)
+        intensity = cv2.resize(intensity, (width, height), interpolation=cv2.INTER_LINEAR)
+        overlay = cv2.cvtColor(cv2.applyColorMap(intensity, cv2.COLORMAP_JET), cv2.COLOR_BGR2BGRA)
+        # Las zonas sin tráfico quedan transparentes
+        overlay[:, :, 3] = (intensity.astype(np.float32) * 0.7).astype(np.uint8)
+        ok, png = cv2.imencode('.png', overlay)
+        png = png.tobytes() if ok else b''
+
+        with self.lock:
+            self.png_cache[width] = (time.monotonic(), png)
+        return png
@@ -0,0 +1,210 @@
+"""Salida HLS (H.264 en segmentos fMP4) de los frames anotados de cada cámara.
+
+Cada cámara tiene un proceso ffmpeg que recibe los frames crudos por stdin y
+escribe una playlist con las últimas N piezas en su propio directorio. Los
+segmentos son archivos estáticos: todos los espectadores descargan los mismos
+y el ancho de banda por cliente es el del video comprimido, no un JPEG por
+frame como en MJPEG.
+
+Un hilo por cámara alimenta a ffmpeg a FPS fijos con el último frame anotado
+(repitiéndolo si la detección va más lenta), así la línea de tiempo del video
+es estable sin importar el ritmo de la inferencia. El hilo de detección solo
+reemplaza una referencia y nunca se bloquea por el codificador.
+
+Para probarlo con los videos incluidos (requiere ffmpeg con libx264):
+    HLS_ENABLED=1 python run.py
+y elegir "HLS" en la vista de una cámara, o abrir /hls/0/index.m3u8 con un
+reproductor como VLC o ffplay (con la sesión iniciada).
+"""
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+import cv2
+
+PLAYLIST = 'index.m3u8'
+
+
+def find_ffmpeg(path='ffmpeg'):
+    """Ruta del ejecutable de ffmpeg, o None si no está instalado"""
+    return shutil.which(path)
+
+
+class HlsWriter:
+    def __init__(self, camera_id, output_dir, ffmpeg='ffmpeg', fps=10, width=960, segment_seconds=2,
+                 playlist_size=6, crf=28, preset='veryfast'):
+        self.camera_id = camera_id
+        self.output_dir = output_dir
+        self.ffmpeg = ffmpeg
+        self.fps = fps
+        self.width = width
+        self.segment_seconds = segment_seconds
+        self.playlist_size = playlist_size
+        self.crf = crf
+        self.preset = preset
+        self.lock = threading.Lock()
+        self.frame = None
+        self.running = False
+        # Interrumpe la espera entre reintentos al detener
+        self.wake = threading.Event()
+        self.thread = None
+        self.process = None
+        # Últimas líneas de stderr de ffmpeg, para el mensaje de error
+        self.stderr_tail = deque(maxlen=20)
+        self.stderr_thread = None
+        self.stats = {'frames_written': 0, 'frames_repeated': 0, 'restarts': 0, 'last_error': None}
+
+    @property
+    def playlist_path(self):
+        return os.path.join(self.output_dir, PLAYLIST)
+
+    def submit(self, frame):
+        """Publicar el último frame anotado (no copia: el frame no se vuelve a modificar)"""
+        with self.lock:
+            self.frame = frame
+
+    def start(self):
+        if self.running:
+            return
+        # Los segmentos de una ejecución anterior no sirven: la playlist empieza de cero
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        with self.lock:
+            self.frame = None
+        self.wake.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f'hls-{self.camera_id}', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Detener el hilo y ffmpeg esperando como máximo `timeout` segundos en total"""
+        deadline = time.monotonic() + timeout
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.close_process(max(0.0, deadline - time.monotonic()))
+        with self.lock:
+            self.frame = None
+
+    def output_size(self, frame):
+        height, width = frame.shape[:2]
+        if self.width and width > self.width:
+            height = int(round(height * self.width / width))
+            width = self.width
+        # H.264 con yuv420p necesita dimensiones pares
+        return width - width % 2, height - height % 2
+
+    def command(self, width, height):
+        gop = max(1, int(round(self.fps * self.segment_seconds)))
+        return [
+            self.ffmpeg, '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(self.fps), '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', self.preset, '-tune', 'zerolatency', '-crf', str(self.crf),
+            '-pix_fmt', 'yuv420p',
+            # Un keyframe al inicio de cada segmento para que cualquier cliente pueda empezar
+            '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+            '-f', 'hls', '-hls_time', str(self.segment_seconds), '-hls_list_size', str(self.playlist_size),
+            '-hls_flags', 'delete_segments+independent_segments+omit_endlist',
+            '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', os.path.join(self.output_dir, 'segment_%05d.m4s'),
+            self.playlist_path
+        ]
+
+    def open_process(self, size):
+        self.process = subprocess.Popen(self.command(*size), stdin=subprocess.PIPE,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        # stderr se vacía continuamente: si el pipe se llena ffmpeg se bloquea y con él stdin.write
+        self.stderr_tail.clear()
+        self.stderr_thread = threading.Thread(target=self.drain_stderr, args=(self.process.stderr,),
+                                              name=f'hls-stderr-{self.camera_id}', daemon=True)
+        self.stderr_thread.start()
+
+    def drain_stderr(self, stream):
+        for line in stream:
+            line = line.decode(errors='replace').strip()
+            if line:
+                self.stderr_tail.append(line)
+        stream.close()
+
+    def last_stderr(self, timeout=1.0):
+        """Últimas líneas de stderr de ffmpeg (espera a que termine de leerlas)"""
+        thread, self.stderr_thread = self.stderr_thread, None
+        if thread is not None:
+            thread.join(timeout)
+        return ' | '.join(list(self.stderr_tail)[-3:])
+
+    def close_process(self, timeout=5.0):
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def run(self):
+        interval = 1.0 / self.fps
+        next_time = time.monotonic()
+        size = None
+        last_frame = None
+        backoff = 1.0
+        opened_at = 0.0
+        while self.running:
+            with self.lock:
+                frame = self.frame
+            if frame is None:
+                time.sleep(interval)
+                next_time = time.monotonic()
+                continue
+
+            try:
+                if self.process is None:
+                    # El tamaño de salida se fija con el primer frame
+                    size = size or self.output_size(frame)
+                    self.open_process(size)
+                    opened_at = time.monotonic()
+                if frame is last_frame:
+                    self.stats['frames_repeated'] += 1
+                else:
+                    last_frame = frame
+                    if (frame.shape[1], frame.shape[0]) != size:
+                        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+                    data = frame.tobytes()
+                self.process.stdin.write(data)
+                self.stats['frames_written'] += 1
+            except (BrokenPipeError, OSError, ValueError) as e:
+                self.close_process(1.0)
+                error = self.last_stderr()
+                self.stats['last_error'] = error or str(e)
+                self.stats['restarts'] += 1
+                print(f"⚠️ HLS cámara {self.camera_id}: ffmpeg terminó ({self.stats['last_error']}), "
+                      f"reintentando en {backoff:.0f}s")
+                last_frame = None
+                # Si ffmpeg venía funcionando bien se reintenta rápido; si falla al arrancar, cada vez más lento
+                if time.monotonic() - opened_at > 60:
+                    backoff = 1.0
+                self.wake.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                next_time = time.monotonic()
+                continue
+
+            next_time += interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # El codificador no da abasto: no acumular atraso
+                next_time = time.monotonic()
+
+    def get_stats(self):
+        return dict(self.stats, running=self.running, fps=self.fps,
+                    playlist_ready=os.path.exists(self.playlist_path))
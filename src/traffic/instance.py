@@ -0,0 +1,11 @@
+from config import Config
+
+# Instancia global del detector. En modo 'remote' el modelo y las cámaras viven
+# en el servicio de detección (python -m src.traffic.detector_service) y cada
+# worker web solo tiene un cliente liviano
+if Config.DETECTOR_MODE == 'remote':
+    from src.traffic.detector_client import RemoteTrafficDetector
+    traffic_detector = RemoteTrafficDetector(Config.DETECTOR_SOCKET)
+else:
+    from src.traffic.detection import TrafficDetector
+    traffic_detector = TrafficDetector(Config.MODEL_PATH)
@@ -0,0 +1,70 @@
+"""Protocolo entre el servicio de detección y los workers web (socket Unix local).
+
+Cada mensaje es una cabecera de 8 bytes (largo del JSON y largo del payload
+binario), el JSON y el payload opcional, que se usa para los frames MJPEG.
+"""
+import json
+import socket
+import struct
+from datetime import datetime
+
+HEADER = struct.Struct('!II')
+
+# Métodos del TrafficDetector que los workers web pueden invocar
+RPC_METHODS = {
+    'get_realtime_data', 'get_dashboard_totals', 'get_group_congestion', 'get_congestion_level',
+    'get_smoothed_weighted', 'get_congestion_stats', 'get_semaphore_states', 'get_emergency_mode',
+    'get_accumulated_data', 'reset_accumulated_data', 'get_metrics', 'get_camera_detections',
+    'start_processing', 'stop_processing', 'is_processing', 'get_heatmap', 'get_heatmap_png',
+    'get_lane_data', 'get_traffic_flow', 'get_snapshot',
+    'get_health'
+}
+
+
+class DetectorUnavailable(RuntimeError):
+    """El servicio de detección no responde"""
+
+
+def encode_value(value):
+    # Las fechas de los semáforos viajan marcadas para reconstruirlas del otro lado
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f"No se puede serializar {type(value).__name__}")
+
+
+def decode_object(obj):
+    if '__datetime__' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+def send_message(sock, message, payload=b''):
+    data = json.dumps(message, default=encode_value).encode('utf-8')
+    sock.sendall(HEADER.pack(len(data), len(payload)) + data + bytes(payload))
+
+
+def recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError("Conexión cerrada")
+        received += count
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    """Devuelve (mensaje, payload)"""
+    json_size, payload_size = HEADER.unpack(recv_exact(sock, HEADER.size))
+    message = json.loads(recv_exact(sock, json_size), object_hook=decode_object)
+    payload = recv_exact(sock, payload_size) if payload_size else b''
+    return message, payload
+
+
+def connect(path, timeout=None):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    sock.connect(path)
+    return sock
@@ -0,0 +1,135 @@
+import threading
+import cv2
+import numpy as np
+from src.traffic.heatmap import footprint_grid
+from src.traffic.tracking import box_anchors
+from src.utils.constants import VEHICLE_CLASSES, VEHICLE_WEIGHTS
+
+# Peso de cada índice de VEHICLE_CLASSES
+CLASS_WEIGHTS = np.array([VEHICLE_WEIGHTS[name] for name in VEHICLE_CLASSES], dtype=np.float32)
+
+
+class LaneMap:
+    """Conteo, ocupación y cola por carril a partir de polígonos normalizados (0-1).
+
+    Los polígonos se rasterizan una sola vez en una máscara de etiquetas de
+    baja resolución (-1 = fuera de todo carril; si dos carriles se superponen
+    gana el último). Por frame, cada vehículo se asigna al carril de la celda
+    de su punto de apoyo con una sola indexación, y la ocupación se obtiene
+    cruzando la máscara con la grilla de huellas de las cajas.
+
+    La cola se mide sobre el eje del carril, desde 'stop' (la línea de
+    detención) hacia 'entry': son los vehículos encadenados desde la línea sin
+    huecos mayores a `queue_gap` (fracción del largo del carril) entre el
+    fondo de un vehículo y el frente del siguiente.
+    """
+
+    def __init__(self, lanes, mask_size=(72, 128), queue_gap=0.08, alpha=0.1):
+        self.lanes = list(lanes)
+        self.rows, self.cols = mask_size
+        self.queue_gap = queue_gap
+        self.alpha = alpha
+        self.lock = threading.Lock()
+
+        self.labels = np.full((self.rows, self.cols), -1, dtype=np.int16)
+        axes = []
+        for index, lane in enumerate(self.lanes):
+            polygon = np.array(lane['polygon'], dtype=np.float32)
+            points = np.rint(polygon * (self.cols, self.rows)).astype(np.int32)
+            cv2.fillPoly(self.labels, [points], index)
+            # Sin eje explícito se asume que los vehículos avanzan hacia abajo del frame
+            stop = lane.get('stop', (polygon[:, 0].mean(), polygon[:, 1].max()))
+            entry = lane.get('entry', (polygon[:, 0].mean(), polygon[:, 1].min()))
+            axes.append((stop, entry))
+        self.axes = np.array(axes, dtype=np.float32).reshape(-1, 2, 2)
+        self.area = np.bincount(self.labels[self.labels >= 0], minlength=len(self.lanes))
+        self.reset()
+
+    def __len__(self):
+        return len(self.lanes)
+
+    def reset(self):
+        with self.lock:
+            self.data = [self.empty_lane(lane) for lane in self.lanes]
+
+    @staticmethod
+    def empty_lane(lane):
+        return {
+            'count': 0, 'weighted': 0.0, 'occupancy': 0.0, 'queue_vehicles': 0,
+            'queue_length': 0.0, 'queue_length_m': 0.0 if lane.get('length_m') else None,
+            'queue_smoothed': 0.0
+        }
+
+    def assign(self, boxes, frame_shape):
+        """Índice de carril del punto de apoyo de cada caja (-1 = fuera de los carriles)"""
+        height, width = frame_shape[:2]
+        anchors = box_anchors(boxes)
+        rows = np.clip((anchors[:, 1] / height * self.rows).astype(np.int64), 0, self.rows - 1)
+        cols = np.clip((anchors[:, 0] / width * self.cols).astype(np.int64), 0, self.cols - 1)
+        return self.labels[rows, cols].astype(np.int64)
+
+    def update(self, boxes, class_ids, frame_shape):
+        if not self.lanes:
+            return
+        height, width = frame_shape[:2]
+        lane_count = len(self.lanes)
+        lane_ids = self.assign(boxes, frame_shape)
+        inside = lane_ids >= 0
+
+        counts = np.bincount(lane_ids[inside], minlength=lane_count)
+        weighted = np.bincount(lane_ids[inside], weights=CLASS_WEIGHTS[class_ids[inside]], minlength=lane_count)
+
+        # Fracción de las celdas de cada carril cubiertas por alguna huella
+        covered = (footprint_grid(boxes, frame_shape, self.rows, self.cols) > 0) & (self.labels >= 0)
+        occupied = np.bincount(self.labels[covered], minlength=lane_count)
+        occupancy = occupied / np.maximum(self.area, 1)
+
+        # Frente (punto de apoyo) y fondo (centro del borde superior) de cada
+        # vehículo sobre el eje de su carril: 0 = línea de detención, 1 = entrada
+        inside_ids = lane_ids[inside]
+        inside_boxes = boxes[inside]
+        fronts = self.project(box_anchors(inside_boxes) / (width, height), inside_ids)
+        rears = self.project(np.stack(((inside_boxes[:, 0] + inside_boxes[:, 2]) / 2, inside_boxes[:, 1]),
+                                      axis=1) / (width, height), inside_ids)
+
+        with self.lock:
+            for index, lane in enumerate(self.lanes):
+                in_lane = inside_ids == index
+                order = np.argsort(fronts[in_lane])
+                lane_fronts = fronts[in_lane][order]
+                lane_rears = np.maximum.accumulate(np.maximum(rears[in_lane][order], lane_fronts)) \
+                    if len(order) else lane_fronts
+                # Cola: vehículos encadenados desde la línea de detención, con
+                # huecos entre el fondo de uno y el frente del siguiente
+                gaps = lane_fronts - np.concatenate(([0.0], lane_rears[:-1]))
+                breaks = np.nonzero(gaps > self.queue_gap)[0]
+                queue_vehicles = int(breaks[0]) if len(breaks) else len(lane_fronts)
+                queue_length = float(lane_rears[queue_vehicles - 1]) if queue_vehicles else 0.0
+
+                data = self.data[index]
+                data['count'] = int(counts[index])
+                data['weighted'] = round(float(weighted[index]), 2)
+                data['occupancy'] = round(float(occupancy[index]), 3)
+                data['queue_vehicles'] = queue_vehicles
+                data['queue_length'] = round(queue_length, 3)
+                if lane.get('length_m'):
+                    data['queue_length_m'] = round(queue_length * lane['length_m'], 1)
+                data['queue_smoothed'] = round(
+                    (1 - self.alpha) * data['queue_smoothed'] + self.alpha * queue_length, 4)
+
+    def project(self, points, lane_ids):
+        """Posición (0-1) de puntos normalizados sobre el eje stop -> entry de su carril"""
+        axes = self.axes[lane_ids]
+        direction = axes[:, 1] - axes[:, 0]
+        positions = np.einsum('ij,ij->i', points - axes[:, 0], direction) / \
+            np.maximum(np.einsum('ij,ij->i', direction, direction), 1e-6)
+        return np.clip(positions, 0, 1)
+
+    def max_queue(self):
+        """Mayor cola suavizada entre los carriles (fracción del largo del carril)"""
+        with self.lock:
+            return max((data['queue_smoothed'] for data in self.data), default=0.0)
+
+    def get_data(self):
+        with self.lock:
+            return {lane['name']: dict(data) for lane, data in zip(self.lanes, self.data)}
@@ -0,0 +1,104 @@
+"""Stream sin procesar (detección apagada) compartido entre los clientes.
+
+Un hilo por cámara y variante toma los frames de la fuente compartida, dibuja
+el aviso y publica cada frame codificado una sola vez en el FrameChannel de la
+variante, el mismo canal que usa el stream de detección. Los clientes solo
+esperan el frame publicado: N espectadores cuestan una codificación por frame.
+"""
+import threading
+import time
+import cv2
+from config import Config
+from src.traffic.instance import traffic_detector
+from src.traffic.video_source import acquire_source, release_source
+
+
+def render_preview_frame(channel, frame):
+    """Codificar un frame sin procesar para el stream cuando la detección está apagada"""
+    # El frame es compartido: dibujar sobre la versión de la variante
+    frame = channel.prepare(frame).copy()
+
+    # Añadir texto indicando que el procesamiento está desactivado
+    cv2.putText(frame, "PROCESAMIENTO DESACTIVADO", (50, 50),
+               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+
+    return channel.encode(frame)
+
+
+class PreviewPublisher:
+    """Publica el video sin procesar de una cámara en un canal mientras tenga clientes"""
+
+    def __init__(self, camera_id, video_path, channel):
+        self.camera_id = camera_id
+        self.video_path = video_path
+        self.channel = channel
+        self.clients = 0
+        self.running = False
+        self.thread = None
+
+    @property
+    def key(self):
+        return (self.camera_id, self.channel.name)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f'preview-{self.camera_id}-{self.channel.name}',
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # No se espera al hilo: termina en menos de un segundo y libera la fuente solo
+        self.running = False
+
+    def run(self):
+        source = acquire_source(self.video_path)
+        last_seq = 0
+        try:
+            while self.running:
+                if traffic_detector.processing:
+                    # El detector publica en el mismo canal: no leer ni codificar
+                    time.sleep(0.5)
+                    continue
+                if not source.running:
+                    # La fuente se descartó (reinicio de un worker trabado): tomar la nueva
+                    release_source(source)
+                    source = acquire_source(self.video_path)
+                    last_seq = 0
+                    continue
+                last_seq, frame, _ = source.read(last_seq, timeout=1)
+                if frame is None or not self.running or not self.channel.has_subscribers():
+                    continue
+                jpeg = render_preview_frame(self.channel, frame)
+                if jpeg is not None:
+                    self.channel.publish(jpeg)
+        finally:
+            release_source(source)
+
+
+# Un publicador por (cámara, variante), compartido por todos sus clientes
+_previews = {}
+_previews_lock = threading.Lock()
+
+
+def acquire_preview(camera_id, variant=None):
+    """Registrar un cliente del stream sin procesar (arranca el publicador si es el primero)"""
+    channel = traffic_detector.get_stream_channel(camera_id, variant)
+    with _previews_lock:
+        preview = _previews.get((camera_id, channel.name))
+        if preview is None:
+            preview = PreviewPublisher(camera_id, Config.VIDEO_PATHS[camera_id], channel)
+            preview.start()
+            _previews[preview.key] = preview
+        preview.clients += 1
+        return preview
+
+
+def release_preview(preview):
+    """Liberar un cliente; el publicador se detiene cuando ya nadie lo usa"""
+    with _previews_lock:
+        preview.clients -= 1
+        if preview.clients > 0:
+            return
+        if _previews.get(preview.key) is preview:
+            del _previews[preview.key]
+    preview.stop()
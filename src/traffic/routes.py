@@ -1,44 +1,106 @@
-from flask import Blueprint, render_template, Response, jsonify, request
+from flask import Blueprint, render_template, Response, jsonify, request, send_from_directory, abort
 from src.auth.decorators import login_required
-from src.traffic.detection import traffic_detector
+from src.traffic.instance import traffic_detector
+from src.traffic.ipc import DetectorUnavailable
+from src.traffic.preview import acquire_preview, release_preview
 from config import Config
-import cv2
-import time
+import os
 
 traffic_bp = Blueprint('traffic', __name__)
 
-def generate_frames(camera_id):
-    while True:
-        if traffic_detector.processing:
-            frame_bytes = traffic_detector.get_frame(camera_id)
-            if frame_bytes:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            else:
-                # Si no hay frame procesado, mostrar video normal
-                yield from generate_normal_video(camera_id)
-        else:
-            # Si no hay procesamiento, mostrar video normal
-            yield from generate_normal_video(camera_id)
-
-def generate_normal_video(camera_id):
-    cap = cv2.VideoCapture(Config.VIDEO_PATHS[camera_id])
-    while traffic_detector.processing is False and cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
-        
-        # Añadir texto indicando que el procesamiento está desactivado
-        cv2.putText(frame, "PROCESAMIENTO DESACTIVADO", (50, 50), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-        
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        time.sleep(0.03)
-    cap.release()
+@traffic_bp.errorhandler(DetectorUnavailable)
+def detector_unavailable(error):
+    # Solo en modo 'remote', si el servicio de detección no está corriendo
+    return jsonify({'success': False, 'error': str(error)}), 503
+
+def generate_frames(camera_id, variant):
+    # El detector solo dibuja y codifica mientras haya clientes conectados;
+    # el finally se ejecuta cuando el navegador cierra la conexión
+    traffic_detector.add_stream_subscriber(camera_id, variant)
+    # Con la detección apagada el mismo canal recibe el video sin procesar
+    preview = acquire_preview(camera_id, variant)
+    last_seq = 0
+    try:
+        while True:
+            last_seq, frame_part = traffic_detector.get_frame(camera_id, variant, last_seq)
+            if frame_part:
+                yield frame_part
+    finally:
+        release_preview(preview)
+        traffic_detector.remove_stream_subscriber(camera_id, variant)
+
+def valid_camera_id(camera_id):
+    """El detector maneja cuatro cámaras (0 a 3)"""
+    return isinstance(camera_id, int) and not isinstance(camera_id, bool) and 0 <= camera_id < 4
+
+def get_stream_variant(variant):
+    """Validar la variante pedida: 'thumb' para la grilla del dashboard, 'full' para el detalle"""
+    return variant if variant in Config.STREAM_VARIANTS else Config.DEFAULT_STREAM_VARIANT
+
+def detection_payload():
+    """Datos para el dashboard (suma de todas las cámaras) y de cada cámara"""
+    dashboard_totals = traffic_detector.get_dashboard_totals()
+    total_vehicles = dashboard_totals['total_vehicles']
+    type_totals = dashboard_totals['type_totals']
+    total_congestion = dashboard_totals['congestion_level']
+    
+    # Datos individuales de cada cámara
+    cameras_data = traffic_detector.get_realtime_data()
+    
+    # Congestión de grupos
+    group_congestion = {
+        'group_1': traffic_detector.get_group_congestion('group_1'),
+        'group_2': traffic_detector.get_group_congestion('group_2')
+    }
+    
+    return {
+        'dashboard_totals': {
+            'total_vehicles': total_vehicles,
+            'type_totals': type_totals,
+            'total_smoothed': dashboard_totals['total_smoothed'],
+            'congestion_level': total_congestion
+        },
+        'cameras_data': cameras_data,
+        'group_congestion': group_congestion,
+        'processing': traffic_detector.processing
+    }
+
+def camera_payload(camera_id):
+    """Datos en tiempo real (no acumulados) de una cámara"""
+    detection_data = traffic_detector.get_realtime_data(camera_id) or {
+        'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0, 'weighted_smoothed': 0
+    }
+    congestion_level = traffic_detector.get_congestion_level(traffic_detector.get_smoothed_weighted(camera_id))
+    
+    return {
+        'camera_id': camera_id,
+        'detection_data': detection_data,
+        'congestion_level': congestion_level,
+        'congestion_stats': traffic_detector.get_congestion_stats(camera_id),
+        'lanes': traffic_detector.get_lane_data(camera_id)
+    }
+
+def semaphore_payload():
+    """Estado de semáforos, modo emergencia y congestión de grupos"""
+    semaphore_states = traffic_detector.get_semaphore_states()
+    emergency_mode = traffic_detector.get_emergency_mode()
+    
+    # Calcular congestión de grupos
+    group_congestion = {
+        'group_1': traffic_detector.get_group_congestion('group_1'),
+        'group_2': traffic_detector.get_group_congestion('group_2')
+    }
+    
+    # Cámaras atrasadas: el controlador las está ponderando a la baja
+    snapshot = traffic_detector.get_snapshot()
+    stale_cameras = [name for name, camera in snapshot['cameras'].items() if camera['stale']]
+    
+    return {
+        'semaphore_states': semaphore_states,
+        'emergency_mode': emergency_mode,
+        'group_congestion': group_congestion,
+        'stale_cameras': stale_cameras
+    }
 
 @traffic_bp.route('/')
 @traffic_bp.route('/dashboard')
@@ -78,28 +140,35 @@ def dashboard():
 @traffic_bp.route('/video_feed/<int:camera_id>')
 @login_required
 def video_feed(camera_id):
-    return Response(generate_frames(camera_id),
+    if not valid_camera_id(camera_id):
+        abort(404)
+    variant = get_stream_variant(request.args.get('variant'))
+    return Response(generate_frames(camera_id, variant),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @traffic_bp.route('/camera/<int:camera_id>')
 @login_required
 def camera_detail(camera_id):
+    if not valid_camera_id(camera_id):
+        abort(404)
     # Usar datos en tiempo real (no acumulados)
     detection_data = traffic_detector.get_realtime_data(camera_id) or {
-        'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0
+        'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0, 'weighted_smoothed': 0
     }
-    congestion_level = traffic_detector.get_congestion_level(detection_data['weighted_total'])
+    congestion_level = traffic_detector.get_congestion_level(traffic_detector.get_smoothed_weighted(camera_id))
     
     return render_template('traffic/camera_detail.html',
                          camera_id=camera_id,
                          detection_data=detection_data,
                          congestion_level=congestion_level,
-                         processing=traffic_detector.processing)
+                         processing=traffic_detector.processing,
+                         hls_enabled=Config.HLS_ENABLED)
 
 @traffic_bp.route('/toggle_processing', methods=['POST'])
 @login_required
 def toggle_processing():
-    if traffic_detector.processing:
+    # Consulta directa (no el valor cacheado del cliente remoto) para no invertir el estado
+    if traffic_detector.is_processing():
         traffic_detector.stop_processing()
     else:
         traffic_detector.start_processing(Config.VIDEO_PATHS)
@@ -109,7 +178,10 @@ def toggle_processing():
 @traffic_bp.route('/reset_accumulated', methods=['POST'])
 @login_required
 def reset_accumulated():
-    camera_id = request.json.get('camera_id') if request.json else None
+    data = request.get_json(silent=True) or {}
+    camera_id = data.get('camera_id')
+    if camera_id is not None and not valid_camera_id(camera_id):
+        return jsonify({'error': 'camera_id debe ser un entero entre 0 y 3'}), 400
     traffic_detector.reset_accumulated_data(camera_id)
     
     if camera_id is not None:
@@ -120,62 +192,112 @@ def reset_accumulated():
 @traffic_bp.route('/api/detection_data')
 @login_required
 def api_detection_data():
-    # Datos para el dashboard (suma de todas las cámaras)
-    dashboard_totals = traffic_detector.get_dashboard_totals()
-    total_vehicles = dashboard_totals['total_vehicles']
-    type_totals = dashboard_totals['type_totals']
-    total_congestion = dashboard_totals['congestion_level']
-    
-    # Datos individuales de cada cámara
-    cameras_data = traffic_detector.get_realtime_data()
-    
-    # Congestión de grupos
-    group_congestion = {
-        'group_1': traffic_detector.get_group_congestion('group_1'),
-        'group_2': traffic_detector.get_group_congestion('group_2')
-    }
-    
-    return jsonify({
-        'dashboard_totals': {
-            'total_vehicles': total_vehicles,
-            'type_totals': type_totals,
-            'congestion_level': total_congestion
-        },
-        'cameras_data': cameras_data,
-        'group_congestion': group_congestion,
-        'processing': traffic_detector.processing
-    })
+    return jsonify(detection_payload())
 
 @traffic_bp.route('/api/camera_data/<int:camera_id>')
 @login_required
 def api_camera_data(camera_id):
-    # Usar datos en tiempo real (no acumulados)
-    detection_data = traffic_detector.get_realtime_data(camera_id) or {
-        'total': 0, 'carro': 0, 'camion': 0, 'bus': 0, 'ambulancia': 0, 'mototaxi': 0, 'weighted_total': 0
-    }
-    congestion_level = traffic_detector.get_congestion_level(detection_data['weighted_total'])
-    
-    return jsonify({
-        'camera_id': camera_id,
-        'detection_data': detection_data,
-        'congestion_level': congestion_level
-    })
+    if not valid_camera_id(camera_id):
+        abort(404)
+    return jsonify(camera_payload(camera_id))
+
+@traffic_bp.route('/api/camera_detections/<int:camera_id>')
+@login_required
+def api_camera_detections(camera_id):
+    if not valid_camera_id(camera_id):
+        abort(404)
+    return jsonify(traffic_detector.get_camera_detections(camera_id))
+
+@traffic_bp.route('/hls/<int:camera_id>/<path:filename>')
+@login_required
+def hls_file(camera_id, filename):
+    """Playlist y segmentos HLS de una cámara (archivos escritos por ffmpeg)"""
+    if not Config.HLS_ENABLED:
+        abort(404)
+    directory = os.path.abspath(os.path.join(Config.HLS_DIR, str(camera_id)))
+    if filename.endswith('.m3u8'):
+        # La playlist cambia con cada segmento nuevo
+        response = send_from_directory(directory, filename, mimetype='application/vnd.apple.mpegurl')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    # Los segmentos no cambian nunca: el navegador los reutiliza mientras estén en la playlist
+    mimetype = 'video/iso.segment' if filename.endswith('.m4s') else 'video/mp4'
+    response = send_from_directory(directory, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = f'private, max-age={Config.HLS_SEGMENT_SECONDS * Config.HLS_PLAYLIST_SIZE}'
+    return response
+
+@traffic_bp.route('/api/heatmap/<int:camera_id>')
+@login_required
+def api_heatmap(camera_id):
+    """Grilla de ocupación (0-1) acumulada con decaimiento"""
+    if not valid_camera_id(camera_id):
+        abort(404)
+    return jsonify(traffic_detector.get_heatmap(camera_id))
+
+@traffic_bp.route('/heatmap/<int:camera_id>.png')
+@login_required
+def heatmap_png(camera_id):
+    """Mapa de calor como PNG transparente para superponer al video"""
+    if not valid_camera_id(camera_id):
+        abort(404)
+    width = min(max(request.args.get('width', 640, type=int), 64), 1920)
+    png = traffic_detector.get_heatmap_png(camera_id, width)
+    response = Response(png, mimetype='image/png')
+    response.headers['Cache-Control'] = f'private, max-age={int(Config.HEATMAP_PNG_MAX_AGE)}'
+    return response
+
+@traffic_bp.route('/api/lane_data')
+@traffic_bp.route('/api/lane_data/<int:camera_id>')
+@login_required
+def api_lane_data(camera_id=None):
+    """Conteo, ocupación y cola por carril"""
+    if camera_id is not None and not valid_camera_id(camera_id):
+        abort(404)
+    return jsonify(traffic_detector.get_lane_data(camera_id))
+
+@traffic_bp.route('/api/traffic_flow')
+@traffic_bp.route('/api/traffic_flow/<int:camera_id>')
+@login_required
+def api_traffic_flow(camera_id=None):
+    """Velocidad media y flujo de vehículos por cámara y por grupo"""
+    if camera_id is not None and not valid_camera_id(camera_id):
+        abort(404)
+    return jsonify(traffic_detector.get_traffic_flow(camera_id))
+
+@traffic_bp.route('/api/snapshot')
+@login_required
+def api_snapshot():
+    """Estado de las cámaras alineado a un instante (?t=epoch&mode=interpolate|nearest)"""
+    mode = request.args.get('mode')
+    if mode not in (None, 'interpolate', 'nearest'):
+        return jsonify({'error': 'mode debe ser interpolate o nearest'}), 400
+    return jsonify(traffic_detector.get_snapshot(request.args.get('t', type=float), mode))
+
+@traffic_bp.route('/api/health')
+@login_required
+def api_health():
+    """Estado de los workers de cámara (503 si alguno no está procesando)"""
+    health = traffic_detector.get_health()
+    status = 503 if health['processing'] and not health['healthy'] else 200
+    return jsonify(health), status
+
+@traffic_bp.route('/api/accumulated_data')
+@traffic_bp.route('/api/accumulated_data/<int:camera_id>')
+@login_required
+def api_accumulated_data(camera_id=None):
+    """Vehículos únicos por clase, cruces de líneas por dirección y vehículos por hora"""
+    if camera_id is not None and not valid_camera_id(camera_id):
+        abort(404)
+    return jsonify(traffic_detector.get_accumulated_data(camera_id))
 
 @traffic_bp.route('/api/semaphore_data')
 @login_required
 def api_semaphore_data():
     """API para obtener datos de semáforos"""
-    semaphore_states = traffic_detector.get_semaphore_states()
-    emergency_mode = traffic_detector.get_emergency_mode()
-    
-    # Calcular congestión de grupos
-    group_congestion = {
-        'group_1': traffic_detector.get_group_congestion('group_1'),
-        'group_2': traffic_detector.get_group_congestion('group_2')
-    }
-    
-    return jsonify({
-        'semaphore_states': semaphore_states,
-        'emergency_mode': emergency_mode,
-        'group_congestion': group_congestion
-    })
\ No newline at end of file
+    return jsonify(semaphore_payload())
+
+@traffic_bp.route('/metrics')
+@login_required
+def metrics():
+    """Métricas de rendimiento del detector"""
+    return jsonify(traffic_detector.get_metrics())
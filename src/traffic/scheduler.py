@@ -0,0 +1,109 @@
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+# Menor número = se atiende primero
+PRIORITY_EMERGENCY = 0
+PRIORITY_NORMAL = 1
+PRIORITY_NAMES = {PRIORITY_EMERGENCY: 'emergency', PRIORITY_NORMAL: 'normal'}
+
+
+class InferenceScheduler:
+    """Turnos de inferencia compartidos por los hilos de las cámaras.
+
+    Solo `slots` hilos ejecutan el modelo a la vez; el resto espera en una cola
+    ordenada por prioridad y, dentro de la misma prioridad, por orden de llegada.
+    Así una cámara con una ambulancia reciente pasa delante de las demás.
+
+    Se registra quién ocupa cada turno: un hilo colgado dentro del modelo lo
+    retendría para siempre, así que `reclaim` devuelve los turnos ocupados
+    hace demasiado tiempo para que las demás cámaras sigan inferiendo.
+    """
+
+    def __init__(self, slots=1):
+        self.slots = max(1, int(slots))
+        self.active = 0
+        # ticket -> (nombre del hilo, inicio) de cada turno en uso
+        self.holders = {}
+        self.reclaimed = 0
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.stats = {
+            name: {'runs': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    def set_slots(self, slots):
+        """Cambiar la cantidad de inferencias simultáneas (p. ej. tras el autotuning)"""
+        with self.condition:
+            self.slots = max(1, int(slots))
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority=PRIORITY_NORMAL):
+        """Esperar turno para ejecutar el modelo y liberarlo al salir del bloque"""
+        ticket = (priority, next(self.counter))
+        requested_at = time.perf_counter()
+        with self.condition:
+            heapq.heappush(self.queue, ticket)
+            while self.active >= self.slots or self.queue[0] != ticket:
+                self.condition.wait()
+            heapq.heappop(self.queue)
+            self.active += 1
+            self.holders[ticket] = (threading.current_thread().name, time.monotonic())
+            # El siguiente de la cola puede tener lugar si hay más de un slot
+            self.condition.notify_all()
+
+            waited = time.perf_counter() - requested_at
+            stats = self.stats[PRIORITY_NAMES.get(priority, 'normal')]
+            stats['runs'] += 1
+            stats['wait_total'] += waited
+            stats['wait_max'] = max(stats['wait_max'], waited)
+        try:
+            yield
+        finally:
+            with self.condition:
+                # Si el turno se reclamó mientras tanto ya se descontó
+                if self.holders.pop(ticket, None) is not None:
+                    self.active -= 1
+                self.condition.notify_all()
+
+    def stuck(self, older_than):
+        """Hilos que ocupan un turno hace más de `older_than` segundos: [(nombre, segundos)]"""
+        now = time.monotonic()
+        with self.condition:
+            return [(name, now - since) for name, since in self.holders.values() if now - since > older_than]
+
+    def reclaim(self, older_than):
+        """Liberar los turnos ocupados hace más de `older_than` segundos y devolver los hilos que los tenían"""
+        now = time.monotonic()
+        with self.condition:
+            expired = [ticket for ticket, (_, since) in self.holders.items() if now - since > older_than]
+            names = [self.holders.pop(ticket)[0] for ticket in expired]
+            self.active -= len(expired)
+            self.reclaimed += len(expired)
+            if expired:
+                self.condition.notify_all()
+            return names
+
+    def get_stats(self):
+        now = time.monotonic()
+        with self.condition:
+            return {
+                'slots': self.slots,
+                'active': self.active,
+                'queued': len(self.queue),
+                'longest_held_ms': round(max((now - since for _, since in self.holders.values()), default=0.0) * 1000, 1),
+                'reclaimed': self.reclaimed,
+                'priorities': {
+                    name: {
+                        'runs': stats['runs'],
+                        'avg_wait_ms': round(stats['wait_total'] / stats['runs'] * 1000, 2) if stats['runs'] else 0.0,
+                        'max_wait_ms': round(stats['wait_max'] * 1000, 2)
+                    }
+                    for name, stats in self.stats.items()
+                }
+            }
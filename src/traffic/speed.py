@@ -0,0 +1,154 @@
+import threading
+from collections import deque
+import cv2
+import numpy as np
+from src.traffic.stats import RollingStats
+from src.traffic.tracking import box_anchors
+
+
+def ground_homography(calibration):
+    """Homografía de coordenadas normalizadas (0-1) del frame al plano del suelo en metros.
+
+    `calibration` tiene cuatro puntos 'image' (normalizados) y sus cuatro
+    correspondientes 'ground' (en metros), p. ej. las esquinas de un tramo de
+    calzada de ancho y largo conocidos.
+    """
+    image = np.array(calibration['image'], dtype=np.float32)
+    ground = np.array(calibration['ground'], dtype=np.float32)
+    return cv2.getPerspectiveTransform(image, ground).astype(np.float64)
+
+
+def project(homography, points):
+    """Proyectar todos los puntos (N, 2) con una sola multiplicación de matrices"""
+    homogeneous = np.hstack((points, np.ones((len(points), 1)))) @ homography.T
+    return homogeneous[:, :2] / homogeneous[:, 2:3]
+
+
+class SpeedEstimator:
+    """Velocidad y flujo de una cámara a partir de los tracks del VehicleTracker.
+
+    El punto de apoyo de todos los tracks vistos en el frame se proyecta al
+    suelo de una vez. La velocidad de cada track se mide contra su última
+    posición de referencia, que solo se renueva cada `min_interval` segundos
+    para que el ruido de la caja entre frames consecutivos no domine, y se
+    suaviza con una EWMA por track. Sin calibración solo se calcula el flujo.
+
+    El flujo cuenta los tracks confirmados en los últimos `flow_window`
+    segundos, expresado en vehículos por hora.
+    """
+
+    def __init__(self, calibration=None, min_hits=3, min_interval=0.5, max_speed_kmh=150.0,
+                 flow_window=300.0, stats_window=90, alpha=0.3):
+        self.homography = ground_homography(calibration) if calibration else None
+        self.min_hits = min_hits
+        self.min_interval = min_interval
+        self.max_speed = max_speed_kmh / 3.6
+        self.flow_window = flow_window
+        self.alpha = alpha
+        self.speed_stats = RollingStats(stats_window, alpha, max_value=max_speed_kmh)
+        self.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def calibrated(self):
+        return self.homography is not None
+
+    def reset(self):
+        with self.lock:
+            # Un registro por track (ordenado por ID): posición y tiempo de referencia
+            self.ids = np.empty(0, dtype=np.int64)
+            self.positions = np.empty((0, 2), dtype=np.float64)
+            self.times = np.empty(0, dtype=np.float64)
+            self.speeds = np.empty(0, dtype=np.float64)
+            self.counted = np.empty(0, dtype=bool)
+            self.confirmed_at = deque()
+            self.started_at = None
+            self.last_time = None
+            self.moving = 0
+            self.speed_stats.reset()
+
+    def update(self, tracker, seen, frame_shape, timestamp):
+        height, width = frame_shape[:2]
+        with self.lock:
+            if self.started_at is None:
+                self.started_at = timestamp
+            self.last_time = timestamp
+
+            # Olvidar los tracks que el tracker ya descartó
+            alive = np.isin(self.ids, tracker.ids)
+            if not alive.all():
+                self.ids, self.positions, self.times, self.speeds, self.counted = (
+                    self.ids[alive], self.positions[alive], self.times[alive],
+                    self.speeds[alive], self.counted[alive])
+
+            ids = tracker.ids[seen]
+            if self.calibrated:
+                positions = project(self.homography, box_anchors(tracker.boxes[seen]) / (width, height))
+            else:
+                positions = np.zeros((len(seen), 2))
+
+            index = np.searchsorted(self.ids, ids)
+            known = index < len(self.ids)
+            known[known] = self.ids[index[known]] == ids[known]
+
+            # Tracks conocidos: medir velocidad si pasó el intervalo mínimo
+            rows = index[known]
+            elapsed = timestamp - self.times[rows]
+            due = elapsed >= self.min_interval
+            if self.calibrated and due.any():
+                due_rows = rows[due]
+                speeds = np.linalg.norm(positions[known][due] - self.positions[due_rows], axis=1) / elapsed[due]
+                # Los saltos imposibles suelen ser cambios de ID: se descartan
+                plausible = speeds <= self.max_speed
+                previous = self.speeds[due_rows[plausible]]
+                self.speeds[due_rows[plausible]] = np.where(
+                    np.isnan(previous), speeds[plausible],
+                    self.alpha * speeds[plausible] + (1 - self.alpha) * previous)
+            self.positions[rows[due]] = positions[known][due]
+            self.times[rows[due]] = timestamp
+
+            # Tracks nuevos
+            new = ~known
+            if new.any():
+                self.ids = np.concatenate((self.ids, ids[new]))
+                self.positions = np.concatenate((self.positions, positions[new]))
+                self.times = np.concatenate((self.times, np.full(new.sum(), timestamp)))
+                self.speeds = np.concatenate((self.speeds, np.full(new.sum(), np.nan)))
+                self.counted = np.concatenate((self.counted, np.zeros(new.sum(), dtype=bool)))
+                order = np.argsort(self.ids, kind='stable')
+                self.ids, self.positions, self.times, self.speeds, self.counted = (
+                    self.ids[order], self.positions[order], self.times[order],
+                    self.speeds[order], self.counted[order])
+
+            # Flujo: cada track se cuenta una vez, cuando se confirma
+            rows = np.searchsorted(self.ids, ids)
+            confirmed = tracker.hits[seen] >= self.min_hits
+            newly = rows[confirmed & ~self.counted[rows]]
+            self.counted[newly] = True
+            self.confirmed_at.extend([timestamp] * len(newly))
+            while self.confirmed_at and self.confirmed_at[0] < timestamp - self.flow_window:
+                self.confirmed_at.popleft()
+
+            # Velocidad media del frame entre los tracks confirmados con medición
+            speeds = self.speeds[rows[confirmed]]
+            speeds = speeds[~np.isnan(speeds)]
+            self.moving = len(speeds)
+            if len(speeds):
+                self.speed_stats.push(float(speeds.mean()) * 3.6)
+
+    def flow_per_hour(self):
+        if self.started_at is None:
+            return 0.0
+        # Mientras no se completó la ventana se usa el tiempo transcurrido
+        elapsed = min(max(self.last_time - self.started_at, 1.0), self.flow_window)
+        return len(self.confirmed_at) * 3600.0 / elapsed
+
+    def get_data(self):
+        with self.lock:
+            return {
+                'calibrated': self.calibrated,
+                'speed_kmh': self.speed_stats.to_dict() if self.calibrated else None,
+                'tracked_with_speed': self.moving,
+                'flow_per_hour': round(self.flow_per_hour(), 1),
+                'flow_window_seconds': self.flow_window
+            }
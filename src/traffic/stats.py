@@ -0,0 +1,146 @@
+import threading
+import numpy as np
+
+
+class RollingStats:
+    """Estadísticas móviles sobre los últimos `window` valores, con actualización O(1).
+
+    Usa un ring buffer de numpy con suma corrida para la media, una EWMA y un
+    histograma de bins fijos (se suma el valor nuevo y se resta el que sale de
+    la ventana) para aproximar percentiles sin ordenar la ventana.
+    """
+
+    def __init__(self, window=60, alpha=0.1, bins=64, max_value=100.0):
+        self.window = window
+        self.alpha = alpha
+        self.bins = bins
+        self.max_value = float(max_value)
+        self.reset()
+
+    def reset(self):
+        self.values = np.zeros(self.window, dtype=np.float64)
+        self.histogram = np.zeros(self.bins, dtype=np.int64)
+        self.index = 0
+        self.count = 0
+        self.sum = 0.0
+        self.last = 0.0
+        self.ewma = None
+
+    def bin_of(self, value):
+        # El último bin acumula todo lo que supera max_value
+        return min(int(max(value, 0.0) / self.max_value * self.bins), self.bins - 1)
+
+    def push(self, value):
+        value = float(value)
+        if self.count == self.window:
+            old = self.values[self.index]
+            self.sum -= old
+            self.histogram[self.bin_of(old)] -= 1
+        else:
+            self.count += 1
+
+        self.values[self.index] = value
+        self.sum += value
+        self.histogram[self.bin_of(value)] += 1
+        self.index = (self.index + 1) % self.window
+        if self.index == 0:
+            # Recalcular la suma una vez por vuelta para no acumular error de redondeo
+            self.sum = float(self.values[:self.count].sum())
+
+        self.last = value
+        self.ewma = value if self.ewma is None else self.alpha * value + (1 - self.alpha) * self.ewma
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Percentil aproximado (0-100) interpolando dentro del bin del histograma"""
+        if not self.count:
+            return 0.0
+        target = q / 100.0 * self.count
+        cumulative = np.cumsum(self.histogram)
+        bin_index = int(np.searchsorted(cumulative, target, side='left'))
+        bin_index = min(bin_index, self.bins - 1)
+        previous = cumulative[bin_index - 1] if bin_index > 0 else 0
+        in_bin = self.histogram[bin_index]
+        fraction = (target - previous) / in_bin if in_bin else 0.0
+        bin_width = self.max_value / self.bins
+        return (bin_index + fraction) * bin_width
+
+    def value(self, estimator='ewma'):
+        """Valor suavizado según el estimador configurado: 'ewma', 'mean', 'p50', 'p90'..."""
+        if estimator == 'ewma':
+            return self.ewma if self.ewma is not None else 0.0
+        if estimator == 'mean':
+            return self.mean
+        if estimator.startswith('p'):
+            return self.percentile(float(estimator[1:]))
+        return self.last
+
+    def to_dict(self):
+        return {
+            'last': round(self.last, 2),
+            'mean': round(self.mean, 2),
+            'ewma': round(self.ewma or 0.0, 2),
+            'p50': round(float(self.percentile(50)), 2),
+            'p90': round(float(self.percentile(90)), 2),
+            'samples': self.count
+        }
+
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets fijos (en ms) y conteo de violaciones del SLO"""
+
+    def __init__(self, buckets_ms, slo_ms=None):
+        self.bounds = np.asarray(sorted(buckets_ms), dtype=np.float64)
+        self.slo_ms = slo_ms
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # Un bucket extra para lo que supera el último límite
+            self.counts = np.zeros(len(self.bounds) + 1, dtype=np.int64)
+            self.count = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+            self.last_ms = None
+            self.breaches = 0
+
+    def observe(self, seconds):
+        """Registrar una latencia. Devuelve True si supera el SLO"""
+        value_ms = seconds * 1000
+        with self.lock:
+            self.counts[np.searchsorted(self.bounds, value_ms, side='left')] += 1
+            self.count += 1
+            self.total_ms += value_ms
+            self.max_ms = max(self.max_ms, value_ms)
+            self.last_ms = value_ms
+            breached = self.slo_ms is not None and value_ms > self.slo_ms
+            if breached:
+                self.breaches += 1
+            return breached
+
+    def percentile(self, q):
+        """Límite superior del bucket que contiene el percentil q (0-100)"""
+        if not self.count:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * self.count, side='left'))
+        return float(self.bounds[index]) if index < len(self.bounds) else self.max_ms
+
+    def to_dict(self):
+        with self.lock:
+            buckets = {f'<={bound:g}': int(count) for bound, count in zip(self.bounds, self.counts)}
+            buckets['+inf'] = int(self.counts[-1])
+            return {
+                'count': self.count,
+                'mean_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+                'p50_ms': round(self.percentile(50), 2),
+                'p95_ms': round(self.percentile(95), 2),
+                'max_ms': round(self.max_ms, 2),
+                'last_ms': round(self.last_ms, 2) if self.last_ms is not None else None,
+                'slo_ms': self.slo_ms,
+                'slo_breaches': self.breaches,
+                'buckets': buckets
+            }
@@ -0,0 +1,181 @@
+import asyncio
+import cv2
+import threading
+from src.traffic.encoders import get_encoder
+
+
+class AsyncWaiters:
+    """Futuros de asyncio esperando un evento publicado desde un hilo normal.
+
+    Se despierta a todos los clientes de un event loop con una sola llamada
+    thread-safe por loop, no una por cliente.
+    """
+
+    def __init__(self):
+        self.waiters = {}
+
+    def add(self, loop):
+        future = loop.create_future()
+        self.waiters.setdefault(loop, []).append(future)
+        return future
+
+    def remove(self, loop, future):
+        """Quitar un futuro que ya no se espera (timeout o cliente desconectado)"""
+        futures = self.waiters.get(loop)
+        if futures is None:
+            return
+        try:
+            futures.remove(future)
+        except ValueError:
+            # wake_all ya se lo llevó
+            return
+        if not futures:
+            del self.waiters[loop]
+
+    def wake_all(self):
+        waiters, self.waiters = self.waiters, {}
+        for loop, futures in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_resolve_futures, futures)
+            except RuntimeError:
+                # El event loop ya se cerró
+                pass
+
+
+def _resolve_futures(futures):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
+
+
+async def wait_for_update(condition, waiters, is_ready, timeout):
+    """Versión asíncrona de Condition.wait_for: espera sin ocupar un hilo"""
+    loop = asyncio.get_running_loop()
+    with condition:
+        if is_ready():
+            return True
+        future = waiters.add(loop)
+    try:
+        await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        # Sin publicaciones (cámara trabada, procesamiento detenido) el futuro
+        # quedaría registrado hasta el próximo wake_all: uno por cliente por segundo
+        with condition:
+            waiters.remove(loop, future)
+    with condition:
+        return is_ready()
+
+
+def mjpeg_part(jpeg):
+    """Armar una parte multipart/x-mixed-replace a partir de un JPEG (bytes o buffer)"""
+    return b''.join((b'--frame\r\nContent-Type: image/jpeg\r\n\r\n', jpeg, b'\r\n'))
+
+
+class FrameChannel:
+    """Último frame codificado de una variante de stream, compartido por todos sus clientes"""
+
+    def __init__(self, name, width=None, quality=85, encoder=None):
+        self.name = name
+        self.width = width
+        self.quality = quality
+        self.encoder = encoder or get_encoder()
+
+        # Buffer de salida de cv2.resize reutilizado entre frames (uno por hilo,
+        # porque el stream sin procesamiento codifica desde los hilos de preview)
+        self.buffers = threading.local()
+
+        self.condition = threading.Condition()
+        self.async_waiters = AsyncWaiters()
+        self.frame = None
+        self.seq = 0
+        self.subscribers = 0
+        self.encoded_frames = 0
+
+    def subscribe(self):
+        """Registrar un cliente; el primero descarta el frame viejo que quedó publicado"""
+        with self.condition:
+            self.subscribers += 1
+            if self.subscribers == 1:
+                self.frame = None
+
+    def unsubscribe(self):
+        """Eliminar un cliente desconectado"""
+        with self.condition:
+            self.subscribers = max(0, self.subscribers - 1)
+
+    def has_subscribers(self):
+        return self.subscribers > 0
+
+    def publish(self, jpeg):
+        """Publicar un nuevo frame y despertar a todos los clientes que esperan"""
+        # La parte MJPEG se arma una sola vez y la comparten todos los clientes
+        self.publish_part(mjpeg_part(jpeg))
+
+    def publish_part(self, part):
+        """Publicar una parte MJPEG ya armada (p. ej. recibida del servicio de detección)"""
+        with self.condition:
+            self.frame = part
+            self.seq += 1
+            self.encoded_frames += 1
+            self.condition.notify_all()
+            self.async_waiters.wake_all()
+
+    def wait(self, last_seq, timeout=1.0):
+        """Esperar una parte MJPEG más nueva que last_seq. Devuelve (seq, parte) o (last_seq, None)"""
+        with self.condition:
+            ready = self.condition.wait_for(
+                lambda: self.frame is not None and self.seq != last_seq, timeout
+            )
+            if not ready:
+                return last_seq, None
+            return self.seq, self.frame
+
+    async def wait_async(self, last_seq, timeout=1.0):
+        """Igual que wait() pero para el servidor asíncrono"""
+        ready = await wait_for_update(self.condition, self.async_waiters,
+                                      lambda: self.frame is not None and self.seq != last_seq, timeout)
+        if not ready:
+            return last_seq, None
+        return self.seq, self.frame
+
+    def clear(self):
+        with self.condition:
+            self.frame = None
+
+    def prepare(self, frame):
+        """Redimensionar el frame al ancho de la variante (sin agrandar)"""
+        height, width = frame.shape[:2]
+        if not self.width or self.width >= width:
+            return frame
+        new_height = int(round(height * self.width / width))
+
+        buffer = getattr(self.buffers, 'resize', None)
+        if buffer is None or buffer.shape[:2] != (new_height, self.width) or buffer.dtype != frame.dtype:
+            buffer = None
+        buffer = cv2.resize(frame, (self.width, new_height), dst=buffer, interpolation=cv2.INTER_AREA)
+        self.buffers.resize = buffer
+        return buffer
+
+    def encode(self, frame):
+        """Redimensionar y codificar el frame a JPEG con la calidad de la variante"""
+        return self.encoder.encode(self.prepare(frame), self.quality)
+
+    def get_stats(self):
+        return {
+            'subscribers': self.subscribers,
+            'width': self.width,
+            'quality': self.quality,
+            'encoder': self.encoder.name,
+            'encoded_frames': self.encoded_frames
+        }
+
+
+def create_channels(variants, encoder=None):
+    """Crear un canal por cada variante configurada"""
+    return {
+        name: FrameChannel(name, width=options.get('width'), quality=options.get('quality', 85),
+                           encoder=encoder)
+        for name, options in variants.items()
+    }
@@ -0,0 +1,195 @@
+import threading
+import time
+
+
+class WorkerSupervisor:
+    """Vigila los hilos de las cámaras y los reinicia si mueren o se cuelgan.
+
+    Cada worker recibe un número de generación al arrancar y lo consulta en
+    cada vuelta (`is_current`): al reiniciar una cámara la generación avanza,
+    así un hilo colgado que se despierte tarde termina solo en lugar de
+    procesar en paralelo con su reemplazo (en Python no se puede matar un hilo).
+
+    Un worker está:
+    - 'stalled' si no da señales de vida (`beat`) en `stall_timeout` segundos,
+      p. ej. bloqueado en un decodificador o en la inferencia,
+    - 'no_frames' si sigue vivo pero no recibe frames en `frame_timeout` segundos,
+    - 'dead' si el hilo terminó (una excepción no controlada).
+    En los tres casos se reinicia con espera exponencial entre `backoff_min` y
+    `backoff_max`, que vuelve al mínimo tras `healthy_after` segundos sanos.
+
+    `on_restart(camera_id, problem, *args)` se llama desde el hilo nuevo antes
+    de `target` en cada reinicio, para liberar lo que el worker colgado todavía
+    retiene (su fuente de video, su turno de inferencia).
+    """
+
+    def __init__(self, target, stall_timeout=15.0, frame_timeout=30.0, backoff_min=1.0, backoff_max=60.0,
+                 healthy_after=60.0, check_interval=1.0, on_restart=None):
+        self.target = target
+        self.on_restart = on_restart
+        self.stall_timeout = stall_timeout
+        self.frame_timeout = frame_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.healthy_after = healthy_after
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.running = False
+        self.monitor = None
+
+    def new_worker(self, args):
+        return {
+            'args': args, 'generation': 0, 'thread': None, 'status': 'stopped',
+            'started_at': None, 'heartbeat': None, 'last_frame_at': None,
+            'frames': 0, 'dropped': 0, 'restarts': 0, 'last_error': None,
+            'backoff': self.backoff_min, 'next_restart_at': None,
+            'window_started': None, 'window_frames': 0, 'fps': 0.0
+        }
+
+    def start(self, workers):
+        """Arrancar un worker por cámara. `workers` es {camera_id: args adicionales}"""
+        with self.lock:
+            self.running = True
+            previous = self.workers
+            self.workers = {}
+            for camera_id, args in workers.items():
+                self.workers[camera_id] = self.new_worker(args)
+                # La generación nunca vuelve atrás: un hilo colgado de una ejecución
+                # anterior no puede pasar por el worker vigente
+                if camera_id in previous:
+                    self.workers[camera_id]['generation'] = previous[camera_id]['generation']
+                self.spawn(camera_id)
+        self.monitor = threading.Thread(target=self.monitor_loop, name='worker-supervisor', daemon=True)
+        self.monitor.start()
+
+    def spawn(self, camera_id, problem=None):
+        worker = self.workers[camera_id]
+        worker['generation'] += 1
+        now = time.monotonic()
+        worker.update(status='starting', started_at=now, heartbeat=now, last_frame_at=None,
+                      next_restart_at=None, window_started=now, window_frames=0)
+        thread = threading.Thread(target=self.run_worker, args=(camera_id, worker['generation'], worker['args'], problem),
+                                  name=f"camera-{camera_id}-g{worker['generation']}", daemon=True)
+        worker['thread'] = thread
+        thread.start()
+
+    def run_worker(self, camera_id, generation, args, problem=None):
+        try:
+            if problem is not None and self.on_restart is not None:
+                self.on_restart(camera_id, problem, *args)
+            self.target(camera_id, generation, *args)
+        except Exception as e:
+            print(f"❌ Worker de la cámara {camera_id} terminó con error: {e!r}")
+            with self.lock:
+                worker = self.workers.get(camera_id)
+                if worker is not None and worker['generation'] == generation:
+                    worker['last_error'] = repr(e)
+
+    def is_current(self, camera_id, generation):
+        """Si el worker sigue siendo el vigente (False = debe terminar)"""
+        worker = self.workers.get(camera_id)
+        return self.running and worker is not None and worker['generation'] == generation
+
+    def beat(self, camera_id, generation, frame=False, dropped=0):
+        """Señal de vida del worker; `frame` indica que procesó un frame"""
+        now = time.monotonic()
+        with self.lock:
+            worker = self.workers.get(camera_id)
+            if worker is None or worker['generation'] != generation:
+                return
+            worker['heartbeat'] = now
+            if frame:
+                worker['last_frame_at'] = now
+                worker['frames'] += 1
+                worker['window_frames'] += 1
+                worker['status'] = 'running'
+            worker['dropped'] += dropped
+            # FPS en ventanas de ~5 segundos
+            elapsed = now - worker['window_started']
+            if elapsed >= 5.0:
+                worker['fps'] = worker['window_frames'] / elapsed
+                worker['window_started'], worker['window_frames'] = now, 0
+
+    def monitor_loop(self):
+        while self.running:
+            time.sleep(self.check_interval)
+            self.check()
+
+    def check(self):
+        now = time.monotonic()
+        with self.lock:
+            if not self.running:
+                return
+            for camera_id, worker in self.workers.items():
+                problem = self.diagnose(worker, now)
+                if problem is None:
+                    if worker['next_restart_at'] is not None:
+                        # Se recuperó solo antes del reinicio
+                        worker['next_restart_at'] = None
+                        worker['status'] = 'running' if worker['last_frame_at'] else 'starting'
+                    # Tras un rato sano la espera entre reinicios vuelve al mínimo
+                    if now - worker['started_at'] >= self.healthy_after:
+                        worker['backoff'] = self.backoff_min
+                    continue
+                if worker['next_restart_at'] is None:
+                    worker['status'] = problem
+                    worker['next_restart_at'] = now + worker['backoff']
+                    print(f"⚠️ Cámara {camera_id}: worker {problem}, reinicio en {worker['backoff']:.1f}s")
+                elif now >= worker['next_restart_at']:
+                    worker['restarts'] += 1
+                    worker['backoff'] = min(worker['backoff'] * 2, self.backoff_max)
+                    print(f"🔁 Reiniciando el worker de la cámara {camera_id} ({problem})")
+                    self.spawn(camera_id, problem)
+
+    def diagnose(self, worker, now):
+        if worker['thread'] is None or not worker['thread'].is_alive():
+            return 'dead'
+        if now - worker['heartbeat'] > self.stall_timeout:
+            return 'stalled'
+        last_frame = worker['last_frame_at'] or worker['started_at']
+        if now - last_frame > self.frame_timeout:
+            return 'no_frames'
+        return None
+
+    def stop(self, timeout=10.0):
+        """Detener todos los workers esperando como máximo `timeout` segundos en total.
+
+        Devuelve los nombres de los hilos que no terminaron a tiempo (quedan
+        como daemon y terminan solos al ver que ya no son la generación vigente).
+        """
+        with self.lock:
+            self.running = False
+            threads = [worker['thread'] for worker in self.workers.values() if worker['thread'] is not None]
+            for worker in self.workers.values():
+                worker['status'] = 'stopped'
+        if self.monitor is not None:
+            self.monitor.join(self.check_interval * 2)
+            self.monitor = None
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return [thread.name for thread in threads if thread.is_alive()]
+
+    def get_health(self):
+        now = time.monotonic()
+        with self.lock:
+            cameras = {}
+            for camera_id, worker in self.workers.items():
+                last_frame = worker['last_frame_at']
+                cameras[f'camera_{camera_id}'] = {
+                    'status': worker['status'],
+                    'generation': worker['generation'],
+                    'alive': worker['thread'] is not None and worker['thread'].is_alive(),
+                    'heartbeat_age': round(now - worker['heartbeat'], 2) if worker['heartbeat'] else None,
+                    'last_frame_age': round(now - last_frame, 2) if last_frame else None,
+                    'frames': worker['frames'],
+                    'dropped': worker['dropped'],
+                    'drop_rate': round(worker['dropped'] / (worker['frames'] + worker['dropped']), 3)
+                    if worker['frames'] + worker['dropped'] else 0.0,
+                    'fps': round(worker['fps'], 2),
+                    'restarts': worker['restarts'],
+                    'last_error': worker['last_error']
+                }
+            healthy = bool(cameras) and all(camera['status'] == 'running' for camera in cameras.values())
+            return {'running': self.running, 'healthy': healthy, 'cameras': cameras}
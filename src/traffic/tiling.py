@@ -0,0 +1,89 @@
+"""Inferencia por mosaicos (tiles) para vehículos pequeños o lejanos.
+
+El frame (o una región de interés) se divide en tiles superpuestos del tamaño
+de entrada del modelo, que se infieren en un solo lote junto con el frame
+completo (para los vehículos grandes que ocupan varios tiles). Las detecciones
+se llevan a coordenadas del frame y se fusionan con un NMS vectorizado.
+"""
+import numpy as np
+from src.traffic.detections import DetectionBatch
+
+
+def tile_grid(frame_shape, tile_size, overlap=0.2, roi=None):
+    """Tiles (x1, y1, x2, y2) superpuestos que cubren el frame o la ROI normalizada (x1, y1, x2, y2)"""
+    height, width = frame_shape[:2]
+    if roi is not None:
+        left, top = int(roi[0] * width), int(roi[1] * height)
+        right, bottom = int(roi[2] * width), int(roi[3] * height)
+    else:
+        left, top, right, bottom = 0, 0, width, height
+
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(begin, end):
+        if end - begin <= tile_size:
+            return [begin]
+        # Mínima cantidad de tiles con al menos el solapamiento pedido, repartidos
+        # de forma pareja y con el último alineado al borde
+        count = int(np.ceil((end - begin - tile_size) / step)) + 1
+        return np.linspace(begin, end - tile_size, count).round().astype(int).tolist()
+
+    return np.array([
+        (x, y, min(x + tile_size, right), min(y + tile_size, bottom))
+        for y in starts(top, bottom) for x in starts(left, right)
+    ], dtype=np.int64)
+
+
+def overlap_matrix(boxes, metric='ios'):
+    """Superposición entre todas las cajas: IoU o intersección sobre la menor (IoS)"""
+    top_left = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    bottom_right = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    if metric == 'iou':
+        denominator = area[:, None] + area[None, :] - intersection
+    else:
+        # Una caja cortada por el borde de un tile queda contenida en la completa
+        denominator = np.minimum(area[:, None], area[None, :])
+    return intersection / np.maximum(denominator, 1e-6)
+
+
+def nms(boxes, scores, class_ids, threshold=0.5, metric='ios'):
+    """NMS vectorizado por clase (variante "Fast NMS"). Devuelve los índices conservados.
+
+    Las cajas se ordenan por confianza y cada una se descarta si se superpone
+    más que `threshold` con alguna de mayor confianza de la misma clase, todo
+    con una sola matriz de superposición.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    order = np.argsort(-scores, kind='stable')
+    overlap = overlap_matrix(boxes[order], metric)
+    same_class = class_ids[order][:, None] == class_ids[order][None, :]
+    # Solo cuentan las cajas anteriores (más confiables) de la misma clase
+    overlap = np.triu(np.where(same_class, overlap, 0), k=1)
+    keep = overlap.max(axis=0) <= threshold
+    return order[keep]
+
+
+def infer_tiled(model, frame, class_index, tile_size=640, overlap=0.2, roi=None, full_frame=True,
+                conf=0.25, imgsz=640, merge_threshold=0.5, timestamp=None):
+    """Detectar en tiles (más el frame completo) en un solo lote y fusionar las detecciones"""
+    grid = tile_grid(frame.shape, tile_size, overlap, roi)
+    images = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in grid]
+    offsets = [(x1, y1) for x1, y1, _, _ in grid]
+    if full_frame and len(grid) > 1:
+        images.append(frame)
+        offsets.append((0, 0))
+
+    results = model(images, conf=conf, imgsz=imgsz, verbose=False)
+    batches = [DetectionBatch.from_result(result, class_index, frame.shape) for result in results]
+    del results
+
+    boxes = np.concatenate([batch.boxes + np.tile(offset, 2).astype(np.float32)
+                            for batch, offset in zip(batches, offsets)])
+    confidences = np.concatenate([batch.confidences for batch in batches])
+    class_ids = np.concatenate([batch.class_ids for batch in batches])
+
+    keep = nms(boxes, confidences, class_ids, merge_threshold)
+    return DetectionBatch(boxes[keep], confidences[keep], class_ids[keep], frame.shape, timestamp)
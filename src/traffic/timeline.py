@@ -0,0 +1,81 @@
+import threading
+import numpy as np
+
+
+class CameraTimeline:
+    """Últimos valores de una cámara indexados por el instante de captura del frame.
+
+    Ring buffer de numpy con un arreglo de tiempos y una fila de valores por
+    frame (`fields`). Permite consultar el estado de la cámara en un instante
+    T, tomando la muestra más cercana o interpolando entre las dos que lo
+    rodean, para combinar cámaras que procesan a ritmos distintos.
+    """
+
+    def __init__(self, fields, size=256):
+        self.fields = list(fields)
+        self.size = size
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.times = np.full(self.size, np.nan)
+            self.values = np.zeros((self.size, len(self.fields)))
+            self.index = 0
+            self.count = 0
+
+    def push(self, timestamp, values):
+        with self.lock:
+            self.times[self.index] = timestamp
+            self.values[self.index] = values
+            self.index = (self.index + 1) % self.size
+            self.count = min(self.count + 1, self.size)
+
+    @property
+    def latest(self):
+        with self.lock:
+            return float(self.times[self.index - 1]) if self.count else None
+
+    def ordered(self):
+        """Tiempos y valores en orden cronológico (copias)"""
+        if self.count < self.size:
+            return self.times[:self.count].copy(), self.values[:self.count].copy()
+        order = np.roll(np.arange(self.size), -self.index)
+        return self.times[order], self.values[order]
+
+    def at(self, timestamp, mode='interpolate'):
+        """Valores en `timestamp` y antigüedad (s) de la información usada, o None sin muestras.
+
+        Después de la última muestra no se extrapola: se devuelve la última y
+        la antigüedad indica cuánto atrasada está la cámara respecto a T.
+        """
+        with self.lock:
+            if not self.count:
+                return None
+            times, values = self.ordered()
+
+        position = int(np.searchsorted(times, timestamp, side='right'))
+        if position == len(times):
+            return dict(zip(self.fields, values[-1].tolist())), float(timestamp - times[-1])
+        if position == 0:
+            # T anterior a lo que guarda el buffer: la muestra más vieja
+            return dict(zip(self.fields, values[0].tolist())), float(times[0] - timestamp)
+
+        before, after = position - 1, position
+        if mode == 'nearest':
+            nearest = before if timestamp - times[before] <= times[after] - timestamp else after
+            return dict(zip(self.fields, values[nearest].tolist())), float(abs(timestamp - times[nearest]))
+        fraction = (timestamp - times[before]) / max(times[after] - times[before], 1e-9)
+        interpolated = values[before] + fraction * (values[after] - values[before])
+        return dict(zip(self.fields, interpolated.tolist())), 0.0
+
+
+def staleness_weight(age, stale_after, dead_after):
+    """Peso de una cámara según la antigüedad de su dato: 1 hasta `stale_after`, 0 desde `dead_after`"""
+    if age is None:
+        return 0.0
+    if age <= stale_after:
+        return 1.0
+    if age >= dead_after:
+        return 0.0
+    return 1.0 - (age - stale_after) / (dead_after - stale_after)
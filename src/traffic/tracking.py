@@ -0,0 +1,257 @@
+import threading
+import time
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU entre todas las cajas xyxy de a (N, 4) y b (M, 4) -> (N, M)"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-6)
+
+
+def greedy_match(iou, threshold):
+    """Asignación greedy por IoU descendente. Devuelve (filas, columnas) emparejadas"""
+    rows, cols = np.nonzero(iou >= threshold)
+    if len(rows) == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    order = np.argsort(-iou[rows, cols], kind='stable')
+    used_rows, used_cols = set(), set()
+    matched_rows, matched_cols = [], []
+    for row, col in zip(rows[order], cols[order]):
+        if row in used_rows or col in used_cols:
+            continue
+        used_rows.add(row)
+        used_cols.add(col)
+        matched_rows.append(row)
+        matched_cols.append(col)
+    return np.array(matched_rows, dtype=int), np.array(matched_cols, dtype=int)
+
+
+def box_anchors(boxes):
+    """Punto de apoyo de cada vehículo: centro del borde inferior de la caja"""
+    return np.stack(((boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]), axis=1)
+
+
+class VehicleTracker:
+    """Tracker multi-objeto estilo ByteTrack sobre arreglos de numpy.
+
+    Primero se asocian las detecciones de confianza alta con los tracks
+    existentes y luego las de confianza baja con los tracks que quedaron sin
+    pareja, lo que mantiene los IDs cuando un vehículo se ve parcialmente.
+    Solo se guardan los tracks activos, en arreglos paralelos (struct of arrays).
+    """
+
+    def __init__(self, high_thresh=0.5, low_thresh=0.1, new_track_thresh=0.6,
+                 match_iou=0.3, low_match_iou=0.5, max_lost=30, min_hits=3):
+        self.high_thresh = high_thresh
+        self.low_thresh = low_thresh
+        self.new_track_thresh = new_track_thresh
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.max_lost = max_lost
+        self.min_hits = min_hits
+        self.next_id = 1
+        self.reset()
+
+    def reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4), dtype=np.float32)
+        self.velocities = np.empty((0, 4), dtype=np.float32)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.scores = np.empty(0, dtype=np.float32)
+        self.hits = np.empty(0, dtype=np.int64)
+        self.lost = np.empty(0, dtype=np.int64)
+        self.prev_anchors = np.empty((0, 2), dtype=np.float32)
+        # Bits de las líneas de conteo que ya cruzó cada track
+        self.line_mask = np.empty(0, dtype=np.int64)
+        # Indica si el track ya se contó como vehículo único
+        self.counted = np.empty(0, dtype=bool)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def update(self, boxes, scores, class_ids):
+        """Actualizar con las detecciones de un frame.
+
+        Devuelve los índices (en los arreglos del tracker) de los tracks que
+        fueron vistos en este frame.
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float32)
+        class_ids = np.asarray(class_ids, dtype=np.int64)
+
+        # Posición previa del punto de apoyo (para detectar cruces de líneas)
+        self.prev_anchors = box_anchors(self.boxes) if len(self.boxes) else np.empty((0, 2), dtype=np.float32)
+
+        # Predicción con velocidad constante
+        predicted = self.boxes + self.velocities
+
+        high = scores >= self.high_thresh
+        low = (scores >= self.low_thresh) & ~high
+        high_idx = np.nonzero(high)[0]
+        low_idx = np.nonzero(low)[0]
+
+        track_matched = np.zeros(len(self.ids), dtype=bool)
+        det_to_track = {}
+
+        # 1) Detecciones de confianza alta contra todos los tracks
+        rows, cols = greedy_match(iou_matrix(predicted, boxes[high_idx]), self.match_iou)
+        for row, col in zip(rows, cols):
+            det_to_track[high_idx[col]] = row
+            track_matched[row] = True
+
+        # 2) Detecciones de confianza baja contra los tracks que quedaron libres
+        free_tracks = np.nonzero(~track_matched)[0]
+        rows, cols = greedy_match(iou_matrix(predicted[free_tracks], boxes[low_idx]), self.low_match_iou)
+        for row, col in zip(rows, cols):
+            det_to_track[low_idx[col]] = free_tracks[row]
+            track_matched[free_tracks[row]] = True
+
+        # Actualizar los tracks emparejados
+        if det_to_track:
+            det_indices = np.fromiter(det_to_track.keys(), dtype=np.int64)
+            track_indices = np.fromiter(det_to_track.values(), dtype=np.int64)
+            new_boxes = boxes[det_indices]
+            self.velocities[track_indices] = 0.5 * self.velocities[track_indices] + \
+                0.5 * (new_boxes - self.boxes[track_indices])
+            self.boxes[track_indices] = new_boxes
+            self.hits[track_indices] += 1
+            self.lost[track_indices] = 0
+            # La clase se toma de la detección más confiable vista hasta ahora
+            better = scores[det_indices] >= self.scores[track_indices]
+            self.class_ids[track_indices[better]] = class_ids[det_indices[better]]
+            self.scores[track_indices[better]] = scores[det_indices[better]]
+
+        # Tracks sin detección: avanzar con la predicción y envejecer
+        unmatched = ~track_matched
+        self.boxes[unmatched] = predicted[unmatched]
+        self.lost[unmatched] += 1
+
+        # Eliminar los tracks perdidos demasiado tiempo
+        keep = self.lost <= self.max_lost
+        if not keep.all():
+            self.drop(keep)
+            track_matched = track_matched[keep]
+
+        # Nuevos tracks con las detecciones altas que no se emparejaron
+        new_dets = np.array([i for i in high_idx if i not in det_to_track and scores[i] >= self.new_track_thresh],
+                            dtype=np.int64)
+        if len(new_dets):
+            self.add(boxes[new_dets], scores[new_dets], class_ids[new_dets])
+            track_matched = np.concatenate((track_matched, np.ones(len(new_dets), dtype=bool)))
+
+        return np.nonzero(track_matched)[0]
+
+    def drop(self, keep):
+        for name in ('ids', 'boxes', 'velocities', 'class_ids', 'scores', 'hits', 'lost',
+                     'prev_anchors', 'line_mask', 'counted'):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def add(self, boxes, scores, class_ids):
+        count = len(boxes)
+        self.ids = np.concatenate((self.ids, np.arange(self.next_id, self.next_id + count)))
+        self.next_id += count
+        self.boxes = np.concatenate((self.boxes, boxes))
+        self.velocities = np.concatenate((self.velocities, np.zeros((count, 4), dtype=np.float32)))
+        self.class_ids = np.concatenate((self.class_ids, class_ids))
+        self.scores = np.concatenate((self.scores, scores))
+        self.hits = np.concatenate((self.hits, np.ones(count, dtype=np.int64)))
+        self.lost = np.concatenate((self.lost, np.zeros(count, dtype=np.int64)))
+        # Un track nuevo no tiene posición previa: no puede cruzar una línea en su primer frame
+        self.prev_anchors = np.concatenate((self.prev_anchors, box_anchors(boxes)))
+        self.line_mask = np.concatenate((self.line_mask, np.zeros(count, dtype=np.int64)))
+        self.counted = np.concatenate((self.counted, np.zeros(count, dtype=bool)))
+
+
+class TrafficCounter:
+    """Conteo acumulado de vehículos únicos por clase y de cruces de líneas por dirección.
+
+    Las líneas se definen en coordenadas normalizadas (0-1). Un vehículo cruza
+    en dirección 'in' cuando pasa del lado izquierdo al derecho de la línea
+    recorrida de start a end (p. ej. de arriba hacia abajo en una línea
+    horizontal trazada de izquierda a derecha), y 'out' en sentido contrario.
+    """
+
+    def __init__(self, class_names, lines=None, min_hits=3):
+        self.class_names = list(class_names)
+        self.lines = list(lines or [])[:63]
+        self.min_hits = min_hits
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started_at = time.time()
+            self.unique = np.zeros(len(self.class_names), dtype=np.int64)
+            # Conteo por línea: (clases, 2) con columnas in / out
+            self.crossings = np.zeros((len(self.lines), len(self.class_names), 2), dtype=np.int64)
+
+    def update(self, tracker, seen, frame_shape):
+        """Contar vehículos nuevos y cruces de líneas de los tracks vistos en este frame"""
+        if len(seen) == 0:
+            return
+        height, width = frame_shape[:2]
+        with self.lock:
+            # Vehículos únicos: cada track se cuenta una sola vez cuando se confirma
+            confirmed = seen[(tracker.hits[seen] >= self.min_hits) & ~tracker.counted[seen]]
+            if len(confirmed):
+                np.add.at(self.unique, tracker.class_ids[confirmed], 1)
+                tracker.counted[confirmed] = True
+
+            previous = tracker.prev_anchors[seen]
+            current = box_anchors(tracker.boxes[seen])
+            for line_index, line in enumerate(self.lines):
+                start = np.array(line['start'], dtype=np.float32) * (width, height)
+                end = np.array(line['end'], dtype=np.float32) * (width, height)
+                side_before = cross_sign(start, end, previous)
+                side_after = cross_sign(start, end, current)
+                # El segmento recorrido debe cortar la línea, no solo su prolongación
+                crossing = (side_before * side_after < 0) & segments_intersect(previous, current, start, end)
+                bit = np.int64(1) << line_index
+                crossing &= (tracker.line_mask[seen] & bit) == 0
+                if not crossing.any():
+                    continue
+                crossed = seen[crossing]
+                tracker.line_mask[crossed] |= bit
+                directions = (side_after[crossing] < 0).astype(np.int64)  # 0 = in, 1 = out
+                np.add.at(self.crossings[line_index], (tracker.class_ids[crossed], directions), 1)
+
+    def get_data(self):
+        with self.lock:
+            hours = max(time.time() - self.started_at, 1.0) / 3600
+            unique = {name: int(self.unique[i]) for i, name in enumerate(self.class_names)}
+            lines = {}
+            for line_index, line in enumerate(self.lines):
+                counts = self.crossings[line_index]
+                lines[line['name']] = {
+                    name: {'in': int(counts[i, 0]), 'out': int(counts[i, 1])}
+                    for i, name in enumerate(self.class_names)
+                }
+                lines[line['name']]['total'] = {'in': int(counts[:, 0].sum()), 'out': int(counts[:, 1].sum())}
+            return {
+                'unique': unique,
+                'unique_total': int(self.unique.sum()),
+                'vehicles_per_hour': round(float(self.unique.sum()) / hours, 1),
+                'lines': lines,
+                'since': self.started_at
+            }
+
+
+def cross_sign(start, end, points):
+    """Lado de la línea start->end en el que está cada punto (+1 / -1, sobre la línea cuenta como +1)"""
+    direction = end - start
+    relative = points - start
+    return np.where(direction[0] * relative[:, 1] - direction[1] * relative[:, 0] >= 0, 1, -1)
+
+
+def segments_intersect(p1, p2, start, end):
+    """Si los segmentos p1->p2 (N puntos) cortan el segmento start->end"""
+    side_start = np.sign((p2[:, 0] - p1[:, 0]) * (start[1] - p1[:, 1]) - (p2[:, 1] - p1[:, 1]) * (start[0] - p1[:, 0]))
+    side_end = np.sign((p2[:, 0] - p1[:, 0]) * (end[1] - p1[:, 1]) - (p2[:, 1] - p1[:, 1]) * (end[0] - p1[:, 0]))
+    return side_start * side_end <= 0
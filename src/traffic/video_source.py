@@ -0,0 +1,391 @@
+import cv2
+import threading
+import time
+from queue import Queue, Empty, Full
+from config import Config
+from src.traffic.streaming import AsyncWaiters, wait_for_update
+
+# PyAV es opcional: decodificación multihilo de FFmpeg
+try:
+    import av
+except ImportError:
+    av = None
+
+
+class OpenCVReader:
+    """Lector de frames con cv2.VideoCapture"""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"No se pudo abrir el video: {path}")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+
+    def read(self):
+        ret, frame = self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        self.cap.release()
+
+
+class PyAVReader:
+    """Lector de frames con PyAV usando la decodificación multihilo de FFmpeg"""
+
+    def __init__(self, path):
+        if av is None:
+            raise RuntimeError("PyAV no está instalado")
+        self.container = av.open(path)
+        stream = self.container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        self.fps = float(stream.average_rate or 0)
+        self.frames = self.container.decode(stream)
+
+    def read(self):
+        try:
+            return next(self.frames).to_ndarray(format='bgr24')
+        except (StopIteration, av.error.FFmpegError):
+            return None
+
+    def release(self):
+        self.container.close()
+
+
+READERS = {
+    'opencv': OpenCVReader,
+    'pyav': PyAVReader
+}
+
+
+class VideoSource:
+    """Decodifica un video en segundo plano y comparte cada frame con varios consumidores.
+
+    Un hilo decodifica por adelantado hacia un buffer pequeño y otro publica los
+    frames al ritmo del video. Al llegar al final se cambia a un lector que ya
+    se abrió en segundo plano, en lugar de hacer seek al frame 0.
+    """
+
+    def __init__(self, path, backend='opencv', prefetch=8, realtime=True, loop=True):
+        self.path = path
+        self.backend = backend if backend in READERS and (backend != 'pyav' or av is not None) else 'opencv'
+        self.realtime = realtime
+        self.loop = loop
+        self.fps = 0
+
+        self.prefetch_queue = Queue(maxsize=max(1, prefetch))
+        self.condition = threading.Condition()
+        self.async_waiters = AsyncWaiters()
+        self.frame = None
+        self.timestamp = None
+        self.seq = 0
+
+        self.running = False
+        self.consumers = 0
+        self.threads = []
+
+        self.next_reader = None
+        self.next_reader_ready = threading.Event()
+
+        self.stats = {'decoded': 0, 'published': 0, 'loops': 0, 'open_errors': 0}
+
+    def start(self):
+        self.running = True
+        for target, name in ((self.decode_loop, 'decode'), (self.publish_loop, 'publish')):
+            thread = threading.Thread(target=target, name=f'video-{name}-{self.path}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=2):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+            self.async_waiters.wake_all()
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+        self.threads = []
+
+    def open_reader(self):
+        try:
+            return READERS[self.backend](self.path)
+        except Exception as e:
+            self.stats['open_errors'] += 1
+            print(f"❌ Error abriendo {self.path}: {e}")
+            return None
+
+    def prepare_next_reader(self):
+        """Abrir en segundo plano el lector que se usará en la próxima vuelta"""
+        self.next_reader_ready.clear()
+
+        def open_next():
+            self.next_reader = self.open_reader()
+            self.next_reader_ready.set()
+
+        threading.Thread(target=open_next, name=f'video-reopen-{self.path}', daemon=True).start()
+
+    def take_next_reader(self):
+        while self.running and not self.next_reader_ready.wait(timeout=0.5):
+            pass
+        reader, self.next_reader = self.next_reader, None
+        return reader
+
+    def decode_loop(self):
+        reader = self.open_reader()
+        while self.running and reader is None:
+            time.sleep(1)
+            reader = self.open_reader()
+
+        if reader is not None:
+            self.fps = reader.fps
+            if self.loop:
+                self.prepare_next_reader()
+
+        while self.running and reader is not None:
+            frame = reader.read()
+            if frame is None:
+                reader.release()
+                if not self.loop:
+                    reader = None
+                    break
+                # Fin del archivo: tomar el lector que ya se abrió en segundo plano
+                reader = self.take_next_reader()
+                self.stats['loops'] += 1
+                if reader is None:
+                    time.sleep(1)
+                    reader = self.open_reader()
+                if reader is not None:
+                    self.prepare_next_reader()
+                continue
+
+            self.stats['decoded'] += 1
+            # Esperar lugar en el buffer sin bloquear la detención
+            while self.running:
+                try:
+                    self.prefetch_queue.put(frame, timeout=0.5)
+                    break
+                except Full:
+                    continue
+
+        if reader is not None:
+            reader.release()
+        if self.next_reader is not None:
+            self.next_reader.release()
+
+    def publish_loop(self):
+        next_time = time.monotonic()
+        while self.running:
+            try:
+                frame = self.prefetch_queue.get(timeout=0.5)
+            except Empty:
+                continue
+
+            if self.realtime:
+                # Publicar al ritmo del video; si hubo un atraso no se recupera en ráfaga
+                interval = 1.0 / self.fps if self.fps and self.fps > 0 else 1.0 / 25
+                now = time.monotonic()
+                if next_time > now:
+                    time.sleep(next_time - now)
+                next_time = max(next_time + interval, time.monotonic() - interval)
+
+            self.publish_frame(frame)
+
+    def publish_frame(self, frame):
+        """Reemplazar el frame actual y despertar a los consumidores"""
+        with self.condition:
+            self.frame = frame
+            self.timestamp = time.time()
+            self.seq += 1
+            self.stats['published'] += 1
+            self.condition.notify_all()
+            self.async_waiters.wake_all()
+
+    def read(self, last_seq=0, timeout=1.0):
+        """Esperar un frame más nuevo que last_seq.
+
+        Devuelve (seq, frame, timestamp). El frame es compartido entre los
+        consumidores y no se debe modificar en el lugar.
+        """
+        with self.condition:
+            ready = self.condition.wait_for(
+                lambda: not self.running or (self.frame is not None and self.seq != last_seq), timeout
+            )
+            if not ready or self.frame is None or self.seq == last_seq:
+                return last_seq, None, None
+            return self.seq, self.frame, self.timestamp
+
+    async def read_async(self, last_seq=0, timeout=1.0):
+        """Igual que read() pero para el servidor asíncrono"""
+        await wait_for_update(self.condition, self.async_waiters,
+                              lambda: not self.running or (self.frame is not None and self.seq != last_seq), timeout)
+        with self.condition:
+            if self.frame is None or self.seq == last_seq:
+                return last_seq, None, None
+            return self.seq, self.frame, self.timestamp
+
+    def get_stats(self):
+        return dict(self.stats, backend=self.backend, fps=self.fps, consumers=self.consumers,
+                    buffered=self.prefetch_queue.qsize())
+
+
+class LiveVideoSource(VideoSource):
+    """Fuente en vivo (RTSP/HTTP) con semántica de último frame.
+
+    Un hilo lee del stream sin pausa, así el buffer interno de OpenCV/FFmpeg
+    nunca acumula atraso, y solo se conserva el frame más nuevo: los frames que
+    llegan antes de que alguien lea el anterior se cuentan como descartados.
+    Si el stream se corta se reconecta con backoff exponencial.
+    """
+
+    def __init__(self, path, reconnect_min=0.5, reconnect_max=30.0, read_timeout=5.0):
+        super().__init__(path, backend='opencv', realtime=False, loop=False)
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.read_timeout = read_timeout
+        self.connected = False
+        self.last_error = None
+        self.read_seq = 0
+        self.stats.update({'dropped': 0, 'reconnects': 0})
+
+    def start(self):
+        self.running = True
+        thread = threading.Thread(target=self.grab_loop, name=f'video-live-{self.path}', daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def open_capture(self):
+        timeout_ms = int(self.read_timeout * 1000)
+        params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms]
+        cap = cv2.VideoCapture(self.path, cv2.CAP_FFMPEG, params)
+        if not cap.isOpened():
+            cap.release()
+            raise IOError(f"No se pudo conectar a {self.path}")
+        # Sin cola interna: el hilo de lectura ya se queda solo con el último frame
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        return cap
+
+    def grab_loop(self):
+        backoff = self.reconnect_min
+        first_attempt = True
+        while self.running:
+            if not first_attempt:
+                # Esperar antes de reconectar sin bloquear la detención
+                deadline = time.monotonic() + backoff
+                while self.running and time.monotonic() < deadline:
+                    time.sleep(min(0.2, deadline - time.monotonic()))
+                if not self.running:
+                    break
+                self.stats['reconnects'] += 1
+                backoff = min(backoff * 2, self.reconnect_max)
+            first_attempt = False
+
+            try:
+                cap = self.open_capture()
+            except Exception as e:
+                self.stats['open_errors'] += 1
+                self.last_error = str(e)
+                print(f"❌ {e} (reintento en {backoff:.1f}s)")
+                continue
+
+            self.connected = True
+            print(f"📡 Conectado a {self.path}")
+            try:
+                while self.running:
+                    ret, frame = cap.read()
+                    if not ret or frame is None:
+                        self.last_error = 'Stream interrumpido'
+                        print(f"⚠️ Se perdió el stream {self.path}, reconectando...")
+                        break
+                    self.stats['decoded'] += 1
+                    # Conexión estable: el próximo corte vuelve a empezar con el backoff mínimo
+                    backoff = self.reconnect_min
+                    self.publish_frame(frame)
+            finally:
+                self.connected = False
+                cap.release()
+
+    def publish_frame(self, frame):
+        with self.condition:
+            if self.frame is not None and self.read_seq < self.seq:
+                self.stats['dropped'] += 1
+        super().publish_frame(frame)
+
+    def read(self, last_seq=0, timeout=1.0):
+        seq, frame, timestamp = super().read(last_seq, timeout)
+        if frame is not None:
+            self.read_seq = max(self.read_seq, seq)
+        return seq, frame, timestamp
+
+    async def read_async(self, last_seq=0, timeout=1.0):
+        seq, frame, timestamp = await super().read_async(last_seq, timeout)
+        if frame is not None:
+            self.read_seq = max(self.read_seq, seq)
+        return seq, frame, timestamp
+
+    def get_stats(self):
+        frame_age = time.time() - self.timestamp if self.timestamp else None
+        return dict(self.stats, backend='live', fps=self.fps, consumers=self.consumers,
+                    connected=self.connected, last_error=self.last_error,
+                    frame_age_ms=round(frame_age * 1000, 1) if frame_age is not None else None)
+
+
+LIVE_SCHEMES = {'rtsp', 'rtsps', 'rtmp', 'http', 'https', 'udp', 'tcp'}
+
+
+def is_live_source(path):
+    """Las URLs de cámaras (rtsp://, http://...) se leen en vivo; el resto son archivos"""
+    return '://' in path and path.split('://', 1)[0].lower() in LIVE_SCHEMES
+
+
+# Una sola fuente decodificada por ruta, compartida por detector y previews
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def acquire_source(path, **options):
+    """Obtener (o crear) la fuente compartida de un video y registrar un consumidor"""
+    with _sources_lock:
+        source = _sources.get(path)
+        if source is None and is_live_source(path):
+            source = LiveVideoSource(path,
+                                     reconnect_min=Config.LIVE_RECONNECT_MIN,
+                                     reconnect_max=Config.LIVE_RECONNECT_MAX,
+                                     read_timeout=Config.LIVE_READ_TIMEOUT)
+            source.start()
+            _sources[path] = source
+        elif source is None:
+            source = VideoSource(path,
+                                 backend=options.get('backend', Config.VIDEO_BACKEND),
+                                 prefetch=options.get('prefetch', Config.VIDEO_PREFETCH),
+                                 realtime=options.get('realtime', Config.VIDEO_REALTIME))
+            source.start()
+            _sources[path] = source
+        source.consumers += 1
+        return source
+
+
+def release_source(source):
+    """Liberar un consumidor; la fuente se detiene cuando ya nadie la usa"""
+    with _sources_lock:
+        source.consumers -= 1
+        if source.consumers > 0:
+            return
+        if _sources.get(source.path) is source:
+            del _sources[source.path]
+    source.stop()
+
+
+def recycle_source(path):
+    """Descartar la fuente compartida de un video para que el próximo acquire_source abra una nueva.
+
+    Para fuentes trabadas (p. ej. un decodificador colgado): la fuente vieja se
+    detiene y quienes todavía la tengan la liberan como siempre con release_source.
+    """
+    with _sources_lock:
+        source = _sources.pop(path, None)
+    if source is not None:
+        source.stop()
+
+
+def get_sources_stats():
+    with _sources_lock:
+        return {path: source.get_stats() for path, source in _sources.items()}
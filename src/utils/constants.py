@@ -12,4 +12,34 @@ VEHICLE_COLORS = {
     'bus': '#28a745',
     'ambulancia': '#ffc107',
     'mototaxi': '#6f42c1'
-}
\ No newline at end of file
+}
+
+# Clases estandarizadas de vehículos (mismo orden que Config.CLASS_NAMES)
+VEHICLE_CLASSES = ['carro', 'camion', 'bus', 'ambulancia', 'mototaxi']
+
+# Pesos para cada tipo de vehículo
+VEHICLE_WEIGHTS = {
+    'carro': 1,
+    'mototaxi': 0.7,  # Las motos ocupan menos espacio
+    'camion': 5,      # Camiones ocupan mucho espacio
+    'bus': 4,         # Buses ocupan espacio similar a camiones
+    'ambulancia': 10  # Alta prioridad por ser vehículo de emergencia
+}
+
+# Mapeo de variaciones de nombres a nuestros nombres estandarizados
+CLASS_MAPPING = {
+    'carro': 'carro',
+    'car': 'carro',
+    'auto': 'carro',
+    'coche': 'carro',
+    'camion': 'camion',
+    'truck': 'camion',
+    'bus': 'bus',
+    'autobus': 'bus',
+    'omnibus': 'bus',
+    'ambulancia': 'ambulancia',
+    'ambulance': 'ambulancia',
+    'mototaxi': 'mototaxi',
+    'moto': 'mototaxi',
+    'motorcycle': 'mototaxi'
+}
@@ -1,3 +1,6 @@
+import numpy as np
+from src.utils.constants import CLASS_MAPPING, VEHICLE_CLASSES
+
 def get_congestion_color(level):
     colors = {
         'low': 'success',
@@ -12,4 +15,21 @@ def get_congestion_text(level):
         'medium': 'Media',
         'high': 'Alta'
     }
-    return texts.get(level, 'Desconocida')
\ No newline at end of file
+    return texts.get(level, 'Desconocida')
+
+def map_class_name(class_name):
+    """Normalizar el nombre de clase del modelo a nuestro nombre estandarizado (o None)"""
+    return CLASS_MAPPING.get(class_name.lower().strip())
+
+def build_class_lookup(model_names):
+    """Diccionario id de clase del modelo -> nombre estandarizado (o None)"""
+    return {class_id: map_class_name(name) for class_id, name in model_names.items()}
+
+def build_class_index(model_names):
+    """Arreglo id de clase del modelo -> índice en VEHICLE_CLASSES (-1 si no es un vehículo conocido)"""
+    class_lookup = build_class_lookup(model_names)
+    class_index = np.full(max(class_lookup) + 1, -1, dtype=np.int64)
+    for class_id, mapped in class_lookup.items():
+        if mapped in VEHICLE_CLASSES:
+            class_index[class_id] = VEHICLE_CLASSES.index(mapped)
+    return class_index
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+# Pillow es opcional: se usa para formatos que OpenCV no decodifica (p. ej. AVIF)
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def read_image(path):
+    """Leer una imagen como BGR (soporta rutas con caracteres no ASCII y AVIF con Pillow)"""
+    data = np.fromfile(path, dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+    if image is None and Image is not None:
+        with Image.open(path) as pil_image:
+            image = cv2.cvtColor(np.asarray(pil_image.convert('RGB')), cv2.COLOR_RGB2BGR)
+    if image is None:
+        raise ValueError(f"No se pudo decodificar la imagen: {path}")
+    return image
+
+
+def letterbox(image, size=640, color=114):
+    """Redimensionar manteniendo la proporción y rellenar hasta size x size.
+
+    Devuelve (imagen, escala, (pad_x, pad_y)) para poder deshacer la
+    transformación sobre las cajas detectadas.
+    """
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    if (new_width, new_height) != (width, height):
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        image = cv2.resize(image, (new_width, new_height), interpolation=interpolation)
+
+    pad_x = (size - new_width) // 2
+    pad_y = (size - new_height) // 2
+    canvas = np.full((size, size, 3), color, dtype=np.uint8)
+    canvas[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = image
+    return canvas, scale, (pad_x, pad_y)
+
+
+def unletterbox_boxes(boxes, scale, pad, shape):
+    """Llevar cajas xyxy de la imagen con letterbox a la imagen original"""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4).copy()
+    boxes[:, [0, 2]] -= pad[0]
+    boxes[:, [1, 3]] -= pad[1]
+    boxes /= scale
+    height, width = shape[:2]
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+    return boxes